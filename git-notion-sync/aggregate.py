@@ -0,0 +1,65 @@
+"""
+日报聚合：把逐 commit 的 FE/BE 行数统计在内存中折叠成 “仓库 × 日期（× 作者）” 的桶，
+每个桶最终只对应 Notion 中的一条记录。
+"""
+
+from typing import Dict, Any, List
+
+METRIC_KEYS = [
+    "files_changed", "lines_added", "lines_deleted", "lines_modified",
+    "fe_files", "fe_added", "fe_deleted", "fe_modified",
+    "be_files", "be_added", "be_deleted", "be_modified",
+]
+
+def bucket_key(repo_key: str, day: str, author_email: str = "") -> str:
+    return f"daily:{repo_key}:{day}:{author_email or '*'}"
+
+def empty_totals() -> Dict[str, int]:
+    totals = {k: 0 for k in METRIC_KEYS}
+    totals["commits"] = 0
+    return totals
+
+def merge_totals(base: Dict[str, int], delta: Dict[str, int]) -> Dict[str, int]:
+    merged = dict(base)
+    for k, v in delta.items():
+        merged[k] = merged.get(k, 0) + v
+    return merged
+
+class DailyAggregator:
+    """按 (repo, day[, author]) 累加 commit payload。
+
+    commit_time_iso 已经是配置时区下的本地时间，直接取日期部分作为 day。
+    """
+
+    def __init__(self, by_author: bool = True):
+        self.by_author = by_author
+        self.buckets: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, repo_key: str, payload: Dict[str, Any]):
+        day = payload["commit_time_iso"][:10]
+        author_email = payload["author_email"] if self.by_author else ""
+        key = bucket_key(repo_key, day, author_email)
+        b = self.buckets.get(key)
+        if b is None:
+            b = {
+                "key": key,
+                "repo_key": repo_key,
+                "repo": payload["repo"],
+                "platform": payload["platform"],
+                "day": day,
+                "author_name": payload["author_name"] if self.by_author else "",
+                "author_email": author_email,
+                "totals": empty_totals(),
+                "shas": [],
+            }
+            self.buckets[key] = b
+        totals = b["totals"]
+        for k in METRIC_KEYS:
+            totals[k] += payload[k]
+        totals["commits"] += 1
+        b["shas"].append(payload["commit_sha"])
+
+    def pop_repo(self, repo_key: str) -> List[Dict[str, Any]]:
+        """取出并移除某个仓库的全部桶（按日期、作者排序）。"""
+        keys = sorted(k for k, b in self.buckets.items() if b["repo_key"] == repo_key)
+        return [self.buckets.pop(k) for k in keys]
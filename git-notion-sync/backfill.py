@@ -0,0 +1,67 @@
+"""
+历史回填：把 [FROM, TO] 切成若干时间块，在进程池中并行计算每块提交的 numstat。
+
+主进程负责一次性列出提交、批量预取对象、读写缓存与 Notion；子进程只做纯计算，
+因此不会并发写 git 仓库或 SQLite。结果按块的时间顺序返回，块内按提交时间升序。
+"""
+
+import os
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple, Iterator, Optional
+
+from git_backend import get_backend
+
+def parse_backfill_range(date_from: str, date_to: str, tzinfo) -> Dict[str, Any]:
+    """Turn YYYY-MM-DD bounds (inclusive, local tz) into a window dict like parse_time_window_local."""
+    start = datetime.fromisoformat(date_from).replace(tzinfo=tzinfo)
+    end = datetime.fromisoformat(date_to).replace(tzinfo=tzinfo)
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+    if end < start:
+        raise ValueError(f"--backfill range is empty: {date_from} > {date_to}")
+    return {"start_local": start, "end_local": end}
+
+def split_chunks(window: Dict[str, Any], chunk_days: int) -> List[Dict[str, Any]]:
+    chunks = []
+    cur = window["start_local"]
+    end = window["end_local"]
+    while cur <= end:
+        nxt = cur + timedelta(days=chunk_days)
+        chunks.append({"start_local": cur, "end_local": min(nxt - timedelta(microseconds=1), end)})
+        cur = nxt
+    return chunks
+
+def assign_chunks(commits: List[Dict[str, Any]], chunks: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Distribute commits (any order) into chunks, each chunk sorted oldest first."""
+    grouped: List[List[Dict[str, Any]]] = [[] for _ in chunks]
+    for c in commits:
+        for i, ch in enumerate(chunks):
+            if ch["start_local"] <= c["time"] <= ch["end_local"]:
+                grouped[i].append(c)
+                break
+    for g in grouped:
+        g.sort(key=lambda c: c["time"])
+    return grouped
+
+_worker_backends: Dict[str, Any] = {}
+
+def numstat_chunk(backend_name: str, repo_path: str, commits: List[Dict[str, Any]], diff_base: str, stats: Optional[Dict[str, Any]] = None, exclude=None) -> List[List[Tuple[int, int, str]]]:
+    """Process-pool entry point: numstat for every commit of one chunk."""
+    backend = _worker_backends.get(backend_name)
+    if backend is None:
+        backend = get_backend(backend_name)
+        _worker_backends[backend_name] = backend
+    return [backend.numstat_for_commit(repo_path, c, diff_base=diff_base, stats=stats, exclude=exclude) for c in commits]
+
+def iter_chunk_results(backend_name: str, repo_path: str, work: List[List[Dict[str, Any]]], diff_base: str, workers: int, stats: Optional[Dict[str, Any]] = None, exclude=None) -> Iterator[List[List[Tuple[int, int, str]]]]:
+    """Yield numstat results chunk by chunk, in chunk order, while later chunks are still computing."""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for commits in work:
+            yield numstat_chunk(backend_name, repo_path, commits, diff_base, stats, exclude)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(numstat_chunk, backend_name, repo_path, commits, diff_base, stats, exclude) for commits in work]
+        for f in futures:
+            yield f.result()
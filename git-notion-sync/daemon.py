@@ -0,0 +1,171 @@
+"""
+常驻模式（python main.py --daemon）：代替一次性的 cron 任务，近实时同步。
+
+- 配置、state.db、diff 缓存、git 后端（pygit2 的仓库句柄）在进程内只加载一次；
+- 每个仓库按自己的 poll_interval 轮询：先用 ls-remote（local_cache_dir 则读本地分支）取 tip，
+  与上次同步到的 tip 相同则什么都不做；有变化才 fetch 并按水位只处理新增提交；
+- 可选在本机开一个 HTTP 端口作为 webhook：POST /sync?repo=<repo> 立即触发某个仓库（不带 repo 则全部）。
+
+常驻模式总是使用水位增量（time.mode 视为 watermark），首次运行时仍按时间窗口起步。
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Any, List, Optional, Callable
+
+from utils import ls_remote_tip, local_ref_sha, repo_cache_dir, repo_state_key, repo_display_name, short_sha
+from state_store import StateStore
+from metrics import METRICS
+
+class SyncDaemon:
+    def __init__(self, cfg: Dict[str, Any], store: StateStore, sync_repo: Callable[[Dict[str, Any]], None], on_tick: Optional[Callable[[], None]] = None):
+        """`sync_repo(repo_cfg)` runs one incremental sync of a single repo; `on_tick` is called after each round that synced something."""
+        daemon_cfg = cfg.get("daemon", {})
+        self.repos: List[Dict[str, Any]] = cfg.get("repos", [])
+        self.store = store
+        self.sync_repo = sync_repo
+        self.on_tick = on_tick
+        self.default_interval = daemon_cfg.get("poll_interval", 300)
+        self.error_backoff = daemon_cfg.get("error_backoff", 600)
+        self.webhook_cfg = daemon_cfg.get("webhook", {})
+        self.next_due: Dict[str, float] = {repo_state_key(r): 0.0 for r in self.repos}
+        self.last_tip: Dict[str, Optional[str]] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.lock = threading.Lock()
+
+    def interval(self, repo_cfg: Dict[str, Any]) -> float:
+        return repo_cfg.get("poll_interval", self.default_interval)
+
+    def trigger(self, name: Optional[str] = None) -> List[str]:
+        """Mark matching repos (by repo key, display name or repo name; all when empty) as due now."""
+        matched = []
+        with self.lock:
+            for r in self.repos:
+                key = repo_state_key(r)
+                if not name or name in (key, repo_display_name(r), r.get("repo")):
+                    self.next_due[key] = 0.0
+                    matched.append(key)
+        if matched:
+            self.wakeup.set()
+        return matched
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+
+    def remote_tip(self, repo_cfg: Dict[str, Any]) -> Optional[str]:
+        branch = repo_cfg.get("branch", "main")
+        path = repo_cache_dir(repo_cfg)
+        if repo_cfg.get("local_cache_dir"):
+            return local_ref_sha(path, branch)
+        if not path.exists():
+            return None  # 尚未克隆，交给 ensure_repo
+        return ls_remote_tip(path, branch)
+
+    def poll(self, repo_cfg: Dict[str, Any]) -> bool:
+        """Check one repo and sync it if its tip moved; return True if a sync ran."""
+        key = repo_state_key(repo_cfg)
+        branch = repo_cfg.get("branch", "main")
+        if key not in self.last_tip:
+            wm = self.store.get_watermark(key, branch)
+            self.last_tip[key] = wm["sha"] if wm else None
+        tip = self.remote_tip(repo_cfg)
+        METRICS.incr("daemon_polls")
+        if tip is not None and tip == self.last_tip[key]:
+            return False
+        print(f"{key}@{branch}: tip moved to {short_sha(tip) if tip else '?'}, syncing")
+        self.sync_repo(repo_cfg)
+        wm = self.store.get_watermark(key, branch)
+        self.last_tip[key] = wm["sha"] if wm else tip
+        self.status[key] = {"last_sync": time.time(), "tip": self.last_tip[key]}
+        return True
+
+    def run_once(self) -> float:
+        """Poll every due repo; return seconds until the next one is due."""
+        synced = False
+        now = time.time()
+        for repo_cfg in self.repos:
+            key = repo_state_key(repo_cfg)
+            with self.lock:
+                if self.next_due[key] > now:
+                    continue
+                # 同步期间被 webhook 触发（改回 0）时保持立即到期
+                self.next_due[key] = float("inf")
+            try:
+                synced = self.poll(repo_cfg) or synced
+                delay = self.interval(repo_cfg)
+            except Exception as e:  # 单个仓库失败不影响其它仓库，稍后重试
+                print(f"{key}: sync failed: {e}")
+                METRICS.incr("daemon_errors")
+                self.status[key] = {"last_error": str(e), "at": time.time()}
+                delay = max(self.interval(repo_cfg), self.error_backoff)
+            with self.lock:
+                if self.next_due[key] == float("inf"):
+                    self.next_due[key] = time.time() + delay
+        if synced and self.on_tick:
+            self.on_tick()
+        with self.lock:
+            return max(0.0, min(self.next_due.values(), default=now + self.default_interval) - time.time())
+
+    def status_snapshot(self) -> Dict[str, Any]:
+        """GET /status 的内容；正在同步的仓库 next_due 为 "syncing"（内部用 inf 标记，JSON 里不合法）"""
+        with self.lock:
+            next_due = {key: "syncing" if due == float("inf") else due for key, due in self.next_due.items()}
+            return {"repos": dict(self.status), "next_due": next_due}
+
+    def serve_webhook(self) -> Optional[ThreadingHTTPServer]:
+        if not self.webhook_cfg.get("enabled"):
+            return None
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code: int, body: Dict[str, Any]):
+                data = json.dumps(body, ensure_ascii=False, allow_nan=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != "/sync":
+                    return self._reply(404, {"error": "not found"})
+                repo = parse_qs(url.query).get("repo", [None])[0]
+                matched = daemon.trigger(repo)
+                if not matched:
+                    return self._reply(404, {"error": f"unknown repo: {repo}"})
+                self._reply(202, {"triggered": matched})
+
+            def do_GET(self):
+                if urlparse(self.path).path != "/status":
+                    return self._reply(404, {"error": "not found"})
+                self._reply(200, daemon.status_snapshot())
+
+            def log_message(self, fmt, *args):
+                print("webhook: " + fmt % args)
+
+        host = self.webhook_cfg.get("host", "127.0.0.1")
+        port = self.webhook_cfg.get("port", 8765)
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="webhook", daemon=True).start()
+        print(f"Webhook listening on http://{host}:{port} (POST /sync?repo=..., GET /status)")
+        return server
+
+    def run_forever(self):
+        server = self.serve_webhook()
+        print(f"Daemon started: {len(self.repos)} repos, default poll interval {self.default_interval}s")
+        try:
+            while not self.stopping:
+                wait = self.run_once()
+                self.wakeup.wait(timeout=wait)
+                self.wakeup.clear()
+        finally:
+            if server:
+                server.shutdown()
+            print("Daemon stopped")
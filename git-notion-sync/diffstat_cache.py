@@ -0,0 +1,145 @@
+"""
+按 commit SHA 缓存逐文件 diff 统计（numstat 结果）。
+
+commit 不可变，同一个 (sha, variant) 的结果永远相同，因此重跑、回填、多分支配置都不必重复计算 diff。
+variant 描述统计口径（diff_base 加上 stats 段的重命名/空白选项，见 utils.stats_variant），口径变化时自然落到不同的缓存键上。
+
+存储为 SQLite：键为 20 字节二进制 SHA + variant，值为紧凑的二进制编码
+（varint 序列，足够大时再 zlib 压缩）。
+"""
+
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Optional, Callable
+
+FileStats = List[Tuple[int, int, str]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diffstats (
+    sha BLOB NOT NULL,
+    variant TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at INTEGER NOT NULL,
+    PRIMARY KEY (sha, variant)
+) WITHOUT ROWID;
+"""
+
+RAW, ZLIB = 0, 1
+COMPRESS_MIN_BYTES = 256
+
+def _put_varint(out: bytearray, n: int):
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return
+
+def _get_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+
+def encode_stats(files: FileStats) -> bytes:
+    body = bytearray()
+    _put_varint(body, len(files))
+    for added, deleted, path in files:
+        p = path.encode("utf-8")
+        _put_varint(body, added)
+        _put_varint(body, deleted)
+        _put_varint(body, len(p))
+        body += p
+    if len(body) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(bytes(body), 6)
+        if len(packed) < len(body):
+            return bytes([ZLIB]) + packed
+    return bytes([RAW]) + bytes(body)
+
+def decode_stats(data: bytes) -> FileStats:
+    body = zlib.decompress(data[1:]) if data[0] == ZLIB else data[1:]
+    count, pos = _get_varint(body, 0)
+    files = []
+    for _ in range(count):
+        added, pos = _get_varint(body, pos)
+        deleted, pos = _get_varint(body, pos)
+        n, pos = _get_varint(body, pos)
+        files.append((added, deleted, body[pos:pos + n].decode("utf-8")))
+        pos += n
+    return files
+
+class DiffStatCache:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha: str, variant: str) -> Optional[FileStats]:
+        row = self.conn.execute(
+            "SELECT data FROM diffstats WHERE sha = ? AND variant = ?", (bytes.fromhex(sha), variant)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_stats(row[0])
+
+    def put(self, sha: str, variant: str, files: FileStats):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO diffstats (sha, variant, data, created_at) VALUES (?, ?, ?, ?)",
+                (bytes.fromhex(sha), variant, encode_stats(files), int(time.time())),
+            )
+
+    def has(self, sha: str, variant: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM diffstats WHERE sha = ? AND variant = ?", (bytes.fromhex(sha), variant)
+        ).fetchone() is not None
+
+    def get_or_compute(self, sha: str, variant: str, compute: Callable[[], FileStats]) -> FileStats:
+        files = self.get(sha, variant)
+        if files is None:
+            files = compute()
+            self.put(sha, variant, files)
+        return files
+
+    def size(self) -> Dict[str, Any]:
+        entries, data_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM diffstats"
+        ).fetchone()
+        file_bytes = self.path.stat().st_size if self.path.exists() else 0
+        return {"entries": entries, "data_bytes": data_bytes, "file_bytes": file_bytes}
+
+    def prune(self, max_age_days: Optional[float] = None, max_entries: Optional[int] = None) -> int:
+        """删除早于 max_age_days 的条目，并只保留最新的 max_entries 条；返回删除条数。"""
+        removed = 0
+        with self.conn:
+            if max_age_days is not None:
+                cutoff = int(time.time() - max_age_days * 86400)
+                removed += self.conn.execute("DELETE FROM diffstats WHERE created_at < ?", (cutoff,)).rowcount
+            if max_entries is not None:
+                removed += self.conn.execute(
+                    "DELETE FROM diffstats WHERE (sha, variant) NOT IN "
+                    "(SELECT sha, variant FROM diffstats ORDER BY created_at DESC LIMIT ?)",
+                    (max_entries,),
+                ).rowcount
+        if removed:
+            self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,121 @@
+"""
+生成文件 / 第三方代码排除：lockfile、压缩后的 bundle、vendor 目录等不计入统计。
+
+规则来源：
+- 分支 tip 上根目录 .gitattributes 中标记了 linguist-generated / linguist-vendored 的模式（与 GitHub 语言统计一致，exclude.linguist 开启时）；
+- config.yaml 中 exclude.globs 配置的 glob。
+
+每个仓库编译一次：
+- subprocess 后端把规则作为 `:(exclude,glob)` pathspec 交给 git diff，被排除的文件根本不会被 diff；
+- pygit2 后端用同一组规则编译出的正则在结果上过滤。
+规则指纹（fingerprint）是 diff 缓存键的一部分，规则变化后自然重新计算。
+"""
+
+import re
+import hashlib
+from pathlib import Path
+from subprocess import check_output, CalledProcessError, DEVNULL
+from typing import Dict, Any, List, Optional
+
+from metrics import METRICS
+
+LINGUIST_ATTRS = ("linguist-generated", "linguist-vendored")
+
+def normalize_glob(pattern: str) -> Optional[str]:
+    """gitattributes 风格的模式 -> 相对仓库根目录的 git glob。
+
+    不含 `/` 的模式匹配任意层级的文件名（`*.min.js` -> `**/*.min.js`），
+    以 `/` 开头或中间含 `/` 的模式相对仓库根目录。以 `/` 结尾的目录模式在 gitattributes 中不匹配文件，忽略。
+    """
+    pattern = pattern.strip()
+    if not pattern or pattern.endswith("/"):
+        return None
+    if pattern.startswith("/"):
+        return pattern[1:]
+    if "/" not in pattern:
+        return "**/" + pattern
+    return pattern
+
+def parse_gitattributes(text: str) -> List[str]:
+    """Return globs marked linguist-generated / linguist-vendored (later lines override earlier ones)."""
+    marked: Dict[str, bool] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line.startswith('"') or line.startswith("[attr]"):
+            continue
+        pattern, *attrs = line.split()
+        for attr in attrs:
+            name, _, value = attr.lstrip("-!").partition("=")
+            if name not in LINGUIST_ATTRS:
+                continue
+            on = not attr.startswith(("-", "!")) and value.lower() not in ("false", "0")
+            glob = normalize_glob(pattern)
+            if glob:
+                marked[glob] = on
+    return [g for g, on in marked.items() if on]
+
+def glob_to_regex(glob: str) -> str:
+    """git 的 glob pathspec 语义：`*` / `?` 不跨目录，`**/`、`/**` 匹配任意层目录。"""
+    out, i = [], 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+        elif glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif glob[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif glob[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif glob[i] == "[":
+            j = glob.find("]", i + 1)
+            if j == -1:
+                out.append(re.escape(glob[i]))
+                i += 1
+            else:
+                body = glob[i + 1:j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j + 1
+        else:
+            out.append(re.escape(glob[i]))
+            i += 1
+    return "".join(out)
+
+class ExclusionRules:
+    def __init__(self, globs: List[str]):
+        self.globs = sorted(set(globs))
+        self.pathspecs = [f":(exclude,glob){g}" for g in self.globs]
+        self._regex = re.compile("(?:" + "|".join(glob_to_regex(g) for g in self.globs) + r")\Z") if self.globs else None
+        self.fingerprint = hashlib.sha1("\n".join(self.globs).encode("utf-8")).hexdigest()[:10] if self.globs else ""
+
+    def __bool__(self):
+        return bool(self.globs)
+
+    def matches(self, path: str) -> bool:
+        return self._regex is not None and self._regex.match(path) is not None
+
+def read_tip_gitattributes(repo_path: Path, ref: str) -> str:
+    METRICS.incr("subprocesses")
+    try:
+        return check_output(["git", "show", f"{ref}:.gitattributes"], cwd=repo_path, text=True, stderr=DEVNULL)
+    except CalledProcessError:
+        return ""
+
+def load_exclusions(repo_path: Path, ref: str, exclude_cfg: Optional[Dict[str, Any]]) -> ExclusionRules:
+    exclude_cfg = exclude_cfg or {}
+    globs = [g for g in (normalize_glob(p) for p in exclude_cfg.get("globs", [])) if g]
+    # 默认关闭：开启后行数口径改变，与已同步到 Notion 的 FE/BE 数字不再可比
+    if exclude_cfg.get("linguist", False):
+        globs += parse_gitattributes(read_tip_gitattributes(repo_path, ref))
+    rules = ExclusionRules(globs)
+    if rules:
+        print(f"{repo_path}: excluding {len(rules.globs)} generated/vendored patterns")
+    return rules
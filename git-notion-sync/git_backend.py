@@ -0,0 +1,181 @@
+"""
+可插拔的 git 读取后端。
+
+- subprocess：原有实现（utils.py 中的 git log / git diff --numstat），每个 commit 至少 fork 一次；
+- pygit2：直接读取对象库（libgit2），遍历提交、取父节点、计算逐文件增删行数都在进程内完成。
+
+通过 config.yaml 中的 git.backend 选择（auto | pygit2 | subprocess），
+auto 在 pygit2 可用时使用 pygit2，否则回退到 subprocess。
+
+libgit2 不会向 promisor 远端懒加载缺失的对象：partial clone（remote.*.promisor / extensions.partialClone）
+里 prefetch 没取到（或关闭了 fetch.prefetch）的 tree/blob，pygit2 后端对该 commit 改用 git diff，由 git 自己补取。
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Tuple, Optional
+
+from utils import iter_commits_in_window, iter_commits_since, numstat_for_commit, stats_options
+
+try:
+    import pygit2
+except ImportError:  # pragma: no cover - optional dependency
+    pygit2 = None
+
+class GitBackend:
+    name = "base"
+
+    def iter_commits_in_window(self, repo_path: Path, branch: str, window: Dict[str, Any], include_merges: bool = False):
+        raise NotImplementedError
+
+    def iter_commits_since(self, repo_path: Path, since_sha: str, branch: str, tzinfo=None, include_merges: bool = False):
+        raise NotImplementedError
+
+    def numstat_for_commit(self, repo_path: Path, commit: Dict[str, Any], diff_base: str = "first-parent", stats: Optional[Dict[str, Any]] = None, exclude=None) -> List[Tuple[int, int, str]]:
+        """`exclude` is an exclusions.ExclusionRules; matching files are left out of the result."""
+        raise NotImplementedError
+
+class SubprocessBackend(GitBackend):
+    name = "subprocess"
+
+    def iter_commits_in_window(self, repo_path, branch, window, include_merges=False):
+        return iter_commits_in_window(repo_path, branch, window, include_merges=include_merges)
+
+    def iter_commits_since(self, repo_path, since_sha, branch, tzinfo=None, include_merges=False):
+        return iter_commits_since(repo_path, since_sha, branch, tzinfo=tzinfo, include_merges=include_merges)
+
+    def numstat_for_commit(self, repo_path, commit, diff_base="first-parent", stats=None, exclude=None):
+        return numstat_for_commit(repo_path, commit, diff_base=diff_base, stats=stats, pathspecs=exclude.pathspecs if exclude else None)
+
+class Pygit2Backend(GitBackend):
+    name = "pygit2"
+
+    def __init__(self):
+        if pygit2 is None:
+            raise RuntimeError("pygit2 is not installed; use git.backend: subprocess")
+        self._repos: Dict[str, Any] = {}
+        self._promisor: Dict[str, bool] = {}
+        self._fallback = SubprocessBackend()
+
+    def _repo(self, repo_path: Path):
+        key = str(Path(repo_path).resolve())
+        repo = self._repos.get(key)
+        if repo is None:
+            repo = pygit2.Repository(key)
+            self._repos[key] = repo
+        return repo
+
+    def _is_promisor(self, repo_path: Path) -> bool:
+        key = str(Path(repo_path).resolve())
+        promisor = self._promisor.get(key)
+        if promisor is None:
+            config = self._repo(repo_path).config
+            promisor = any(
+                (e.name.startswith("remote.") and e.name.endswith(".promisor") and e.value.lower() == "true")
+                or e.name == "extensions.partialclone"
+                for e in config
+            )
+            self._promisor[key] = promisor
+        return promisor
+
+    def _commit_dict(self, c, tzinfo) -> Dict[str, Any]:
+        offset = timezone(timedelta(minutes=c.commit_time_offset))
+        t = datetime.fromtimestamp(c.commit_time, offset)
+        if tzinfo is not None:
+            t = t.astimezone(tzinfo)
+        raw = c.message
+        # 与 git log 的 %s / %B 保持一致：subject 为首段（换行替换为空格），body 为完整提交信息
+        subject = " ".join(raw.strip().split("\n\n", 1)[0].split("\n")).strip()
+        return {
+            "sha": str(c.id),
+            "parents": [str(p) for p in c.parent_ids],
+            "author_name": c.author.name,
+            "author_email": c.author.email,
+            "time": t,
+            "subject": subject,
+            "message": (subject + "\n\n" + raw.strip()).strip(),
+        }
+
+    def _walk(self, repo_path: Path, branch: str, hide: Optional[str] = None, reverse: bool = False):
+        repo = self._repo(repo_path)
+        tip = repo.revparse_single(branch).peel(pygit2.Commit)
+        sort = pygit2.GIT_SORT_TOPOLOGICAL | (pygit2.GIT_SORT_REVERSE if reverse else 0)
+        walker = repo.walk(tip.id, sort)
+        walker.simplify_first_parent()
+        if hide:
+            walker.hide(hide)
+        return walker
+
+    def iter_commits_in_window(self, repo_path, branch, window, include_merges=False):
+        start = window["start_local"]
+        end = window["end_local"]
+        for c in self._walk(repo_path, branch):
+            if not include_merges and len(c.parent_ids) > 1:
+                continue
+            d = self._commit_dict(c, start.tzinfo)
+            if d["time"] < start or d["time"] > end:
+                continue
+            yield d
+
+    def iter_commits_since(self, repo_path, since_sha, branch, tzinfo=None, include_merges=False):
+        for c in self._walk(repo_path, branch, hide=since_sha, reverse=True):
+            if not include_merges and len(c.parent_ids) > 1:
+                continue
+            yield self._commit_dict(c, tzinfo)
+
+    def numstat_for_commit(self, repo_path, commit, diff_base="first-parent", stats=None, exclude=None):
+        if not self._is_promisor(repo_path):
+            return self._numstat(repo_path, commit, diff_base, stats, exclude)
+        try:
+            return self._numstat(repo_path, commit, diff_base, stats, exclude)
+        except (KeyError, TypeError, pygit2.GitError):
+            # 对象库里缺 tree/blob（libgit2 读不到时报 GitError / KeyError，peel 缺失的 tree 时报 TypeError）
+            return self._fallback.numstat_for_commit(repo_path, commit, diff_base=diff_base, stats=stats, exclude=exclude)
+
+    def _numstat(self, repo_path, commit, diff_base, stats, exclude):
+        stats = stats_options(stats)
+        repo = self._repo(repo_path)
+        c = repo.get(commit["sha"])
+        if c.parent_ids and diff_base != "first-parent":
+            # all-parents 的语义交给 git 本身处理
+            return self._fallback.numstat_for_commit(repo_path, commit, diff_base=diff_base, stats=stats, exclude=exclude)
+        flags = pygit2.GIT_DIFF_IGNORE_WHITESPACE if stats["ignore_whitespace"] else pygit2.GIT_DIFF_NORMAL
+        if c.parent_ids:
+            diff = repo.diff(c.parents[0], c, flags=flags)
+        else:
+            # root commit: compare to empty tree
+            diff = c.tree.diff_to_tree(flags=flags, swap=True)
+        if stats["renames"]:
+            # libgit2 没有超时，检测规模只受 rename_limit 约束
+            find = pygit2.GIT_DIFF_FIND_RENAMES | (pygit2.GIT_DIFF_FIND_COPIES if stats["copies"] else 0)
+            diff.find_similar(flags=find, rename_threshold=stats["rename_threshold"],
+                              copy_threshold=stats["rename_threshold"], rename_limit=stats["rename_limit"])
+        results = []
+        # 先按 delta 过滤排除路径，只为剩下的文件生成 patch：排除的文件不加载 blob、不做 diff
+        # （partial clone 下 prefetch_diff_objects 也不会取这些 blob）
+        for i, delta in enumerate(diff.deltas):
+            if exclude and exclude.matches(delta.new_file.path):
+                continue
+            patch = diff[i]
+            delta = patch.delta
+            if delta.is_binary:
+                # binary file; skip
+                continue
+            _, added, deleted = patch.line_stats
+            if stats["ignore_whitespace"] and not added and not deleted and delta.status == pygit2.GIT_DELTA_MODIFIED:
+                # 与 git diff -w 一致：只有空白变化的文件不出现在结果里
+                continue
+            results.append((added, deleted, delta.new_file.path))
+        return results
+
+BACKENDS = {
+    "subprocess": SubprocessBackend,
+    "pygit2": Pygit2Backend,
+}
+
+def get_backend(name: str = "auto") -> GitBackend:
+    if name == "auto":
+        name = "pygit2" if pygit2 is not None else "subprocess"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown git backend: {name}")
+    return BACKENDS[name]()
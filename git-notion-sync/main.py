@@ -3,85 +3,345 @@ import sys
 import json
 import yaml
 import fnmatch
+import argparse
+import signal
+import contextlib
 from pathlib import Path
 from datetime import datetime, timedelta
 from dateutil import tz, parser as dateparser
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
 from subprocess import check_output, CalledProcessError, STDOUT
 from notion_client import Client as NotionClient
 from tenacity import retry, stop_after_attempt, wait_exponential
-from utils import ensure_repo, iter_commits_in_window, numstat_for_commit, short_sha, repo_cache_dir
-from utils import parse_time_window_local, classify_file
-
-STATE_FILE = Path("state.json")
-
-def load_state() -> Dict[str, Any]:
-    if STATE_FILE.exists():
-        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
-        print(f"Loaded state with {len(state.get('inserted', {}))} repos tracked")
-        return state
-    print("No existing state file found, starting fresh")
-    return {"inserted": {}}
-
-def save_state(state: Dict[str, Any]):
-    STATE_FILE.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
-
-def notion_upsert_commit(notion: NotionClient, database_id: str, repo_key: str, commit_payload: Dict[str, Any], state: Dict[str, Any]):
-    # Ensure inserted is always a set for deduplication
-    if repo_key not in state["inserted"]:
-        state["inserted"][repo_key] = set()
-    
-    inserted = state["inserted"][repo_key]
-    
-    # Handle case where inserted might be a list (from JSON)
-    if isinstance(inserted, list):
-        inserted = set(inserted)
-        state["inserted"][repo_key] = inserted
-
-    unique_key = commit_payload["commit_sha"]
-    if unique_key in inserted:
-        print(f"Skipping duplicate commit: {unique_key}")
-        return
+from utils import ensure_repo, short_sha, repo_cache_dir, repo_ref, prefetch_diff_objects, shallow_history_start, unshallow
+from utils import resolve_ref, last_commit_before, is_ancestor, commit_time_iso
+from utils import parse_time_window_local, classify_file, stats_options, stats_variant
+from utils import repo_display_name, repo_state_key
+from state_store import StateStore
+from git_backend import GitBackend, get_backend
+from diffstat_cache import DiffStatCache
+from exclusions import ExclusionRules, load_exclusions
+from backfill import parse_backfill_range, split_chunks, assign_chunks, iter_chunk_results
+from aggregate import DailyAggregator
+from rollup import rollup_from_config
+from metrics import METRICS
+from daemon import SyncDaemon
+from sinks import Sink, NotionSink, open_local_sink, replay_jsonl
 
-    title = f'{commit_payload["repo"]}:{commit_payload["short_sha"]} — {commit_payload["subject"][:70]}'
-
-    props = {
-        "Name": {"title": [{"text": {"content": title}}]},
-        "Repo": {"select": {"name": commit_payload["repo"]}},
-        "Platform": {"select": {"name": commit_payload["platform"]}},
-        "Commit SHA": {"rich_text": [{"text": {"content": commit_payload["commit_sha"]}}]},
-        "Author Name": {"rich_text": [{"text": {"content": commit_payload["author_name"]}}]},
-        "Author Email": {"rich_text": [{"text": {"content": commit_payload["author_email"]}}]},
-        "Commit Time": {"date": {"start": commit_payload["commit_time_iso"]}},
-        "Message": {"rich_text": [{"text": {"content": commit_payload["message"][:1990]}}]},
-        "Files Changed": {"number": commit_payload["files_changed"]},
-        "Lines Added": {"number": commit_payload["lines_added"]},
-        "Lines Deleted": {"number": commit_payload["lines_deleted"]},
-        "Lines Modified": {"number": commit_payload["lines_modified"]},
-        "FE Files": {"number": commit_payload["fe_files"]},
-        "FE Added": {"number": commit_payload["fe_added"]},
-        "FE Deleted": {"number": commit_payload["fe_deleted"]},
-        "FE Modified": {"number": commit_payload["fe_modified"]},
-        "BE Files": {"number": commit_payload["be_files"]},
-        "BE Added": {"number": commit_payload["be_added"]},
-        "BE Deleted": {"number": commit_payload["be_deleted"]},
-        "BE Modified": {"number": commit_payload["be_modified"]},
-    }
+LEGACY_STATE_FILE = Path("state.json")
 
-    notion.pages.create(parent={"database_id": database_id}, properties=props)
-    inserted.add(unique_key)
+def open_state(cfg: Dict[str, Any]) -> StateStore:
+    path = Path(cfg.get("state", {}).get("path", "state.db"))
+    fresh = not path.exists()
+    store = StateStore(path)
+    if fresh and LEGACY_STATE_FILE.exists():
+        n = store.import_legacy_json(LEGACY_STATE_FILE)
+        print(f"Migrated {n} commits from {LEGACY_STATE_FILE} into {path}")
+    counts = store.count_inserted()
+    if counts:
+        print(f"Loaded state with {len(counts)} repos tracked")
+    else:
+        print("No existing state found, starting fresh")
+    return store
 
 def load_config():
     with open("config.yaml", "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
-def main():
-    cfg = load_config()
-    tzname = cfg.get("timezone", "Europe/Berlin")
-    include_merges = cfg.get("time", {}).get("include_merges", False)
-    diff_base = cfg.get("time", {}).get("diff_base", "first-parent")
-    window = parse_time_window_local(cfg.get("time", {}).get("daily_window_local", {}), tzname)
+def build_commit_payload(repo_cfg: Dict[str, Any], c: Dict[str, Any], files: List[Tuple[int, int, str]], classify_cfg: Dict[str, Any]) -> Dict[str, Any]:
+    fe_files = fe_added = fe_deleted = fe_modified = 0
+    be_files = be_added = be_deleted = be_modified = 0
+    files_changed = len(files)
+    lines_added = lines_deleted = lines_modified = 0
+
+    for added, deleted, path in files:
+        modified = min(added, deleted)
+        lines_added += added
+        lines_deleted += deleted
+        lines_modified += modified
+
+        kind = classify_file(path, classify_cfg)
+        if kind == "frontend":
+            fe_files += 1
+            fe_added += added
+            fe_deleted += deleted
+            fe_modified += modified
+        elif kind == "backend":
+            be_files += 1
+            be_added += added
+            be_deleted += deleted
+            be_modified += modified
+        else:
+            # 未分类的就不计入 FE/BE
+            pass
+
+    return {
+        "platform": repo_cfg["platform"].capitalize(),
+        "repo": repo_display_name(repo_cfg),
+        "commit_sha": c["sha"],
+        "short_sha": short_sha(c["sha"]),
+        "subject": c["subject"],
+        "message": c["message"],
+        "author_name": c["author_name"],
+        "author_email": c["author_email"],
+        "commit_time_iso": c["time"].isoformat(),
+        "files_changed": files_changed,
+        "lines_added": lines_added,
+        "lines_deleted": lines_deleted,
+        "lines_modified": lines_modified,
+        "fe_files": fe_files,
+        "fe_added": fe_added,
+        "fe_deleted": fe_deleted,
+        "fe_modified": fe_modified,
+        "be_files": be_files,
+        "be_added": be_added,
+        "be_deleted": be_deleted,
+        "be_modified": be_modified,
+    }
+
+def select_commits(backend: GitBackend, repo_path: Path, repo_key: str, branch: str, ref: str, window: Dict[str, Any], store: StateStore, mode: str, include_merges: bool):
+    """Return (commits, watermark_tip) for this repo.
+
+    window 模式：按时间窗口筛选；watermark 模式：只遍历 `上次水位..ref`，
+    没有水位（首次运行）或水位已不在分支历史上（force push）时回退到时间窗口。
+    水位按 branch 名记录，git 读取使用 ref（托管克隆为 refs/remotes/origin/<branch>）。
+    """
+    if mode != "watermark":
+        return backend.iter_commits_in_window(repo_path, ref, window, include_merges=include_merges), None
+
+    tip = resolve_ref(repo_path, ref)
+    tzinfo = window["start_local"].tzinfo
+    wm = store.get_watermark(repo_key, branch)
+    if wm and wm["sha"] == tip:
+        print(f"{repo_key}@{branch} is up to date at {short_sha(tip)}")
+        return [], None
+    if wm and is_ancestor(repo_path, wm["sha"], tip):
+        print(f"{repo_key}@{branch}: syncing {short_sha(wm['sha'])}..{short_sha(tip)}")
+        return backend.iter_commits_since(repo_path, wm["sha"], ref, tzinfo=tzinfo, include_merges=include_merges), tip
+
+    if wm:
+        print(f"{repo_key}@{branch}: watermark {short_sha(wm['sha'])} is no longer on the branch, falling back to time window")
+    else:
+        print(f"{repo_key}@{branch}: no watermark yet, bootstrapping from time window")
+    commits = list(backend.iter_commits_in_window(repo_path, ref, window, include_merges=include_merges))
+    commits.reverse()
+    # 水位停在窗口结束前的最后一个提交，窗口之后的新提交留给下一次运行
+    return commits, last_commit_before(repo_path, ref, window["end_local"])
+
+def open_diffstat_cache(cfg: Dict[str, Any]) -> Optional[DiffStatCache]:
+    path = cfg.get("cache", {}).get("diffstat_path", "diffstat_cache.db")
+    return DiffStatCache(Path(path)) if path else None
+
+def commit_numstat(backend: GitBackend, cache: Optional[DiffStatCache], repo_path: Path, c: Dict[str, Any], diff_base: str, stats: Dict[str, Any], exclude: ExclusionRules) -> List[Tuple[int, int, str]]:
+    compute = lambda: backend.numstat_for_commit(repo_path, c, diff_base=diff_base, stats=stats, exclude=exclude)
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(c["sha"], stats_variant(diff_base, stats, exclude.fingerprint), compute)
+
+def reconcile_repo(sink: Sink, store: StateStore, repo_cfg: Dict[str, Any], repo_key: str, commits: List[Dict[str, Any]]):
+    """本地状态里没有的提交，先按它们的时间范围从目标端批量取回已写入的 SHA，避免 state.db 丢失后重复写入。"""
+    unknown = [c for c in commits if not store.is_inserted(repo_key, c["sha"])]
+    if not unknown:
+        return
+    with METRICS.stage("reconcile"):
+        sink.reconcile(repo_key, repo_display_name(repo_cfg), min(c["time"] for c in unknown), max(c["time"] for c in unknown))
+
+def fetch_since(mode: str, wm: Optional[Dict[str, Any]], window: Dict[str, Any]) -> datetime:
+    """Oldest commit time this run may need locally (drives shallow fetch depth)."""
+    since = window["start_local"]
+    if mode == "watermark" and wm and wm.get("commit_time"):
+        since = min(since, datetime.fromisoformat(wm["commit_time"]))
+    return since
+
+def sync_all(cfg: Dict[str, Any], sink: Sink, store: StateStore, window: Dict[str, Any], include_merges: bool, diff_base: str, cache: Optional[DiffStatCache] = None, backend: Optional[GitBackend] = None):
+    mode = cfg.get("time", {}).get("mode", "window")
+    if not sink.records_state:
+        # 本地导出不读写去重/水位状态，始终导出完整时间窗口
+        mode = "window"
+    classify_cfg = cfg.get("classify", {})
+    notion_cfg = cfg.get("notion", {})
+    stats = stats_options(cfg.get("stats"))
+    if backend is None:
+        backend = get_backend(cfg.get("git", {}).get("backend", "auto"))
+        print(f"Using git backend: {backend.name}")
+    aggregator = DailyAggregator(by_author=notion_cfg.get("aggregate_by_author", True)) if notion_cfg.get("aggregate_daily") else None
+    reconcile = notion_cfg.get("reconcile", False) and not aggregator
+    rollups = rollup_from_config(cfg, applied=store.rollup_shas if sink.records_state else None)
+    fetch_cfg = cfg.get("fetch", {})
+    for repo_cfg in cfg.get("repos", []):
+        repo_key = repo_state_key(repo_cfg)
+        branch = repo_cfg.get("branch","main")
+        since = fetch_since(mode, store.get_watermark(repo_key, branch), window)
+        with METRICS.stage("fetch"):
+            repo_path = ensure_repo(repo_cfg, since=since, fetch_cfg=fetch_cfg)
+        ref = repo_ref(repo_cfg)
+
+        print(f"Processing {repo_key} at {repo_path}")
+        exclude = load_exclusions(repo_path, ref, cfg.get("exclude"))
+        variant = stats_variant(diff_base, stats, exclude.fingerprint)
+
+        with METRICS.stage("git_log"):
+            commits, tip = select_commits(backend, repo_path, repo_key, branch, ref, window, store, mode, include_merges)
+            commits = list(commits)
+        METRICS.incr("repos")
+        if reconcile and sink.records_state:
+            reconcile_repo(sink, store, repo_cfg, repo_key, commits)
+        duplicate = lambda c: sink.records_state and store.is_inserted(repo_key, c["sha"])
+        unrolled = lambda c: rollups is not None and not (sink.records_state and store.is_rolled_up(repo_key, c["sha"]))
+        if fetch_cfg.get("prefetch", True) and diff_base == "first-parent":
+            # partial clone：一次性批量拉取 numstat 需要的 tree/blob，避免逐对象懒加载
+            with METRICS.stage("prefetch"):
+                prefetch_diff_objects(repo_path, [
+                    c for c in commits
+                    if (not duplicate(c) or unrolled(c)) and not (cache and cache.has(c["sha"], variant))
+                ], pathspecs=exclude.pathspecs)
+        rolled = []
+        for c in commits:
+            is_duplicate, needs_rollup = duplicate(c), unrolled(c)
+            if is_duplicate and not needs_rollup:
+                print(f"Skipping duplicate commit: {c['sha']}")
+                METRICS.incr("commits_skipped")
+            else:
+                # compute per-file numstat
+                with METRICS.stage("numstat"):
+                    files = commit_numstat(backend, cache, repo_path, c, diff_base, stats, exclude)
+                with METRICS.stage("classify"):
+                    payload = build_commit_payload(repo_cfg, c, files, classify_cfg)
+                if needs_rollup:
+                    # 各维度汇总与 FE/BE 统计共用同一份 numstat 结果；已写入但汇总没落盘的 commit 也在这里补上
+                    rollups.add(repo_key, payload, files)
+                    rolled.append(c["sha"])
+                if is_duplicate:
+                    print(f"Skipping duplicate commit (rollup only): {c['sha']}")
+                    METRICS.incr("commits_skipped")
+                else:
+                    METRICS.incr("commits")
+                    METRICS.incr("files", len(files))
+                    if aggregator:
+                        aggregator.add(repo_key, payload)
+                    else:
+                        # upsert to notion (idempotent via local state) or export locally
+                        with METRICS.stage("write"):
+                            sink.write_commit(repo_key, payload)
+            # 开启汇总时水位也要等汇总行写完才推进
+            if mode == "watermark" and not aggregator and not rollups:
+                store.set_watermark(repo_key, branch, c["sha"], c["time"].isoformat())
 
+        if aggregator:
+            # 聚合模式下 commit 在桶写入后才算完成，因此水位只在这之后推进
+            for bucket in aggregator.pop_repo(repo_key):
+                with METRICS.stage("write"):
+                    sink.write_daily(bucket)
+        if rollups:
+            for row in rollups.pop_repo(repo_key):
+                with METRICS.stage("write"):
+                    sink.write_rollup(row)
+            if sink.records_state:
+                store.mark_rolled_up_many(repo_key, rolled)
+
+        if tip:
+            # 跳过的合并提交等也一并越过
+            store.set_watermark(repo_key, branch, tip, commit_time_iso(repo_path, tip))
+
+def run_backfill(cfg: Dict[str, Any], sink: Sink, store: StateStore, bf_window: Dict[str, Any], include_merges: bool, diff_base: str, cache: Optional[DiffStatCache] = None, chunk_days: int = 7, workers: int = 0):
+    """回填 bf_window：按 chunk_days 切块，numstat 在进程池中并行计算，结果按时间顺序写入，每块完成后记录断点。"""
+    classify_cfg = cfg.get("classify", {})
+    notion_cfg = cfg.get("notion", {})
+    fetch_cfg = cfg.get("fetch", {})
+    stats = stats_options(cfg.get("stats"))
+    backend = get_backend(cfg.get("git", {}).get("backend", "auto"))
+    aggregator = DailyAggregator(by_author=notion_cfg.get("aggregate_by_author", True)) if notion_cfg.get("aggregate_daily") else None
+    reconcile = notion_cfg.get("reconcile", False) and not aggregator
+    rollups = rollup_from_config(cfg, applied=store.rollup_shas if sink.records_state else None)
+    chunks = split_chunks(bf_window, chunk_days)
+    print(f"Backfilling {bf_window['start_local'].date()}..{bf_window['end_local'].date()} in {len(chunks)} chunks of {chunk_days} days with git backend {backend.name}")
+
+    for repo_cfg in cfg.get("repos", []):
+        repo_key = repo_state_key(repo_cfg)
+        branch = repo_cfg.get("branch","main")
+        # 断点与去重只对会记录状态的输出端生效，本地导出每次都完整跑一遍
+        todo = [ch for ch in chunks if not (sink.records_state and store.is_chunk_done(repo_key, branch, ch))]
+        if not todo:
+            print(f"{repo_key}: all {len(chunks)} chunks already done")
+            continue
+        with METRICS.stage("fetch"):
+            repo_path = ensure_repo(repo_cfg, since=todo[0]["start_local"], fetch_cfg=fetch_cfg)
+            # 浅克隆的历史必须覆盖最早的块（fetch.shallow_since 关闭时 ensure_repo 不会加深），否则补全历史
+            history_start = shallow_history_start(repo_path)
+            if history_start and history_start.date() > todo[0]["start_local"].date():
+                unshallow(repo_cfg, repo_path)
+                history_start = shallow_history_start(repo_path)
+        ref = repo_ref(repo_cfg)
+        print(f"Backfilling {repo_key} at {repo_path}: {len(todo)}/{len(chunks)} chunks to do")
+        exclude = load_exclusions(repo_path, ref, cfg.get("exclude"))
+        variant = stats_variant(diff_base, stats, exclude.fingerprint)
+
+        span = {"start_local": todo[0]["start_local"], "end_local": todo[-1]["end_local"]}
+        with METRICS.stage("git_log"):
+            grouped = assign_chunks(list(backend.iter_commits_in_window(repo_path, ref, span, include_merges=include_merges)), todo)
+        METRICS.incr("repos")
+        if reconcile and sink.records_state:
+            reconcile_repo(sink, store, repo_cfg, repo_key, [c for g in grouped for c in g])
+
+        # 已写入（且已进汇总）的跳过；命中缓存的直接取结果；其余交给进程池
+        duplicate = lambda c: sink.records_state and store.is_inserted(repo_key, c["sha"])
+        unrolled = lambda c: rollups is not None and not (sink.records_state and store.is_rolled_up(repo_key, c["sha"]))
+        pending = [[c for c in g if not duplicate(c) or unrolled(c)] for g in grouped]
+        cached = [{c["sha"]: cache.get(c["sha"], variant) for c in g} if cache else {} for g in pending]
+        to_compute = [[c for c in g if cached[i].get(c["sha"]) is None] for i, g in enumerate(pending)]
+        if fetch_cfg.get("prefetch", True) and diff_base == "first-parent":
+            with METRICS.stage("prefetch"):
+                prefetch_diff_objects(repo_path, [c for g in to_compute for c in g], pathspecs=exclude.pathspecs)
+
+        results = iter_chunk_results(backend.name, str(repo_path), to_compute, diff_base, workers, stats, exclude)
+        for i in range(len(todo)):
+            # 主进程等待进程池的时间，计入 numstat 阶段
+            with METRICS.stage("numstat"):
+                computed = next(results)
+            files_by_sha = {sha: files for sha, files in cached[i].items() if files is not None}
+            for c, files in zip(to_compute[i], computed):
+                files_by_sha[c["sha"]] = files
+                if cache:
+                    cache.put(c["sha"], variant, files)
+            rolled, new = [], 0
+            for c in pending[i]:
+                with METRICS.stage("classify"):
+                    payload = build_commit_payload(repo_cfg, c, files_by_sha[c["sha"]], classify_cfg)
+                if unrolled(c):
+                    rollups.add(repo_key, payload, files_by_sha[c["sha"]])
+                    rolled.append(c["sha"])
+                if duplicate(c):
+                    METRICS.incr("commits_skipped")
+                    continue
+                new += 1
+                METRICS.incr("commits")
+                METRICS.incr("files", len(files_by_sha[c["sha"]]))
+                if aggregator:
+                    aggregator.add(repo_key, payload)
+                else:
+                    with METRICS.stage("write"):
+                        sink.write_commit(repo_key, payload)
+            if aggregator:
+                for bucket in aggregator.pop_repo(repo_key):
+                    with METRICS.stage("write"):
+                        sink.write_daily(bucket)
+            if rollups:
+                for row in rollups.pop_repo(repo_key):
+                    with METRICS.stage("write"):
+                        sink.write_rollup(row)
+                if sink.records_state:
+                    store.mark_rolled_up_many(repo_key, rolled)
+            # 早于浅克隆边界的块可能缺提交（如 local_cache_dir 的浅克隆），不记断点，下次重跑
+            complete = history_start is None or todo[i]["start_local"].date() >= history_start.date()
+            if not complete:
+                print(f"{repo_key}: chunk {todo[i]['start_local'].date()} starts before the shallow history "
+                      f"({history_start.date()}), not checkpointed", file=sys.stderr)
+            elif sink.records_state:
+                store.mark_chunk_done(repo_key, branch, todo[i], len(grouped[i]))
+            print(f"{repo_key}: chunk {todo[i]['start_local'].date()}..{todo[i]['end_local'].date()} done "
+                  f"({new} new of {len(grouped[i])} commits)")
+
+def open_notion(cfg: Dict[str, Any]) -> NotionClient:
     notion_token = os.environ.get("NOTION_TOKEN")
     if not notion_token:
         print("ERROR: NOTION_TOKEN env is required", file=sys.stderr)
@@ -92,78 +352,124 @@ def main():
         print("ERROR: notion.database_id is empty. You can run scripts/create_notion_db.py first.", file=sys.stderr)
         sys.exit(2)
 
-    notion = NotionClient(auth=notion_token)
+    return NotionClient(auth=notion_token)
 
-    state = load_state()
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Sync git commit statistics into a Notion database")
+    ap.add_argument("--backfill", nargs=2, metavar=("FROM", "TO"),
+                    help="回填 FROM..TO 的历史提交（YYYY-MM-DD，含首尾，按配置时区），可断点续跑")
+    ap.add_argument("--chunk-days", type=int, help="回填时每块的天数（默认 backfill.chunk_days 或 7）")
+    ap.add_argument("--workers", type=int, help="回填时计算 numstat 的进程数（默认 backfill.workers 或 CPU 数）")
+    ap.add_argument("--sink", choices=["notion", "jsonl", "csv", "sqlite"],
+                    help="输出端（默认 output.sink 或 notion）；jsonl/csv/sqlite 写本地文件，不需要 Notion 凭据")
+    ap.add_argument("--output", help="本地输出端的文件路径（默认 output.path；jsonl 可用 - 表示 stdout）")
+    ap.add_argument("--dry-run", action="store_true", help="不写 Notion，把结果以 JSONL 打印到 stdout（等同 --sink jsonl --output -）")
+    ap.add_argument("--upload", metavar="FILE", help="把 jsonl 输出端导出的文件回放写入 Notion，不读取 git")
+    ap.add_argument("--reconcile", action="store_true", help="写入前先从 Notion 批量查询窗口内已有的 Commit SHA，补齐本地去重状态（也可设 notion.reconcile）")
+    ap.add_argument("--daemon", action="store_true", help="常驻运行，按 daemon.poll_interval 轮询各仓库并增量同步（可选本机 webhook 触发）")
+    args = ap.parse_args(argv)
+    if args.daemon and (args.backfill or args.upload or args.dry_run):
+        ap.error("--daemon cannot be combined with --backfill, --upload or --dry-run")
+    return args
 
-    for repo_cfg in cfg.get("repos", []):
-        platform = repo_cfg["platform"]
-        name = f'{repo_cfg.get("owner","")}/{repo_cfg.get("repo","")}' if not repo_cfg.get("url") else repo_cfg["url"]
-        repo_path = ensure_repo(repo_cfg)
-        repo_key = f'{platform}:{name}'
+def run_sync(args, cfg: Dict[str, Any], sink: Sink, store: StateStore, window: Dict[str, Any], include_merges: bool, diff_base: str, cache: Optional[DiffStatCache]):
+    if args.backfill:
+        bf_cfg = cfg.get("backfill", {})
+        bf_window = parse_backfill_range(args.backfill[0], args.backfill[1], window["start_local"].tzinfo)
+        run_backfill(cfg, sink, store, bf_window, include_merges, diff_base, cache,
+                     chunk_days=args.chunk_days or bf_cfg.get("chunk_days", 7),
+                     workers=args.workers or bf_cfg.get("workers", 0))
+    else:
+        sync_all(cfg, sink, store, window, include_merges, diff_base, cache)
 
-        print(f"Processing {repo_key} at {repo_path}")
+def run_daemon(cfg: Dict[str, Any], sink: Sink, store: StateStore, tzname: str, include_merges: bool, diff_base: str, cache: Optional[DiffStatCache]):
+    """常驻运行：git 后端、state.db、diff 缓存在整个进程内复用，每个仓库 tip 变化时只做增量同步。"""
+    if not sink.records_state:
+        print("ERROR: --daemon needs the notion sink (local sinks do not record sync state)", file=sys.stderr)
+        sys.exit(2)
+    if cfg.get("time", {}).get("mode", "window") != "watermark":
+        print("Daemon mode always syncs incrementally from the watermark (time.mode: watermark)")
+    cfg = {**cfg, "time": {**cfg.get("time", {}), "mode": "watermark"}}
+    backend = get_backend(cfg.get("git", {}).get("backend", "auto"))
+    print(f"Using git backend: {backend.name}")
 
-        for c in iter_commits_in_window(repo_path, repo_cfg.get("branch","main"), window, include_merges=include_merges):
-            # compute per-file numstat
-            files = numstat_for_commit(repo_path, c, diff_base=diff_base)
-
-            fe_files = fe_added = fe_deleted = fe_modified = 0
-            be_files = be_added = be_deleted = be_modified = 0
-            files_changed = len(files)
-            lines_added = lines_deleted = lines_modified = 0
-
-            for added, deleted, path in files:
-                modified = min(added, deleted)
-                lines_added += added
-                lines_deleted += deleted
-                lines_modified += modified
-
-                kind = classify_file(path, cfg.get("classify", {}))
-                if kind == "frontend":
-                    fe_files += 1
-                    fe_added += added
-                    fe_deleted += deleted
-                    fe_modified += modified
-                elif kind == "backend":
-                    be_files += 1
-                    be_added += added
-                    be_deleted += deleted
-                    be_modified += modified
-                else:
-                    # 未分类的就不计入 FE/BE
-                    pass
-
-            payload = {
-                "platform": platform.capitalize(),
-                "repo": name if repo_cfg.get("url") else f'{repo_cfg["owner"]}/{repo_cfg["repo"]}',
-                "commit_sha": c["sha"],
-                "short_sha": short_sha(c["sha"]),
-                "subject": c["subject"],
-                "message": c["message"],
-                "author_name": c["author_name"],
-                "author_email": c["author_email"],
-                "commit_time_iso": c["time"].isoformat(),
-                "files_changed": files_changed,
-                "lines_added": lines_added,
-                "lines_deleted": lines_deleted,
-                "lines_modified": lines_modified,
-                "fe_files": fe_files,
-                "fe_added": fe_added,
-                "fe_deleted": fe_deleted,
-                "fe_modified": fe_modified,
-                "be_files": be_files,
-                "be_added": be_added,
-                "be_deleted": be_deleted,
-                "be_modified": be_modified,
-            }
-
-            # upsert to notion (idempotent via local state)
-            notion_upsert_commit(notion, database_id, repo_key, payload, state)
-
-    # convert sets to lists for json
-    state["inserted"] = {k: sorted(list(v)) for k, v in state.get("inserted", {}).items()}
-    save_state(state)
+    def sync_repo(repo_cfg: Dict[str, Any]):
+        # 时间窗口只用于首次运行（还没有水位）时起步，每次按当前时间重新计算
+        window = parse_time_window_local(cfg["time"].get("daily_window_local", {}), tzname)
+        sync_all({**cfg, "repos": [repo_cfg]}, sink, store, window, include_merges, diff_base, cache, backend=backend)
+
+    def on_tick():
+        if cache:
+            METRICS.incr("diffstat_cache_hits", cache.hits)
+            METRICS.incr("diffstat_cache_misses", cache.misses)
+            cache.hits = cache.misses = 0
+        report_metrics(cfg.get("metrics", {}), sys.stdout)
+        METRICS.reset()
+
+    daemon = SyncDaemon(cfg, store, sync_repo, on_tick)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+def report_metrics(metrics_cfg: Dict[str, Any], log):
+    """运行结束时输出 JSON 汇总，并按配置写 Prometheus textfile。"""
+    if metrics_cfg.get("summary", True):
+        print(METRICS.dumps(), file=log)
+    if metrics_cfg.get("textfile"):
+        METRICS.write_prometheus(metrics_cfg["textfile"])
+
+def main(argv=None):
+    args = parse_args(argv)
+    cfg = load_config()
+    tzname = cfg.get("timezone", "Europe/Berlin")
+    include_merges = cfg.get("time", {}).get("include_merges", False)
+    diff_base = cfg.get("time", {}).get("diff_base", "first-parent")
+    window = parse_time_window_local(cfg.get("time", {}).get("daily_window_local", {}), tzname)
+
+    if args.reconcile:
+        cfg.setdefault("notion", {})["reconcile"] = True
+    out_cfg = cfg.get("output", {})
+    sink_name = "jsonl" if args.dry_run else (args.sink or out_cfg.get("sink", "notion"))
+    if args.upload:
+        sink_name = "notion"
+    output_path = "-" if args.dry_run else (args.output or out_cfg.get("path"))
+
+    # 结果写 stdout 时，进度日志改走 stderr，保证 stdout 是干净的 JSONL/CSV（从加载状态的日志开始）；
+    # 输出端要在重定向之外创建，"-" 才会指向真正的 stdout
+    log_to = contextlib.redirect_stdout(sys.stderr) if output_path == "-" else contextlib.nullcontext()
+    with log_to:
+        store = open_state(cfg)
+    if sink_name == "notion":
+        sink = NotionSink(open_notion(cfg), cfg["notion"]["database_id"], store)
+    else:
+        sink = open_local_sink(sink_name, output_path)
+    if args.upload:
+        try:
+            n = replay_jsonl(args.upload, sink)
+            print(f"Replayed {n} records from {args.upload}")
+        finally:
+            store.close()
+        return
+
+    cache = open_diffstat_cache(cfg)
+    try:
+        with log_to:
+            if args.daemon:
+                run_daemon(cfg, sink, store, tzname, include_merges, diff_base, cache)
+            else:
+                run_sync(args, cfg, sink, store, window, include_merges, diff_base, cache)
+    finally:
+        sink.close()
+        store.close()
+        log = sys.stderr if output_path == "-" else sys.stdout
+        if cache:
+            print(f"Diff-stat cache: {cache.hits} hits, {cache.misses} misses", file=log)
+            METRICS.incr("diffstat_cache_hits", cache.hits)
+            METRICS.incr("diffstat_cache_misses", cache.misses)
+            cache.close()
+        report_metrics(cfg.get("metrics", {}), log)
 
 if __name__ == "__main__":
     main()
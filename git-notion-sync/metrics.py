@@ -0,0 +1,141 @@
+"""
+运行指标：分阶段计时、计数器与延迟直方图。
+
+一次运行结束时在 main() 里输出 JSON 汇总（各阶段耗时、commits/sec、files/sec、
+git 子进程数、Notion 请求延迟分布与重试次数），可选写成 Prometheus textfile
+（node_exporter 的 textfile collector 读取），方便把定时任务的耗时画成曲线。
+
+模块级的 METRICS 是进程内单例；回填的 numstat 子进程各自计数，不汇总回主进程。
+"""
+
+import os
+import time
+import json
+import bisect
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# 秒；Notion API 单次请求通常在 0.2 ~ 2s
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+class Histogram:
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一格是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶上界估算分位数（与 Prometheus histogram_quantile 同一精度量级）。"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        cumulative, seen = {}, 0
+        for le, n in zip(self.buckets + ["+Inf"], self.counts):
+            seen += n
+            cumulative[str(le)] = seen
+        return {
+            "count": self.count,
+            "sum_s": round(self.sum, 3),
+            "max_s": round(self.max, 3),
+            "p50_s": self.quantile(0.5),
+            "p95_s": self.quantile(0.95),
+            "buckets": cumulative,
+        }
+
+class Metrics:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            st = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            st["seconds"] += time.perf_counter() - t0
+            st["calls"] += 1
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(value)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        commits = self.counters.get("commits", 0)
+        files = self.counters.get("files", 0)
+        # 吞吐按 numstat + 分类 + 写入的净耗时计算，不含 clone/fetch 这类与提交数无关的开销
+        work = sum(self.stages.get(s, {}).get("seconds", 0.0) for s in ("numstat", "classify", "write"))
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "stages": {k: {"seconds": round(v["seconds"], 3), "calls": v["calls"]} for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+            "commits_per_sec": round(commits / work, 1) if work else None,
+            "files_per_sec": round(files / work, 1) if work else None,
+            "histograms": {k: h.summary() for k, h in self.histograms.items()},
+        }
+
+    def write_prometheus(self, path: str, prefix: str = "git_notion_sync"):
+        """写 Prometheus textfile 格式；先写临时文件再 rename，避免 collector 读到半个文件。"""
+        lines = [
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds {time.perf_counter() - self.started:.3f}",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds {time.time():.0f}",
+            f"# TYPE {prefix}_stage_seconds gauge",
+        ]
+        for name, st in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}"}} {st["seconds"]:.3f}')
+        lines.append(f"# TYPE {prefix}_stage_calls gauge")
+        for name, st in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_calls{{stage="{name}"}} {st["calls"]}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        for name, h in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            seen = 0
+            for le, n in zip(h.buckets + ["+Inf"], h.counts):
+                seen += n
+                lines.append(f'{metric}_bucket{{le="{le}"}} {seen}')
+            lines.append(f"{metric}_sum {h.sum:.3f}")
+            lines.append(f"{metric}_count {h.count}")
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, target)
+
+    def dumps(self) -> str:
+        return json.dumps(self.summary(), ensure_ascii=False)
+
+METRICS = Metrics()
@@ -0,0 +1,120 @@
+"""
+多维度汇总：在逐文件 numstat 结果上一次遍历，同时累加多个维度的日汇总。
+
+维度（config.yaml 的 rollup.dimensions）：
+- author：按作者邮箱；
+- dir：按路径前 dir_depth 级目录（根目录下的文件记为 "."）；
+- ext：按扩展名（无扩展名记为 "(none)"）；
+- class：按前后端分类（frontend / backend / other）。
+
+每行是 “仓库 × 日期 × 维度 × 取值” 的累计值，结构与日报聚合桶一致（key / repo_key / day / totals / shas），
+输出端和 Notion 的写入方式也与日报聚合相同：已有记录累加，否则新建。
+新增维度只需改配置，后续运行即可在同一遍历中产出，不需要重读历史。
+汇总进度与 commit 去重分开记录：已写入但还没进汇总的 commit 会被重新喂进来，
+applied 给出每行已折叠过的 commit，这些 commit 在该行上跳过，不会重复累加。
+"""
+
+import os
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple, Iterable
+
+from utils import classify_file
+
+DIMENSIONS = ("author", "dir", "ext", "class")
+ROLLUP_KEYS = ["files_changed", "lines_added", "lines_deleted", "lines_modified"]
+
+def rollup_key(repo_key: str, day: str, dimension: str, value: str) -> str:
+    return f"rollup:{repo_key}:{day}:{dimension}={value}"
+
+def dir_prefix(path: str, depth: int) -> str:
+    parts = path.split("/")[:-1]
+    return "/".join(parts[:depth]) if parts else "."
+
+def file_ext(path: str) -> str:
+    return os.path.splitext(path.rsplit("/", 1)[-1])[1].lower() or "(none)"
+
+class RollupAccumulator:
+    def __init__(self, dimensions: Iterable[str] = DIMENSIONS, dir_depth: int = 1, classify_cfg: Dict[str, Any] = None,
+                 applied: Optional[Callable[[str], Set[str]]] = None):
+        self.dimensions = [d for d in dimensions]
+        unknown = set(self.dimensions) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown rollup dimensions: {sorted(unknown)}")
+        self.dir_depth = dir_depth
+        self.classify_cfg = classify_cfg or {}
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.applied = applied
+        self._applied: Dict[str, Set[str]] = {}
+        # 同一路径在历史中反复出现，分类结果按路径缓存
+        self._kinds: Dict[str, str] = {}
+
+    def _row(self, repo_key: str, payload: Dict[str, Any], day: str, dimension: str, value: str) -> Dict[str, Any]:
+        key = rollup_key(repo_key, day, dimension, value)
+        row = self.rows.get(key)
+        if row is None:
+            row = {
+                "key": key,
+                "repo_key": repo_key,
+                "repo": payload["repo"],
+                "platform": payload["platform"],
+                "day": day,
+                "dimension": dimension,
+                "value": value,
+                "author_name": payload["author_name"] if dimension == "author" else "",
+                "totals": {**{k: 0 for k in ROLLUP_KEYS}, "commits": 0},
+                "shas": [],
+            }
+            self.rows[key] = row
+        return row
+
+    def add(self, repo_key: str, payload: Dict[str, Any], files: List[Tuple[int, int, str]]):
+        """Fold one commit (its payload and per-file numstat) into every configured dimension."""
+        day = payload["commit_time_iso"][:10]
+        touched: Dict[Tuple[str, str], Dict[str, int]] = {}
+        per_file = [d for d in self.dimensions if d != "author"]
+        for added, deleted, path in files:
+            values = []
+            for d in per_file:
+                if d == "dir":
+                    values.append(("dir", dir_prefix(path, self.dir_depth)))
+                elif d == "ext":
+                    values.append(("ext", file_ext(path)))
+                else:
+                    kind = self._kinds.get(path)
+                    if kind is None:
+                        kind = self._kinds[path] = classify_file(path, self.classify_cfg)
+                    values.append(("class", kind))
+            modified = min(added, deleted)
+            for dv in values:
+                t = touched.setdefault(dv, {k: 0 for k in ROLLUP_KEYS})
+                t["files_changed"] += 1
+                t["lines_added"] += added
+                t["lines_deleted"] += deleted
+                t["lines_modified"] += modified
+        if "author" in self.dimensions:
+            touched[("author", payload["author_email"])] = {k: payload[k] for k in ROLLUP_KEYS}
+        # 一个 commit 在每个取值下只计一次 commits
+        for (dimension, value), delta in touched.items():
+            if self.applied:
+                key = rollup_key(repo_key, day, dimension, value)
+                done = self._applied.get(key)
+                if done is None:
+                    done = self._applied[key] = self.applied(key)
+                if payload["commit_sha"] in done:
+                    continue
+            row = self._row(repo_key, payload, day, dimension, value)
+            for k, v in delta.items():
+                row["totals"][k] += v
+            row["totals"]["commits"] += 1
+            row["shas"].append(payload["commit_sha"])
+
+    def pop_repo(self, repo_key: str) -> List[Dict[str, Any]]:
+        keys = sorted(k for k, r in self.rows.items() if r["repo_key"] == repo_key)
+        prefix = f"rollup:{repo_key}:"
+        self._applied = {k: v for k, v in self._applied.items() if not k.startswith(prefix)}
+        return [self.rows.pop(k) for k in keys]
+
+def rollup_from_config(cfg: Dict[str, Any], applied: Optional[Callable[[str], Set[str]]] = None):
+    rollup_cfg = cfg.get("rollup", {})
+    if not rollup_cfg.get("enabled"):
+        return None
+    return RollupAccumulator(rollup_cfg.get("dimensions", DIMENSIONS), rollup_cfg.get("dir_depth", 1), cfg.get("classify", {}), applied)
@@ -26,6 +26,13 @@ SCHEMA = {
   "BE Added": {"number": {}},
   "BE Deleted": {"number": {}},
   "BE Modified": {"number": {}},
+  # 以下字段供 aggregate_daily（日报聚合）模式使用
+  "Type": {"select": {}},
+  "Bucket Key": {"rich_text": {}},
+  "Commits": {"number": {}},
+  # 以下字段供多维度汇总（rollup）使用
+  "Dimension": {"select": {}},
+  "Dimension Value": {"rich_text": {}},
 }
 
 def main():
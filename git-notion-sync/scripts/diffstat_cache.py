@@ -0,0 +1,46 @@
+"""
+查看 / 清理 diff 统计缓存。
+
+用法：
+    python scripts/diffstat_cache.py stats
+    python scripts/diffstat_cache.py prune --max-age-days 365 --max-entries 200000
+"""
+
+import os, sys, argparse
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from diffstat_cache import DiffStatCache
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("command", choices=["stats", "prune"])
+    ap.add_argument("--path", help="缓存文件路径（默认取 config.yaml 中的 cache.diffstat_path）")
+    ap.add_argument("--max-age-days", type=float)
+    ap.add_argument("--max-entries", type=int)
+    args = ap.parse_args()
+
+    path = args.path
+    if not path:
+        cfg = {}
+        if os.path.exists("config.yaml"):
+            with open("config.yaml", "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+        path = cfg.get("cache", {}).get("diffstat_path", "diffstat_cache.db")
+
+    cache = DiffStatCache(path)
+    try:
+        if args.command == "prune":
+            if args.max_age_days is None and args.max_entries is None:
+                print("ERROR: prune needs --max-age-days and/or --max-entries", file=sys.stderr)
+                sys.exit(2)
+            removed = cache.prune(max_age_days=args.max_age_days, max_entries=args.max_entries)
+            print(f"Removed {removed} entries")
+        size = cache.size()
+        print(f"{path}: {size['entries']} entries, {size['data_bytes']} bytes of data, {size['file_bytes']} bytes on disk")
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+输出端（sink）：把逐 commit 记录和日报聚合桶写到不同目的地。
+
+- notion：写入 Notion 数据库（唯一会读写 state.db 去重/水位的输出端）；
+- jsonl / csv / sqlite：写到本地文件，用于调试分类规则、大规模回填的本地试跑与对比，
+  jsonl 导出之后可以用 `python main.py --upload export.jsonl` 批量回放到 Notion。
+"""
+
+import csv
+import sys
+import json
+import time
+import sqlite3
+from pathlib import Path
+from datetime import datetime
+from urllib.parse import unquote
+from typing import Dict, Any, Optional, Set, Tuple
+from notion_client import Client as NotionClient
+from notion_client.errors import APIResponseError, HTTPResponseError, RequestTimeoutError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from metrics import METRICS
+from state_store import StateStore
+from aggregate import METRIC_KEYS, merge_totals
+from rollup import ROLLUP_KEYS
+
+def _retryable(e: BaseException) -> bool:
+    # 限流、5xx 和超时可以重试；参数/权限错误重试也没用
+    if isinstance(e, RequestTimeoutError):
+        return True
+    if isinstance(e, (APIResponseError, HTTPResponseError)):
+        return e.status == 429 or e.status >= 500
+    return False
+
+def _count_retry(retry_state):
+    METRICS.incr("notion_retries")
+    print(f"Notion request failed ({retry_state.outcome.exception()}), retrying")
+
+@retry(retry=retry_if_exception(_retryable), stop=stop_after_attempt(5),
+       wait=wait_exponential(multiplier=1, min=1, max=30), before_sleep=_count_retry, reraise=True)
+def notion_call(fn, **kwargs):
+    """调用一个 Notion API 方法：记录延迟与请求数，遇到限流/5xx/超时按指数退避重试。"""
+    METRICS.incr("notion_requests")
+    t0 = time.perf_counter()
+    try:
+        return fn(**kwargs)
+    finally:
+        METRICS.observe("notion_latency_seconds", time.perf_counter() - t0)
+
+def notion_upsert_commit(notion: NotionClient, database_id: str, repo_key: str, commit_payload: Dict[str, Any], store: StateStore):
+    unique_key = commit_payload["commit_sha"]
+    if store.is_inserted(repo_key, unique_key):
+        print(f"Skipping duplicate commit: {unique_key}")
+        return
+
+    title = f'{commit_payload["repo"]}:{commit_payload["short_sha"]} — {commit_payload["subject"][:70]}'
+
+    props = {
+        "Name": {"title": [{"text": {"content": title}}]},
+        "Repo": {"select": {"name": commit_payload["repo"]}},
+        "Platform": {"select": {"name": commit_payload["platform"]}},
+        "Commit SHA": {"rich_text": [{"text": {"content": commit_payload["commit_sha"]}}]},
+        "Author Name": {"rich_text": [{"text": {"content": commit_payload["author_name"]}}]},
+        "Author Email": {"rich_text": [{"text": {"content": commit_payload["author_email"]}}]},
+        "Commit Time": {"date": {"start": commit_payload["commit_time_iso"]}},
+        "Message": {"rich_text": [{"text": {"content": commit_payload["message"][:1990]}}]},
+        "Files Changed": {"number": commit_payload["files_changed"]},
+        "Lines Added": {"number": commit_payload["lines_added"]},
+        "Lines Deleted": {"number": commit_payload["lines_deleted"]},
+        "Lines Modified": {"number": commit_payload["lines_modified"]},
+        "FE Files": {"number": commit_payload["fe_files"]},
+        "FE Added": {"number": commit_payload["fe_added"]},
+        "FE Deleted": {"number": commit_payload["fe_deleted"]},
+        "FE Modified": {"number": commit_payload["fe_modified"]},
+        "BE Files": {"number": commit_payload["be_files"]},
+        "BE Added": {"number": commit_payload["be_added"]},
+        "BE Deleted": {"number": commit_payload["be_deleted"]},
+        "BE Modified": {"number": commit_payload["be_modified"]},
+    }
+
+    notion_call(notion.pages.create, parent={"database_id": database_id}, properties=props)
+    # 每写入一条立即落盘，崩溃时已完成的部分不会重复写入
+    store.mark_inserted(repo_key, unique_key)
+
+def notion_commit_shas(notion: NotionClient, database_id: str, repo: str, start: datetime, end: datetime, sha_property_id: Optional[str] = None) -> Set[str]:
+    """Commit SHAs already in the database for `repo` with Commit Time in [start, end].
+
+    一次分页批量查询（每页 100 条），只取 Commit SHA 一列；日报聚合记录没有 Commit SHA，被过滤掉。
+    """
+    kwargs = {
+        "database_id": database_id,
+        "filter": {"and": [
+            {"property": "Repo", "select": {"equals": repo}},
+            {"property": "Commit Time", "date": {"on_or_after": start.isoformat()}},
+            {"property": "Commit Time", "date": {"on_or_before": end.isoformat()}},
+            {"property": "Commit SHA", "rich_text": {"is_not_empty": True}},
+        ]},
+        "page_size": 100,
+    }
+    if sha_property_id:
+        kwargs["filter_properties"] = [sha_property_id]
+    shas = set()
+    cursor = None
+    while True:
+        res = notion_call(notion.databases.query, **kwargs, **({"start_cursor": cursor} if cursor else {}))
+        for page in res.get("results", []):
+            rich_text = page.get("properties", {}).get("Commit SHA", {}).get("rich_text", [])
+            sha = "".join(t.get("plain_text") or t.get("text", {}).get("content", "") for t in rich_text).strip()
+            if sha:
+                shas.add(sha)
+        cursor = res.get("next_cursor")
+        if not res.get("has_more") or not cursor:
+            return shas
+
+def metric_property(key: str) -> str:
+    # files_changed -> "Files Changed", fe_added -> "FE Added"
+    words = key.split("_")
+    prefix = words[0].upper() if words[0] in ("fe", "be") else words[0].capitalize()
+    return " ".join([prefix] + [w.capitalize() for w in words[1:]])
+
+def daily_properties(bucket: Dict[str, Any], totals: Dict[str, int]) -> Dict[str, Any]:
+    who = bucket["author_name"] or "All authors"
+    title = f'{bucket["repo"]} {bucket["day"]} — {who}'
+    props = {
+        "Name": {"title": [{"text": {"content": title}}]},
+        "Type": {"select": {"name": "Daily Summary"}},
+        "Bucket Key": {"rich_text": [{"text": {"content": bucket["key"]}}]},
+        "Repo": {"select": {"name": bucket["repo"]}},
+        "Platform": {"select": {"name": bucket["platform"]}},
+        "Author Name": {"rich_text": [{"text": {"content": bucket["author_name"]}}]},
+        "Author Email": {"rich_text": [{"text": {"content": bucket["author_email"]}}]},
+        "Commit Time": {"date": {"start": bucket["day"]}},
+        "Commits": {"number": totals["commits"]},
+    }
+    for key in METRIC_KEYS:
+        props[metric_property(key)] = {"number": totals[key]}
+    return props
+
+def rollup_properties(row: Dict[str, Any], totals: Dict[str, int]) -> Dict[str, Any]:
+    title = f'{row["repo"]} {row["day"]} — {row["dimension"]}: {row["value"]}'
+    props = {
+        "Name": {"title": [{"text": {"content": title}}]},
+        "Type": {"select": {"name": "Rollup"}},
+        "Bucket Key": {"rich_text": [{"text": {"content": row["key"]}}]},
+        "Repo": {"select": {"name": row["repo"]}},
+        "Platform": {"select": {"name": row["platform"]}},
+        "Commit Time": {"date": {"start": row["day"]}},
+        "Dimension": {"select": {"name": row["dimension"]}},
+        "Dimension Value": {"rich_text": [{"text": {"content": row["value"]}}]},
+        "Commits": {"number": totals["commits"]},
+    }
+    if row["dimension"] == "author":
+        props["Author Name"] = {"rich_text": [{"text": {"content": row["author_name"]}}]}
+        props["Author Email"] = {"rich_text": [{"text": {"content": row["value"]}}]}
+    for key in ROLLUP_KEYS:
+        props[metric_property(key)] = {"number": totals[key]}
+    return props
+
+def _upsert_bucket(notion: NotionClient, database_id: str, bucket: Dict[str, Any], stored: Optional[Dict[str, Any]], properties) -> Tuple[str, Dict[str, int]]:
+    """把一个聚合桶（日报或多维度汇总行）写入 Notion：已有页面则更新累计值，否则新建。返回 (page_id, 累计值)。"""
+    page_id = stored["page_id"] if stored else None
+    totals = merge_totals(stored["totals"], bucket["totals"]) if stored else bucket["totals"]
+
+    if not page_id:
+        # 本地没有记录时按 Bucket Key 查一次，避免 state.db 丢失后重复建页
+        res = notion_call(
+            notion.databases.query,
+            database_id=database_id,
+            filter={"property": "Bucket Key", "rich_text": {"equals": bucket["key"]}},
+            page_size=1,
+        )
+        if res.get("results"):
+            page_id = res["results"][0]["id"]
+
+    props = properties(bucket, totals)
+    if page_id:
+        notion_call(notion.pages.update, page_id=page_id, properties=props)
+    else:
+        page_id = notion_call(notion.pages.create, parent={"database_id": database_id}, properties=props)["id"]
+    return page_id, totals
+
+def notion_upsert_daily(notion: NotionClient, database_id: str, bucket: Dict[str, Any], store: StateStore):
+    page_id, totals = _upsert_bucket(notion, database_id, bucket, store.get_bucket(bucket["key"]), daily_properties)
+    # 桶累计值与其中 commit 的去重标记在同一事务落盘
+    store.commit_bucket(bucket["key"], page_id, totals, bucket["repo_key"], bucket["shas"])
+    print(f'Upserted {bucket["key"]}: {totals["commits"]} commits')
+
+def notion_upsert_rollup(notion: NotionClient, database_id: str, row: Dict[str, Any], store: StateStore):
+    page_id, totals = _upsert_bucket(notion, database_id, row, store.get_rollup(row["key"]), rollup_properties)
+    # 汇总进度单独记录，不标记 commit 去重（commit 本身可能还没写入）
+    store.commit_rollup(row["key"], page_id, totals, row["shas"])
+    print(f'Upserted {row["key"]}: {totals["commits"]} commits')
+
+class Sink:
+    name = "base"
+    # 是否以 state.db 为准做去重并推进水位；本地导出端每次导出所选范围内的全部提交
+    records_state = False
+
+    def write_commit(self, repo_key: str, payload: Dict[str, Any]):
+        raise NotImplementedError
+
+    def write_daily(self, bucket: Dict[str, Any]):
+        raise NotImplementedError
+
+    def write_rollup(self, row: Dict[str, Any]):
+        raise NotImplementedError
+
+    def is_synced(self, repo_key: str, sha: str) -> bool:
+        """Whether this destination already has the commit (used when replaying exports)."""
+        return False
+
+    def rollup_shas(self, bucket_key: str) -> Set[str]:
+        """Commits already folded into this destination's rollup row (used when replaying exports)."""
+        return set()
+
+    def reconcile(self, repo_key: str, repo: str, start: datetime, end: datetime) -> int:
+        """Pull already-written commits for [start, end] from the destination into the dedupe state."""
+        return 0
+
+    def close(self):
+        pass
+
+class NotionSink(Sink):
+    name = "notion"
+    records_state = True
+
+    def __init__(self, notion: NotionClient, database_id: str, store: StateStore):
+        self.notion = notion
+        self.database_id = database_id
+        self.store = store
+        self._sha_property_id: Optional[str] = None
+
+    def write_commit(self, repo_key, payload):
+        notion_upsert_commit(self.notion, self.database_id, repo_key, payload, self.store)
+
+    def write_daily(self, bucket):
+        notion_upsert_daily(self.notion, self.database_id, bucket, self.store)
+
+    def write_rollup(self, row):
+        notion_upsert_rollup(self.notion, self.database_id, row, self.store)
+
+    def is_synced(self, repo_key, sha):
+        return self.store.is_inserted(repo_key, sha)
+
+    def rollup_shas(self, bucket_key):
+        return self.store.rollup_shas(bucket_key)
+
+    def reconcile(self, repo_key, repo, start, end):
+        if self._sha_property_id is None:
+            # filter_properties 需要属性 id，按数据库取一次
+            props = notion_call(self.notion.databases.retrieve, database_id=self.database_id).get("properties", {})
+            # 接口返回的 id 是 URL 编码过的（如 "%3AUPp"），作为查询参数时由 httpx 重新编码
+            self._sha_property_id = unquote(props.get("Commit SHA", {}).get("id", ""))
+        shas = notion_commit_shas(self.notion, self.database_id, repo, start, end, self._sha_property_id or None)
+        known = sum(1 for sha in shas if self.store.is_inserted(repo_key, sha))
+        self.store.mark_inserted_many(repo_key, shas)
+        METRICS.incr("reconciled_commits", len(shas) - known)
+        print(f"{repo_key}: Notion has {len(shas)} commits in {start.date()}..{end.date()}, {len(shas) - known} were missing from local state")
+        return len(shas) - known
+
+def _open_text(path: str, newline=None):
+    if path == "-":
+        return sys.stdout
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return open(path, "w", encoding="utf-8", newline=newline)
+
+class JsonlSink(Sink):
+    """每行一条 {"kind": "commit"|"daily", ...}，可被 --upload 回放。"""
+    name = "jsonl"
+
+    def __init__(self, path: str):
+        self.f = _open_text(path)
+
+    def write_commit(self, repo_key, payload):
+        self.f.write(json.dumps({"kind": "commit", "repo_key": repo_key, "payload": payload}, ensure_ascii=False) + "\n")
+
+    def write_daily(self, bucket):
+        self.f.write(json.dumps({"kind": "daily", "bucket": bucket}, ensure_ascii=False) + "\n")
+
+    def write_rollup(self, row):
+        self.f.write(json.dumps({"kind": "rollup", "bucket": row}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+COMMIT_FIELDS = [
+    "platform", "repo", "commit_sha", "short_sha", "subject", "author_name", "author_email",
+    "commit_time_iso", *METRIC_KEYS,
+]
+
+class CsvSink(Sink):
+    """逐 commit 一行；日报聚合桶、多维度汇总行也各写成一行（kind=daily / rollup，commit_sha 为空，day/commits 有值）。"""
+    name = "csv"
+
+    def __init__(self, path: str):
+        self.f = _open_text(path, newline="")
+        self.writer = csv.DictWriter(self.f, fieldnames=["kind", "repo_key", "day", "dimension", "value", "commits", *COMMIT_FIELDS], extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write_commit(self, repo_key, payload):
+        self.writer.writerow({"kind": "commit", "repo_key": repo_key, "day": payload["commit_time_iso"][:10], "commits": 1, **payload})
+
+    def write_daily(self, bucket):
+        row = {k: bucket[k] for k in ("repo_key", "day", "repo", "platform", "author_name", "author_email")}
+        self.writer.writerow({"kind": "daily", **row, **bucket["totals"]})
+
+    def write_rollup(self, row):
+        fields = {k: row[k] for k in ("repo_key", "day", "dimension", "value", "repo", "platform", "author_name")}
+        self.writer.writerow({"kind": "rollup", **fields, **row["totals"]})
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+class SqliteSink(Sink):
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        metric_cols = ", ".join(f"{k} INTEGER" for k in METRIC_KEYS)
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS commits (
+                repo_key TEXT, commit_sha TEXT, platform TEXT, repo TEXT, subject TEXT, message TEXT,
+                author_name TEXT, author_email TEXT, commit_time_iso TEXT, {metric_cols},
+                PRIMARY KEY (repo_key, commit_sha));
+            CREATE TABLE IF NOT EXISTS daily (
+                bucket_key TEXT PRIMARY KEY, repo_key TEXT, day TEXT, author_name TEXT, author_email TEXT,
+                commits INTEGER, {metric_cols}, shas TEXT);
+            CREATE TABLE IF NOT EXISTS rollups (
+                bucket_key TEXT PRIMARY KEY, repo_key TEXT, day TEXT, dimension TEXT, value TEXT,
+                commits INTEGER, {", ".join(f"{k} INTEGER" for k in ROLLUP_KEYS)}, shas TEXT);
+        """)
+
+    def write_commit(self, repo_key, payload):
+        cols = ["commit_sha", "platform", "repo", "subject", "message", "author_name", "author_email", "commit_time_iso", *METRIC_KEYS]
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO commits (repo_key, {', '.join(cols)}) VALUES ({', '.join('?' * (len(cols) + 1))})",
+            [repo_key] + [payload[c] for c in cols],
+        )
+
+    def write_daily(self, bucket):
+        cols = ["commits", *METRIC_KEYS]
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO daily (bucket_key, repo_key, day, author_name, author_email, shas, {', '.join(cols)}) "
+            f"VALUES ({', '.join('?' * (len(cols) + 6))})",
+            [bucket["key"], bucket["repo_key"], bucket["day"], bucket["author_name"], bucket["author_email"],
+             json.dumps(bucket["shas"])] + [bucket["totals"][c] for c in cols],
+        )
+
+    def write_rollup(self, row):
+        cols = ["commits", *ROLLUP_KEYS]
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO rollups (bucket_key, repo_key, day, dimension, value, shas, {', '.join(cols)}) "
+            f"VALUES ({', '.join('?' * (len(cols) + 6))})",
+            [row["key"], row["repo_key"], row["day"], row["dimension"], row["value"],
+             json.dumps(row["shas"])] + [row["totals"][c] for c in cols],
+        )
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+LOCAL_SINKS = {
+    "jsonl": JsonlSink,
+    "csv": CsvSink,
+    "sqlite": SqliteSink,
+}
+
+def open_local_sink(name: str, path: Optional[str]) -> Sink:
+    if name not in LOCAL_SINKS:
+        raise ValueError(f"Unknown sink: {name}")
+    return LOCAL_SINKS[name](path or f"export.{name if name != 'sqlite' else 'db'}")
+
+def replay_jsonl(path: str, sink: Sink) -> int:
+    """把 JsonlSink 导出的文件逐条写入另一个 sink（通常是 Notion），返回写入的记录数。
+
+    逐 commit 记录由目标端自己去重；聚合桶只要包含回放开始前就已同步过的提交、汇总行只要包含已折叠进该行的提交，
+    就整条跳过，避免重复累加。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    synced_before = {
+        rec["bucket"]["key"] for rec in records
+        if (rec["kind"] == "daily" and any(sink.is_synced(rec["bucket"]["repo_key"], sha) for sha in rec["bucket"]["shas"]))
+        or (rec["kind"] == "rollup" and sink.rollup_shas(rec["bucket"]["key"]) & set(rec["bucket"]["shas"]))
+    }
+    n = 0
+    for rec in records:
+        if rec["kind"] == "commit":
+            sink.write_commit(rec["repo_key"], rec["payload"])
+        elif rec["bucket"]["key"] in synced_before:
+            print(f'Skipping {rec["kind"]} bucket with already-synced commits: {rec["bucket"]["key"]}')
+            continue
+        elif rec["kind"] == "daily":
+            sink.write_daily(rec["bucket"])
+        elif rec["kind"] == "rollup":
+            sink.write_rollup(rec["bucket"])
+        n += 1
+    return n
@@ -0,0 +1,241 @@
+"""
+本地同步状态（SQLite）：已写入 Notion 的 commit 去重表 + 每个仓库/分支的同步水位。
+
+多维度汇总的进度单独记录（rollup_buckets / rolled_up），不进 commit 去重表：
+commit 已写入但汇总还没落盘（中途崩溃、或先同步后才开启 rollup）的提交，下次运行仍会补进汇总。
+
+替代原来的 state.json：不再启动时整文件解析、结束时整文件重写，
+而是每写入一条就增量提交，进程中途崩溃也不会丢失已完成的进度。
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Set, Iterable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inserted (
+    repo_key TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    inserted_at TEXT NOT NULL,
+    PRIMARY KEY (repo_key, sha)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS watermarks (
+    repo_key TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    commit_time TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (repo_key, branch)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS daily_buckets (
+    bucket_key TEXT PRIMARY KEY,
+    page_id TEXT,
+    totals TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_buckets (
+    bucket_key TEXT PRIMARY KEY,
+    page_id TEXT,
+    totals TEXT NOT NULL,
+    shas TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rolled_up (
+    repo_key TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    rolled_up_at TEXT NOT NULL,
+    PRIMARY KEY (repo_key, sha)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS backfill_chunks (
+    repo_key TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    chunk_start TEXT NOT NULL,
+    chunk_end TEXT NOT NULL,
+    commits INTEGER NOT NULL,
+    done_at TEXT NOT NULL,
+    PRIMARY KEY (repo_key, branch, chunk_start, chunk_end)
+) WITHOUT ROWID;
+"""
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class StateStore:
+    """SQLite 去重/水位存储。
+
+    每个 repo 的已写入 SHA 在首次访问时整体读入内存 set，之后成员判断为 O(1)；
+    新写入的 SHA 同时写入内存和数据库（每条单独提交，WAL 模式下开销很小）。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._inserted: Dict[str, Set[str]] = {}
+        self._rolled_up: Dict[str, Set[str]] = {}
+
+    # ---- 去重 ----
+    def _repo_set(self, repo_key: str, table: str = "inserted") -> Set[str]:
+        cache = self._inserted if table == "inserted" else self._rolled_up
+        shas = cache.get(repo_key)
+        if shas is None:
+            rows = self.conn.execute(f"SELECT sha FROM {table} WHERE repo_key = ?", (repo_key,))
+            shas = {r[0] for r in rows}
+            cache[repo_key] = shas
+        return shas
+
+    def is_inserted(self, repo_key: str, sha: str) -> bool:
+        return sha in self._repo_set(repo_key)
+
+    def mark_inserted(self, repo_key: str, sha: str):
+        self.mark_inserted_many(repo_key, [sha])
+
+    def mark_inserted_many(self, repo_key: str, shas: Iterable[str]):
+        known = self._repo_set(repo_key)
+        new = [s for s in shas if s not in known]
+        if not new:
+            return
+        now = _now_iso()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO inserted (repo_key, sha, inserted_at) VALUES (?, ?, ?)",
+                [(repo_key, s, now) for s in new],
+            )
+        known.update(new)
+
+    def count_inserted(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT repo_key, COUNT(*) FROM inserted GROUP BY repo_key")
+        return {k: n for k, n in rows}
+
+    # ---- 水位 ----
+    def get_watermark(self, repo_key: str, branch: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT sha, commit_time, updated_at FROM watermarks WHERE repo_key = ? AND branch = ?",
+            (repo_key, branch),
+        ).fetchone()
+        if not row:
+            return None
+        return {"sha": row[0], "commit_time": row[1], "updated_at": row[2]}
+
+    def set_watermark(self, repo_key: str, branch: str, sha: str, commit_time: Optional[str] = None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO watermarks (repo_key, branch, sha, commit_time, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(repo_key, branch) DO UPDATE SET sha = excluded.sha, "
+                "commit_time = excluded.commit_time, updated_at = excluded.updated_at",
+                (repo_key, branch, sha, commit_time, _now_iso()),
+            )
+
+    # ---- 日报聚合桶 ----
+    def get_bucket(self, bucket_key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT page_id, totals FROM daily_buckets WHERE bucket_key = ?", (bucket_key,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"page_id": row[0], "totals": json.loads(row[1])}
+
+    def commit_bucket(self, bucket_key: str, page_id: str, totals: Dict[str, int], repo_key: str, shas: Iterable[str]):
+        """保存桶的累计值，并在同一事务中把折叠进去的 commit 标记为已写入。"""
+        known = self._repo_set(repo_key)
+        new = [s for s in shas if s not in known]
+        now = _now_iso()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO daily_buckets (bucket_key, page_id, totals, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(bucket_key) DO UPDATE SET page_id = excluded.page_id, "
+                "totals = excluded.totals, updated_at = excluded.updated_at",
+                (bucket_key, page_id, json.dumps(totals, sort_keys=True), now),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO inserted (repo_key, sha, inserted_at) VALUES (?, ?, ?)",
+                [(repo_key, s, now) for s in new],
+            )
+        known.update(new)
+
+    # ---- 多维度汇总 ----
+    def get_rollup(self, bucket_key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT page_id, totals, shas FROM rollup_buckets WHERE bucket_key = ?", (bucket_key,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"page_id": row[0], "totals": json.loads(row[1]), "shas": json.loads(row[2])}
+
+    def rollup_shas(self, bucket_key: str) -> Set[str]:
+        """已折叠进这一汇总行的 commit，重新喂给汇总时据此跳过，避免重复累加。"""
+        stored = self.get_rollup(bucket_key)
+        return set(stored["shas"]) if stored else set()
+
+    def commit_rollup(self, bucket_key: str, page_id: str, totals: Dict[str, int], shas: Iterable[str]):
+        """保存汇总行的累计值及折叠进去的 commit；不碰 commit 去重表。"""
+        merged = sorted(self.rollup_shas(bucket_key) | set(shas))
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO rollup_buckets (bucket_key, page_id, totals, shas, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(bucket_key) DO UPDATE SET page_id = excluded.page_id, "
+                "totals = excluded.totals, shas = excluded.shas, updated_at = excluded.updated_at",
+                (bucket_key, page_id, json.dumps(totals, sort_keys=True), json.dumps(merged), _now_iso()),
+            )
+
+    def is_rolled_up(self, repo_key: str, sha: str) -> bool:
+        return sha in self._repo_set(repo_key, "rolled_up")
+
+    def mark_rolled_up_many(self, repo_key: str, shas: Iterable[str]):
+        """一个仓库的汇总行全部写完后调用；之前崩溃的话这些 commit 下次会重新喂给汇总。"""
+        known = self._repo_set(repo_key, "rolled_up")
+        new = [s for s in dict.fromkeys(shas) if s not in known]
+        if not new:
+            return
+        now = _now_iso()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO rolled_up (repo_key, sha, rolled_up_at) VALUES (?, ?, ?)",
+                [(repo_key, s, now) for s in new],
+            )
+        known.update(new)
+
+    # ---- 回填断点 ----
+    def is_chunk_done(self, repo_key: str, branch: str, chunk: Dict[str, Any]) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM backfill_chunks WHERE repo_key = ? AND branch = ? AND chunk_start = ? AND chunk_end = ?",
+            (repo_key, branch, chunk["start_local"].isoformat(), chunk["end_local"].isoformat()),
+        ).fetchone() is not None
+
+    def mark_chunk_done(self, repo_key: str, branch: str, chunk: Dict[str, Any], commits: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO backfill_chunks (repo_key, branch, chunk_start, chunk_end, commits, done_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (repo_key, branch, chunk["start_local"].isoformat(), chunk["end_local"].isoformat(), commits, _now_iso()),
+            )
+
+    # ---- 迁移 / 关闭 ----
+    def import_legacy_json(self, json_path: Path) -> int:
+        """把旧版 state.json 的 inserted 映射导入数据库，返回导入的 SHA 数。"""
+        data = json.loads(Path(json_path).read_text(encoding="utf-8"))
+        total = 0
+        for repo_key, shas in data.get("inserted", {}).items():
+            self.mark_inserted_many(repo_key, list(shas))
+            total += len(shas)
+        return total
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
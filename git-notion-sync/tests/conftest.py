@@ -0,0 +1,37 @@
+"""
+测试用的本地 git 仓库：tmp_path 下 git init，按 (相对路径, 内容) 逐个提交。
+"""
+
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Tester", "GIT_AUTHOR_EMAIL": "tester@example.com",
+    "GIT_COMMITTER_NAME": "Tester", "GIT_COMMITTER_EMAIL": "tester@example.com",
+    "GIT_CONFIG_GLOBAL": os.devnull, "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+def git(repo: Path, *args: str, env=None) -> str:
+    return subprocess.run(["git", *args], cwd=repo, env={**os.environ, **GIT_ENV, **(env or {})},
+                          check=True, capture_output=True, text=True).stdout.strip()
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Return (path, commit) where commit(files, date=None) writes the files and commits them, returning the sha."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+
+    def commit(files, message="change", date=None):
+        for rel, content in files.items():
+            f = repo / rel
+            f.parent.mkdir(parents=True, exist_ok=True)
+            f.write_text(content, encoding="utf-8")
+        git(repo, "add", "-A")
+        git(repo, "commit", "-q", "-m", message, env={"GIT_AUTHOR_DATE": date, "GIT_COMMITTER_DATE": date} if date else None)
+        return git(repo, "rev-parse", "HEAD")
+
+    return repo, commit
@@ -0,0 +1,92 @@
+"""
+回填切块：块边界连续不重叠、提交按时间归块，中断后已完成的块不再重跑。
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from dateutil import tz
+
+from backfill import parse_backfill_range, split_chunks, assign_chunks
+from main import run_backfill
+from sinks import Sink
+from state_store import StateStore
+
+BERLIN = tz.gettz("Europe/Berlin")
+
+def _at(day, hour=12, minute=0, second=0, microsecond=0):
+    return datetime(2025, 3, day, hour, minute, second, microsecond, tzinfo=BERLIN)
+
+def test_split_chunks_boundaries():
+    window = parse_backfill_range("2025-03-01", "2025-03-16", BERLIN)
+    chunks = split_chunks(window, 7)
+    assert [(c["start_local"].date().day, c["end_local"].date().day) for c in chunks] == [(1, 7), (8, 14), (15, 16)]
+    assert chunks[0]["start_local"] == window["start_local"]
+    assert chunks[-1]["end_local"] == window["end_local"]
+    for a, b in zip(chunks, chunks[1:]):
+        # 相邻块首尾相接，中间没有空隙也不重叠
+        assert a["end_local"] + timedelta(microseconds=1) == b["start_local"]
+    assert len(split_chunks(window, 30)) == 1
+    assert len(split_chunks(parse_backfill_range("2025-03-01", "2025-03-01", BERLIN), 7)) == 1
+
+def test_parse_backfill_range_rejects_empty():
+    with pytest.raises(ValueError):
+        parse_backfill_range("2025-03-02", "2025-03-01", BERLIN)
+
+def test_assign_chunks_edges():
+    chunks = split_chunks(parse_backfill_range("2025-03-01", "2025-03-16", BERLIN), 7)
+    commits = [
+        {"sha": "last-of-first", "time": _at(7, 23, 59, 59, 999999)},
+        {"sha": "first", "time": _at(1, 0)},
+        {"sha": "second-start", "time": _at(8, 0)},
+        {"sha": "late", "time": _at(16, 23)},
+        {"sha": "before", "time": _at(1, 0) - timedelta(microseconds=1)},
+        {"sha": "mid", "time": _at(3)},
+    ]
+    grouped = assign_chunks(commits, chunks)
+    assert [[c["sha"] for c in g] for g in grouped] == [["first", "mid", "last-of-first"], ["second-start"], ["late"]]
+
+class CrashingSink(Sink):
+    name = "fake"
+    records_state = True
+
+    def __init__(self, store, crash_on=None):
+        self.store = store
+        self.crash_on = crash_on
+        self.written = []
+
+    def write_commit(self, repo_key, payload):
+        if payload["commit_sha"] == self.crash_on:
+            raise RuntimeError("crash")
+        self.written.append(payload["commit_sha"])
+        self.store.mark_inserted(repo_key, payload["commit_sha"])
+
+def test_backfill_resumes_after_crash(tmp_path, git_repo):
+    repo, commit = git_repo
+    shas = {day: commit({f"f{day}.py": "x\n" * day}, date=_at(day).isoformat()) for day in (2, 5, 9, 15)}
+    cfg = {
+        "repos": [{"platform": "github", "owner": "o", "repo": "r", "branch": "main", "local_cache_dir": str(repo)}],
+        "fetch": {"prefetch": False},
+        "git": {"backend": "subprocess"},
+    }
+    window = parse_backfill_range("2025-03-01", "2025-03-16", BERLIN)
+    store = StateStore(tmp_path / "state.db")
+    sink = CrashingSink(store, crash_on=shas[9])
+    with pytest.raises(RuntimeError):
+        run_backfill(cfg, sink, store, window, False, "first-parent", chunk_days=7, workers=1)
+    chunks = split_chunks(window, 7)
+    assert sink.written == [shas[2], shas[5]]
+    assert [store.is_chunk_done("github:o/r", "main", ch) for ch in chunks] == [True, False, False]
+
+    sink = CrashingSink(store)
+    run_backfill(cfg, sink, store, window, False, "first-parent", chunk_days=7, workers=1)
+    # 第一块已完成，不再列出；第二块从头重跑
+    assert sink.written == [shas[9], shas[15]]
+    assert all(store.is_chunk_done("github:o/r", "main", ch) for ch in chunks)
+    # 块大小不同则断点不通用
+    assert not store.is_chunk_done("github:o/r", "main", split_chunks(window, 3)[0])
+    store.close()
@@ -0,0 +1,51 @@
+"""
+diff 统计缓存：varint + zlib 编码往返、二进制文件、非 ASCII 路径、按 (sha, variant) 区分。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from diffstat_cache import DiffStatCache, encode_stats, decode_stats, RAW, ZLIB
+from utils import parse_numstat_z
+
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+def test_round_trip_small_and_empty():
+    for files in ([], [(0, 0, "a")], [(1, 2, "src/app.py"), (127, 128, "x"), (300, 2 ** 40, "big.bin.txt")]):
+        data = encode_stats(files)
+        assert data[0] == RAW
+        assert decode_stats(data) == files
+
+def test_round_trip_compressed_non_ascii():
+    files = [(i, i * 3, f"文档/第{i}章/说明 ✓.md") for i in range(200)]
+    data = encode_stats(files)
+    assert data[0] == ZLIB
+    assert len(data) < sum(len(p.encode("utf-8")) for _, _, p in files)
+    assert decode_stats(data) == files
+
+def test_binary_numstat_round_trip():
+    """git 对二进制文件输出 "-\t-"：解析时丢弃，缓存的是丢弃后的结果"""
+    out = "3\t1\tsrc/中文.py\0-\t-\tlogo.png\0" "2\t0\t\0old name.js\0新 名字.js\0"
+    files = parse_numstat_z(out)
+    assert files == [(3, 1, "src/中文.py"), (2, 0, "新 名字.js")]
+    assert decode_stats(encode_stats(files)) == files
+
+def test_cache_get_put_variants(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = DiffStatCache(path)
+    files = [(1, 1, "ä/ö.py")]
+    assert cache.get(SHA, "first-parent") is None
+    cache.put(SHA, "first-parent", files)
+    assert cache.has(SHA, "first-parent")
+    assert not cache.has(SHA, "first-parent+renames")
+    assert cache.get_or_compute(SHA, "first-parent+renames", lambda: []) == []
+    assert (cache.hits, cache.misses) == (0, 2)
+    cache.close()
+    cache = DiffStatCache(path)
+    calls = []
+    assert cache.get_or_compute(SHA, "first-parent", lambda: calls.append(1) or []) == files
+    assert calls == [] and cache.hits == 1
+    assert cache.size()["entries"] == 2
+    cache.close()
@@ -0,0 +1,93 @@
+"""
+排除规则：gitattributes 模式归一化、glob -> 正则（与 git 的 glob pathspec 一致）、后写的规则覆盖先写的。
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from conftest import git
+from exclusions import ExclusionRules, glob_to_regex, normalize_glob, parse_gitattributes, load_exclusions
+
+def full(glob, path):
+    return re.fullmatch(glob_to_regex(glob), path) is not None
+
+def test_double_star():
+    assert full("**/*.min.js", "a.min.js")
+    assert full("**/*.min.js", "web/dist/a.min.js")
+    assert full("vendor/**", "vendor/x/y.go")
+    assert not full("vendor/**", "vendor")
+    assert full("a/**/b.txt", "a/b.txt")
+    assert full("a/**/b.txt", "a/x/y/b.txt")
+    assert not full("a/**/b.txt", "xa/b.txt")
+
+def test_single_star_and_brackets():
+    assert full("*.lock", "yarn.lock")
+    assert not full("*.lock", "sub/yarn.lock")
+    assert full("gen/?.py", "gen/a.py")
+    assert not full("gen/?.py", "gen/ab.py")
+    assert full("[!a]*.py", "b.py") and not full("[!a]*.py", "a.py")
+    assert full("a+b(1).txt", "a+b(1).txt")
+
+def test_normalize_glob():
+    # 不含 / 的模式匹配任意层级；以 / 开头的相对仓库根目录
+    assert normalize_glob("*.min.js") == "**/*.min.js"
+    assert normalize_glob("/dist/*.js") == "dist/*.js"
+    assert normalize_glob("docs/api/*.md") == "docs/api/*.md"
+    # 目录模式在 gitattributes 中不匹配文件
+    assert normalize_glob("vendor/") is None
+    assert normalize_glob("  ") is None
+
+def test_leading_slash_is_anchored():
+    rules = ExclusionRules([normalize_glob("/package-lock.json")])
+    assert rules.matches("package-lock.json")
+    assert not rules.matches("web/package-lock.json")
+    rules = ExclusionRules([normalize_glob("package-lock.json")])
+    assert rules.matches("web/package-lock.json")
+
+def test_gitattributes_negation_order():
+    text = "\n".join([
+        "# comment",
+        "*.pb.go linguist-generated",
+        "vendor/** linguist-vendored",
+        "dist/ linguist-generated",
+        "*.pb.go -linguist-generated",      # 后写的覆盖先写的
+        "api.pb.go linguist-generated=true",
+        "vendor/** linguist-vendored=false",
+        "third_party/** !linguist-vendored",
+        "third_party/** linguist-vendored",
+        "docs/** linguist-documentation",
+        "[attr]binary -diff",
+    ])
+    assert sorted(parse_gitattributes(text)) == ["**/api.pb.go", "third_party/**"]
+
+def test_empty_rules():
+    rules = ExclusionRules([])
+    assert not rules and rules.fingerprint == "" and not rules.matches("a.py")
+    assert ExclusionRules(["b", "a"]).fingerprint == ExclusionRules(["a", "b", "a"]).fingerprint
+
+PATHS = [
+    "yarn.lock", "web/yarn.lock", "web/dist/app.min.js", "app.min.js", "vendor/lib/x.go", "vendorized.go",
+    "src/vendor/y.go", "gen/a.py", "gen/sub/a.py", "docs/中文.md", "a b/c.txt",
+]
+
+def test_matches_agree_with_git_pathspec(git_repo):
+    """正则过滤（pygit2 后端）与 :(exclude,glob) pathspec（subprocess 后端）排除的是同一批文件"""
+    repo, commit = git_repo
+    commit({p: "x\n" for p in PATHS})
+    globs = [g for g in map(normalize_glob, ["yarn.lock", "*.min.js", "/vendor/**", "gen/*.py", "docs/*.md", "a b/*"]) if g]
+    rules = ExclusionRules(globs)
+    kept_by_git = set(git(repo, "-c", "core.quotePath=false", "ls-files", "--", ".", *rules.pathspecs).splitlines())
+    kept_by_regex = {p for p in PATHS if not rules.matches(p)}
+    assert kept_by_regex == kept_by_git == {"vendorized.go", "src/vendor/y.go", "gen/sub/a.py"}
+
+def test_load_exclusions_linguist_is_opt_in(git_repo):
+    repo, commit = git_repo
+    commit({".gitattributes": "*.pb.go linguist-generated\n", "a.pb.go": "x\n"})
+    assert not load_exclusions(repo, "main", {})
+    assert load_exclusions(repo, "main", {"linguist": True}).matches("sub/a.pb.go")
+    assert load_exclusions(repo, "main", {"globs": ["*.lock"]}).globs == ["**/*.lock"]
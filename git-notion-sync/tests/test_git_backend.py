@@ -0,0 +1,48 @@
+"""
+pygit2 后端与 subprocess 后端结果一致；partial clone 里缺失的 tree/blob 由 git 懒加载补上。
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from conftest import git
+from git_backend import Pygit2Backend, SubprocessBackend, get_backend, pygit2
+
+WINDOW = {"start_local": datetime(2000, 1, 1, tzinfo=timezone.utc), "end_local": datetime(2100, 1, 1, tzinfo=timezone.utc)}
+
+pytestmark = pytest.mark.skipif(pygit2 is None, reason="pygit2 not installed")
+
+def _history(commit):
+    for i in range(3):
+        commit({"a.py": "".join(f"line {j}\n" for j in range(i + 1)), "web/b.js": f"v{i}\n"})
+
+def test_backends_agree(git_repo):
+    repo, commit = git_repo
+    _history(commit)
+    backend = get_backend("auto")
+    assert backend.name == "pygit2"
+    commits = list(backend.iter_commits_in_window(repo, "main", WINDOW))
+    assert len(commits) == 3
+    for c in commits:
+        assert backend.numstat_for_commit(repo, c) == SubprocessBackend().numstat_for_commit(repo, c)
+
+@pytest.mark.parametrize("filter_spec", ["tree:0", "blob:none"])
+def test_partial_clone_without_prefetch(git_repo, tmp_path, filter_spec):
+    """没有 prefetch 的 partial clone：pygit2 读不到对象时对该 commit 回退到 git diff"""
+    repo, commit = git_repo
+    _history(commit)
+    git(repo, "config", "uploadpack.allowFilter", "true")
+    clone = tmp_path / "clone"
+    git(tmp_path, "clone", "-q", "--no-tags", f"--filter={filter_spec}", "--no-checkout", "--single-branch",
+        "--branch", "main", f"file://{repo}", str(clone))
+    backend = Pygit2Backend()
+    ref = "refs/remotes/origin/main"
+    commits = list(backend.iter_commits_in_window(clone, ref, WINDOW))
+    assert len(commits) == 3
+    expected = [SubprocessBackend().numstat_for_commit(repo, c) for c in commits]
+    assert [backend.numstat_for_commit(clone, c) for c in commits] == expected
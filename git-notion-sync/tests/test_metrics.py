@@ -0,0 +1,55 @@
+"""
+运行指标：分阶段计时、计数器、吞吐与 Prometheus textfile。
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from metrics import Metrics, Histogram
+
+def test_stages_and_throughput():
+    m = Metrics()
+    for _ in range(3):
+        with m.stage("numstat"):
+            pass
+    with pytest.raises(RuntimeError):
+        with m.stage("write"):
+            raise RuntimeError("boom")
+    m.incr("commits", 6)
+    m.incr("files", 12)
+    summary = json.loads(m.dumps())
+    assert summary["stages"]["numstat"]["calls"] == 3
+    # 抛异常的阶段也计时
+    assert summary["stages"]["write"]["calls"] == 1
+    assert summary["counters"] == {"commits": 6, "files": 12}
+    assert summary["files_per_sec"] == pytest.approx(2 * summary["commits_per_sec"], rel=0.05)
+    m.reset()
+    assert m.summary()["commits_per_sec"] is None
+
+def test_histogram_quantiles():
+    h = Histogram([0.1, 1.0])
+    for v in (0.05, 0.05, 0.5, 3.0):
+        h.observe(v)
+    assert h.quantile(0.5) == 0.1
+    assert h.quantile(0.75) == 1.0
+    assert h.quantile(1.0) == 3.0
+    assert h.summary()["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+
+def test_write_prometheus(tmp_path):
+    m = Metrics()
+    with m.stage("fetch"):
+        pass
+    m.incr("commits", 2)
+    m.observe("notion_request_seconds", 0.3)
+    path = tmp_path / "textfile" / "sync.prom"
+    m.write_prometheus(str(path))
+    text = path.read_text(encoding="utf-8")
+    assert 'git_notion_sync_stage_calls{stage="fetch"} 1' in text
+    assert "git_notion_sync_commits 2" in text
+    assert 'git_notion_sync_notion_request_seconds_bucket{le="+Inf"} 1' in text
+    assert os.listdir(path.parent) == ["sync.prom"]
@@ -0,0 +1,122 @@
+"""
+多维度汇总的进度与 commit 去重分开记录：commit 写入后、汇总落盘前崩溃，下次运行要把这些 commit 补进汇总，且不重复累加。
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from dateutil import tz
+
+from main import sync_all, run_backfill
+from aggregate import merge_totals
+from backfill import parse_backfill_range
+from sinks import Sink
+from state_store import StateStore
+
+class FakeNotionSink(Sink):
+    """与 NotionSink 同样读写 state.db，页面存在内存里；crash_after 行汇总写完后抛异常模拟进程崩溃。"""
+    name = "fake"
+    records_state = True
+
+    def __init__(self, store, crash_after=None):
+        self.store = store
+        self.crash_after = crash_after
+        self.commits = []
+
+    def write_commit(self, repo_key, payload):
+        self.commits.append(payload["commit_sha"])
+        self.store.mark_inserted(repo_key, payload["commit_sha"])
+
+    def write_rollup(self, row):
+        if self.crash_after is not None and self.crash_after <= 0:
+            raise RuntimeError("crash before rollup flush")
+        stored = self.store.get_rollup(row["key"])
+        totals = merge_totals(stored["totals"], row["totals"]) if stored else row["totals"]
+        self.store.commit_rollup(row["key"], "page", totals, row["shas"])
+        if self.crash_after is not None:
+            self.crash_after -= 1
+
+def _cfg(repo, mode="watermark"):
+    return {
+        "repos": [{"platform": "github", "owner": "t", "repo": "r", "branch": "main", "local_cache_dir": str(repo)}],
+        "time": {"mode": mode},
+        "rollup": {"enabled": True, "dimensions": ["author", "ext"]},
+        "fetch": {"prefetch": False},
+        "git": {"backend": "subprocess"},
+        "cache": {"diffstat_path": ""},
+    }
+
+def _window():
+    now = datetime.now(tz.gettz("Europe/Berlin"))
+    return {"start_local": now - timedelta(days=1), "end_local": now + timedelta(hours=1)}
+
+def _rollup(store, suffix):
+    keys = [k for (k,) in store.conn.execute("SELECT bucket_key FROM rollup_buckets") if k.endswith(suffix)]
+    assert len(keys) == 1, keys
+    return store.get_rollup(keys[0])
+
+@pytest.fixture
+def repo_with_commits(git_repo):
+    repo, commit = git_repo
+    shas = [commit({"a.py": "1\n"}), commit({"b.py": "1\n2\n"}), commit({"c.js": "1\n2\n3\n"})]
+    return repo, shas
+
+@pytest.mark.parametrize("crash_after", [0, 1])
+def test_crash_before_rollup_flush(tmp_path, repo_with_commits, crash_after):
+    """commit 已写入、汇总行没写完就崩溃：重跑后汇总包含全部 commit，已写过的行不重复累加"""
+    repo, shas = repo_with_commits
+    store = StateStore(tmp_path / "state.db")
+    cfg = _cfg(repo)
+    with pytest.raises(RuntimeError):
+        sync_all(cfg, FakeNotionSink(store, crash_after=crash_after), store, _window(), False, "first-parent")
+    assert all(store.is_inserted("github:t/r", s) for s in shas)
+    assert not any(store.is_rolled_up("github:t/r", s) for s in shas)
+    # 汇总没写完时水位不能越过这些 commit
+    assert store.get_watermark("github:t/r", "main") is None
+
+    sink = FakeNotionSink(store)
+    sync_all(cfg, sink, store, _window(), False, "first-parent")
+    assert sink.commits == []
+    assert all(store.is_rolled_up("github:t/r", s) for s in shas)
+    row = _rollup(store, ":author=tester@example.com")
+    assert row["totals"]["commits"] == 3 and row["totals"]["lines_added"] == 6
+    assert sorted(row["shas"]) == sorted(shas)
+    py = _rollup(store, ":ext=.py")
+    assert py["totals"]["commits"] == 2 and py["totals"]["lines_added"] == 3
+
+    # 再跑一次不会重复累加
+    sync_all(cfg, FakeNotionSink(store), store, _window(), False, "first-parent")
+    assert _rollup(store, ":author=tester@example.com")["totals"]["commits"] == 3
+    store.close()
+
+def test_commits_synced_before_rollups_enabled(tmp_path, repo_with_commits):
+    """先不开汇总同步过的 commit，开启汇总后的运行仍会进汇总"""
+    repo, shas = repo_with_commits
+    store = StateStore(tmp_path / "state.db")
+    cfg = _cfg(repo, mode="window")
+    sync_all({**cfg, "rollup": {"enabled": False}}, FakeNotionSink(store), store, _window(), False, "first-parent")
+    assert all(store.is_inserted("github:t/r", s) for s in shas)
+    sink = FakeNotionSink(store)
+    sync_all(cfg, sink, store, _window(), False, "first-parent")
+    assert sink.commits == []
+    assert _rollup(store, ":author=tester@example.com")["totals"]["commits"] == 3
+    store.close()
+
+def test_backfill_crash_before_rollup_flush(tmp_path, repo_with_commits):
+    """回填时同样：块内 commit 已写入但汇总没落盘，重跑该块补进汇总"""
+    repo, shas = repo_with_commits
+    store = StateStore(tmp_path / "state.db")
+    cfg = _cfg(repo, mode="window")
+    today = datetime.now(tz.gettz("Europe/Berlin")).date().isoformat()
+    bf_window = parse_backfill_range(today, today, tz.gettz("Europe/Berlin"))
+    with pytest.raises(RuntimeError):
+        run_backfill(cfg, FakeNotionSink(store, crash_after=0), store, bf_window, False, "first-parent", workers=1)
+    sink = FakeNotionSink(store)
+    run_backfill(cfg, sink, store, bf_window, False, "first-parent", workers=1)
+    assert sink.commits == []
+    assert _rollup(store, ":author=tester@example.com")["totals"]["commits"] == 3
+    store.close()
@@ -0,0 +1,73 @@
+"""
+SQLite 状态存储：去重、水位读写、日报聚合桶与去重标记同一事务落盘。
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from state_store import StateStore
+
+REPO = "github:o/r"
+
+def test_dedupe_survives_reopen(tmp_path):
+    path = tmp_path / "state.db"
+    with StateStore(path) as store:
+        assert not store.is_inserted(REPO, "a")
+        store.mark_inserted(REPO, "a")
+        store.mark_inserted_many(REPO, ["a", "b", "b"])
+        assert store.is_inserted(REPO, "a") and store.is_inserted(REPO, "b")
+        # 去重按仓库区分
+        assert not store.is_inserted("gitee:o/r", "a")
+        assert store.count_inserted() == {REPO: 2}
+    with StateStore(path) as store:
+        assert store.is_inserted(REPO, "b")
+        assert store.count_inserted() == {REPO: 2}
+
+def test_watermark_round_trip(tmp_path):
+    path = tmp_path / "state.db"
+    with StateStore(path) as store:
+        assert store.get_watermark(REPO, "main") is None
+        store.set_watermark(REPO, "main", "a" * 40, "2025-03-01T10:00:00+01:00")
+        store.set_watermark(REPO, "main", "b" * 40, "2025-03-02T10:00:00+01:00")
+        store.set_watermark(REPO, "dev", "c" * 40)
+    with StateStore(path) as store:
+        wm = store.get_watermark(REPO, "main")
+        assert (wm["sha"], wm["commit_time"]) == ("b" * 40, "2025-03-02T10:00:00+01:00")
+        assert wm["updated_at"]
+        assert store.get_watermark(REPO, "dev")["commit_time"] is None
+
+def test_commit_bucket(tmp_path):
+    with StateStore(tmp_path / "state.db") as store:
+        store.mark_inserted(REPO, "a")
+        store.commit_bucket("daily:1", "page-1", {"commits": 2}, REPO, ["a", "b"])
+        assert store.get_bucket("daily:1") == {"page_id": "page-1", "totals": {"commits": 2}}
+        assert store.is_inserted(REPO, "b")
+        store.commit_bucket("daily:1", "page-1", {"commits": 3}, REPO, ["c"])
+        assert store.get_bucket("daily:1")["totals"] == {"commits": 3}
+        assert store.count_inserted() == {REPO: 3}
+
+def test_commit_bucket_is_atomic(tmp_path):
+    """标记去重失败时桶的累计值也不落盘，内存里的去重集合也不变"""
+    path = tmp_path / "state.db"
+    with StateStore(path) as store:
+        store.commit_bucket("daily:1", "page-1", {"commits": 1}, REPO, ["a"])
+        with pytest.raises(Exception):
+            # 无法绑定为 SQL 参数的 SHA：第二条语句失败，整个事务回滚
+            store.commit_bucket("daily:1", "page-1", {"commits": 3}, REPO, ["b", object()])
+        assert store.get_bucket("daily:1")["totals"] == {"commits": 1}
+        assert not store.is_inserted(REPO, "b")
+    with StateStore(path) as store:
+        assert store.get_bucket("daily:1")["totals"] == {"commits": 1}
+        assert store.count_inserted() == {REPO: 1}
+
+def test_import_legacy_json(tmp_path):
+    legacy = tmp_path / "state.json"
+    legacy.write_text(json.dumps({"inserted": {REPO: ["a", "b"], "gitee:o/r": ["c"]}}), encoding="utf-8")
+    with StateStore(tmp_path / "state.db") as store:
+        assert store.import_legacy_json(legacy) == 3
+        assert store.is_inserted(REPO, "a") and store.is_inserted("gitee:o/r", "c")
@@ -3,8 +3,9 @@ import fnmatch
 from pathlib import Path
 from datetime import datetime, timedelta
 from dateutil import tz
-from subprocess import check_output, CalledProcessError, STDOUT
-from typing import Dict, Any, List, Tuple
+from subprocess import check_output, CalledProcessError, TimeoutExpired, STDOUT, PIPE
+from typing import Dict, Any, List, Tuple, Optional
+from metrics import METRICS
 
 def repo_cache_dir(repo_cfg: Dict[str,Any]) -> Path:
     if repo_cfg.get("local_cache_dir"):
@@ -16,8 +17,48 @@ def repo_cache_dir(repo_cfg: Dict[str,Any]) -> Path:
         safe = f'{repo_cfg["owner"]}__{repo_cfg["repo"]}'
     return Path("repos") / platform / safe
 
-def ensure_repo(repo_cfg: Dict[str,Any]) -> Path:
-    """Clone or fetch repo, return local path."""
+def remote_url(repo_cfg: Dict[str,Any]) -> str:
+    url = repo_cfg.get("url")
+    if url:
+        return url
+    owner = repo_cfg["owner"]
+    repo = repo_cfg["repo"]
+    if repo_cfg["platform"] == "github":
+        token = os.environ.get("GITHUB_TOKEN", "")
+        if token:
+            return f"https://{token}@github.com/{owner}/{repo}.git"
+        return f"https://github.com/{owner}/{repo}.git"
+    elif repo_cfg["platform"] == "gitee":
+        token = os.environ.get("GITEE_TOKEN", "")
+        if token:
+            return f"https://{token}@gitee.com/{owner}/{repo}.git"
+        return f"https://gitee.com/{owner}/{repo}.git"
+    raise ValueError("Unsupported platform: " + repo_cfg["platform"])
+
+def repo_display_name(repo_cfg: Dict[str,Any]) -> str:
+    return repo_cfg["url"] if repo_cfg.get("url") else f'{repo_cfg["owner"]}/{repo_cfg["repo"]}'
+
+def repo_state_key(repo_cfg: Dict[str,Any]) -> str:
+    """Key used for dedupe/watermark state, e.g. "github:owner/repo"."""
+    name = f'{repo_cfg.get("owner","")}/{repo_cfg.get("repo","")}' if not repo_cfg.get("url") else repo_cfg["url"]
+    return f'{repo_cfg["platform"]}:{name}'
+
+def repo_ref(repo_cfg: Dict[str,Any]) -> str:
+    """The ref to read commits from: the user's own branch for local_cache_dir, else the fetched remote-tracking ref."""
+    branch = repo_cfg.get("branch", "main")
+    if repo_cfg.get("local_cache_dir"):
+        return branch
+    return f"refs/remotes/origin/{branch}"
+
+def ensure_repo(repo_cfg: Dict[str,Any], since: Optional[datetime]=None, fetch_cfg: Optional[Dict[str,Any]]=None) -> Path:
+    """Clone or fetch repo, return local path.
+
+    Only the configured branch is fetched. With `since`, new clones are shallow from that date
+    and existing shallow clones are deepened/trimmed to it. The fetch is skipped entirely when
+    `git ls-remote` shows the remote tip equals the local remote-tracking ref and the shallow
+    history already reaches `since`.
+    """
+    fetch_cfg = fetch_cfg or {}
     path = repo_cache_dir(repo_cfg)
     path.parent.mkdir(parents=True, exist_ok=True)
     
@@ -28,66 +69,180 @@ def ensure_repo(repo_cfg: Dict[str,Any]) -> Path:
         if not (path / ".git").exists():
             raise ValueError(f"Local cache directory is not a git repository: {path}")
         return path
-    
+
+    branch = repo_cfg.get("branch", "main")
+    shallow_since = None
+    if since is not None and fetch_cfg.get("shallow_since", True):
+        shallow_since = (since - timedelta(days=fetch_cfg.get("shallow_margin_days", 2))).strftime("%Y-%m-%d")
+
     if not path.exists():
-        url = repo_cfg.get("url")
-        if not url:
-            owner = repo_cfg["owner"]
-            repo = repo_cfg["repo"]
-            if repo_cfg["platform"] == "github":
-                token = os.environ.get("GITHUB_TOKEN", "")
-                if token:
-                    url = f"https://{token}@github.com/{owner}/{repo}.git"
-                else:
-                    url = f"https://github.com/{owner}/{repo}.git"
-            elif repo_cfg["platform"] == "gitee":
-                token = os.environ.get("GITEE_TOKEN", "")
-                if token:
-                    url = f"https://{token}@gitee.com/{owner}/{repo}.git"
-                else:
-                    url = f"https://gitee.com/{owner}/{repo}.git"
-            else:
-                raise ValueError("Unsupported platform: " + repo_cfg["platform"])
-        cmd = ["git", "clone", "--no-tags", "--filter=tree:0", url, str(path)]
+        # --no-checkout: 统计不需要工作区，避免 partial clone 为检出而拉取整棵树的 blob
+        cmd = ["git", "clone", "--no-tags", "--filter=tree:0", "--no-checkout", "--single-branch", "--branch", branch]
+        if shallow_since:
+            cmd.append(f"--shallow-since={shallow_since}")
+        cmd.extend([remote_url(repo_cfg), str(path)])
         run(cmd, cwd=".")
-    # fetch
-    run(["git", "fetch", "--all", "--prune"], cwd=path)
+        if shallow_since:
+            record_shallow_since(path, shallow_since)
+        return path
+
+    # 浅克隆的边界晚于 since 时（回填、水位线往前调），远端没有新提交也要加深
+    deepen = bool(shallow_since) and not shallow_covers(path, shallow_since)
+    if fetch_cfg.get("skip_unchanged", True) and not deepen:
+        remote_tip = ls_remote_tip(path, branch)
+        if remote_tip and remote_tip == local_ref_sha(path, f"refs/remotes/origin/{branch}"):
+            print(f"{path}: origin/{branch} unchanged at {short_sha(remote_tip)}, skipping fetch")
+            METRICS.incr("fetches_skipped")
+            return path
+
+    # fetch only the configured branch
+    cmd = ["git", "fetch", "--prune", "--no-tags", "origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}"]
+    shallow = shallow_since and is_shallow(path)
+    if shallow:
+        cmd.append(f"--shallow-since={shallow_since}")
+    run(cmd, cwd=path)
+    if shallow:
+        record_shallow_since(path, shallow_since)
     return path
 
-def run(cmd, cwd=".") -> str:
+def unshallow(repo_cfg: Dict[str,Any], repo_path: Path):
+    """Fetch the full history of the configured branch (a no-op for local_cache_dir repos)."""
+    if repo_cfg.get("local_cache_dir") or not is_shallow(repo_path):
+        return
+    branch = repo_cfg.get("branch", "main")
+    run(["git", "fetch", "--unshallow", "--no-tags", "origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}"], cwd=repo_path)
+
+# ensure_repo 用过的 --shallow-since 日期（YYYY-MM-DD），记在克隆自己的 git config 里
+SHALLOW_SINCE_KEY = "gitnotionsync.shallowsince"
+
+def record_shallow_since(repo_path: Path, shallow_since: str):
+    run(["git", "config", SHALLOW_SINCE_KEY, shallow_since], cwd=repo_path)
+
+def shallow_covers(repo_path: Path, shallow_since: str) -> bool:
+    """True when the clone is complete or its recorded shallow date is no later than `shallow_since`."""
+    start = shallow_history_start(repo_path)
+    return start is None or start.strftime("%Y-%m-%d") <= shallow_since
+
+def shallow_history_start(repo_path: Path) -> Optional[datetime]:
+    """Date from which the local history is known to be complete; None for a full (non-shallow) clone.
+
+    Uses the --shallow-since date recorded by ensure_repo. For shallow clones made some other way
+    it falls back to the newest shallow boundary commit, which is conservative.
+    """
+    if not is_shallow(repo_path):
+        return None
+    METRICS.incr("subprocesses")
+    try:
+        recorded = check_output(["git", "config", "--get", SHALLOW_SINCE_KEY], cwd=repo_path, text=True).strip()
+    except CalledProcessError:
+        recorded = ""
+    if recorded:
+        return datetime.strptime(recorded, "%Y-%m-%d")
+    shallow_file = Path(repo_path) / run(["git", "rev-parse", "--git-path", "shallow"], cwd=repo_path).strip()
+    boundary = shallow_file.read_text().split() if shallow_file.exists() else []
+    if not boundary:
+        return None
+    dates = run(["git", "log", "--no-walk=unsorted", "--stdin", "--format=%cI"], cwd=repo_path, input="\n".join(boundary) + "\n").split()
+    # 边界提交当天更早的提交可能不在本地，从次日算起
+    newest = max(datetime.fromisoformat(d.replace("Z", "+00:00")) for d in dates)
+    return datetime.combine(newest.date() + timedelta(days=1), datetime.min.time())
+
+def ls_remote_tip(repo_path: Path, branch: str) -> Optional[str]:
+    out = run(["git", "ls-remote", "origin", f"refs/heads/{branch}"], cwd=repo_path)
+    for line in out.splitlines():
+        parts = line.split("\t")
+        if len(parts) == 2 and parts[1] == f"refs/heads/{branch}":
+            return parts[0]
+    return None
+
+def local_ref_sha(repo_path: Path, ref: str) -> Optional[str]:
+    METRICS.incr("subprocesses")
+    try:
+        return check_output(["git", "rev-parse", "--verify", "--quiet", ref], cwd=repo_path, text=True).strip() or None
+    except CalledProcessError:
+        return None
+
+def is_shallow(repo_path: Path) -> bool:
+    return run(["git", "rev-parse", "--is-shallow-repository"], cwd=repo_path).strip() == "true"
+
+def is_partial_clone(repo_path: Path) -> bool:
+    METRICS.incr("subprocesses")
+    try:
+        return check_output(["git", "config", "--get", "remote.origin.promisor"], cwd=repo_path, text=True).strip() == "true"
+    except CalledProcessError:
+        return False
+
+def fetch_objects(repo_path: Path, oids: List[str], filter_spec: Optional[str]=None):
+    """Fetch specific objects from the promisor remote in one request (what git's lazy fetch does one object at a time)."""
+    if not oids:
+        return
+    cmd = ["git", "-c", "fetch.negotiationAlgorithm=noop", "fetch", "origin", "--no-tags",
+           "--no-write-fetch-head", "--recurse-submodules=no", "--stdin"]
+    if filter_spec:
+        cmd.append(f"--filter={filter_spec}")
+    run(cmd, cwd=repo_path, input="\n".join(oids) + "\n")
+
+def prefetch_diff_objects(repo_path: Path, commits: List[Dict[str,Any]], pathspecs: Optional[List[str]]=None):
+    """Batch-fetch the trees and blobs that numstat will need for `commits` (first-parent diffs).
+
+    A --filter=tree:0 clone has commits only; without this every diff lazily fetches its
+    trees and blobs from the promisor remote one round trip at a time.
+    """
+    if not commits or not is_partial_clone(repo_path):
+        return
+    pairs = [(c["sha"], c["parents"][0] if c.get("parents") else None) for c in commits]
+    wanted = sorted({x for pair in pairs for x in pair if x})
+    # 1) root trees of each commit and its first parent (blob:none => whole tree, no file contents)
+    trees = run(["git", "log", "--no-walk=unsorted", "--stdin", "--format=%T"], cwd=repo_path, input="\n".join(wanted) + "\n").split()
+    fetch_objects(repo_path, sorted(set(trees)), filter_spec="blob:none")
+    # 2) old/new blobs of every changed file (trees are local now, so diff-tree --raw needs no fetch)
+    lines = "".join(f"{sha} {parent}\n" if parent else f"{sha}\n" for sha, parent in pairs)
+    # 被排除的文件不参与 diff，它们的 blob 也不必拉取
+    out = run(["git", "diff-tree", "--stdin", "--root", "-r", "--raw", "--no-renames", "-z", *(["--", *pathspecs] if pathspecs else [])], cwd=repo_path, input=lines)
+    blobs = set()
+    for field in out.split("\0"):
+        if not field.startswith(":"):
+            continue
+        old_mode, new_mode, old_oid, new_oid = field[1:].split(" ")[:4]
+        for mode, oid in ((old_mode, old_oid), (new_mode, new_oid)):
+            if mode != "160000" and oid.strip("0"):
+                blobs.add(oid)
+    fetch_objects(repo_path, sorted(blobs))
+    METRICS.incr("prefetched_objects", len(set(trees)) + len(blobs))
+    print(f"{repo_path}: prefetched {len(set(trees))} trees and {len(blobs)} blobs for {len(commits)} commits")
+
+def run(cmd, cwd=".", input: Optional[str]=None, timeout: Optional[float]=None) -> str:
+    # stderr 单独收集：partial clone 懒加载/自动 gc 的提示信息不能混进要解析的输出
+    METRICS.incr("subprocesses")
     try:
-        out = check_output(cmd, cwd=cwd, stderr=STDOUT, text=True)
+        out = check_output(cmd, cwd=cwd, stderr=PIPE, text=True, input=input, timeout=timeout)
         return out
     except CalledProcessError as e:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{e.output}")
+        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{e.output}{e.stderr}")
 
-def iter_commits_in_window(repo_path: Path, branch: str, window: Dict[str,Any], include_merges: bool=False):
-    """Yield commits with metadata that fall into [start,end] (aware datetimes in local tz)."""
-    # First, get commits on branch with ISO dates
-    # Format placeholders: %H sha, %an author name, %ae author email, %cI committer date iso, %s subject, %B body
-    fmt = "%H%x1f%an%x1f%ae%x1f%cI%x1f%s%x1f%B%x1e"
-    out = run(["git", "log", "--first-parent", f"--format={fmt}", branch], cwd=repo_path)
-    records = out.strip().split("\x1e")
-    start = window["start_local"]
-    end = window["end_local"]
+EMPTY_TREE_SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
 
-    for rec in records:
+LOG_FORMAT = "%H%x1f%P%x1f%an%x1f%ae%x1f%cI%x1f%s%x1f%B%x1e"
+
+def iter_log(repo_path: Path, rev_args: List[str], tzinfo=None, include_merges: bool=False):
+    """Yield first-parent commits selected by `rev_args` (e.g. [branch] or [f"{a}..{b}", "--reverse"])."""
+    # Format placeholders: %H sha, %P parents, %an author name, %ae author email, %cI committer date iso, %s subject, %B body
+    out = run(["git", "log", "--first-parent", f"--format={LOG_FORMAT}", *rev_args], cwd=repo_path)
+    for rec in out.split("\x1e"):
         if not rec.strip():
             continue
         parts = rec.strip().split("\x1f")
-        sha, an, ae, ciso, subject, body = parts[0], parts[1], parts[2], parts[3], parts[4], parts[5]
-        t = datetime.fromisoformat(ciso.replace("Z","+00:00")).astimezone(start.tzinfo)
-        if t < start or t > end:
-            continue
-
-        if not include_merges:
+        sha, parents, an, ae, ciso, subject, body = parts[0], parts[1], parts[2], parts[3], parts[4], parts[5], parts[6]
+        parents = parents.split()
+        if not include_merges and len(parents) > 1:
             # skip merges (more than one parent)
-            parents = run(["git", "rev-list", "--parents", "-n", "1", sha], cwd=repo_path).strip().split()
-            if len(parents) > 2:
-                continue
-
+            continue
+        t = datetime.fromisoformat(ciso.replace("Z","+00:00"))
+        if tzinfo is not None:
+            t = t.astimezone(tzinfo)
         yield {
             "sha": sha,
+            "parents": parents,
             "author_name": an,
             "author_email": ae,
             "time": t,
@@ -95,30 +250,137 @@ def iter_commits_in_window(repo_path: Path, branch: str, window: Dict[str,Any],
             "message": (subject + "\n\n" + body).strip()
         }
 
-def numstat_for_commit(repo_path: Path, commit: Dict[str,Any], diff_base: str="first-parent") -> List[Tuple[int,int,str]]:
-    """Return list of (added, deleted, path) for files in this commit, ignoring binary."""
+def iter_commits_in_window(repo_path: Path, branch: str, window: Dict[str,Any], include_merges: bool=False):
+    """Yield commits with metadata that fall into [start,end] (aware datetimes in local tz)."""
+    start = window["start_local"]
+    end = window["end_local"]
+    for c in iter_log(repo_path, [branch], tzinfo=start.tzinfo, include_merges=include_merges):
+        if c["time"] < start or c["time"] > end:
+            continue
+        yield c
+
+def iter_commits_since(repo_path: Path, since_sha: str, branch: str, tzinfo=None, include_merges: bool=False):
+    """Yield commits in `since_sha..branch`, oldest first (so a watermark can advance commit by commit)."""
+    return iter_log(repo_path, [f"{since_sha}..{branch}", "--reverse"], tzinfo=tzinfo, include_merges=include_merges)
+
+def resolve_ref(repo_path: Path, ref: str) -> str:
+    return run(["git", "rev-parse", "--verify", f"{ref}^{{commit}}"], cwd=repo_path).strip()
+
+def commit_time_iso(repo_path: Path, sha: str) -> str:
+    return run(["git", "show", "-s", "--format=%cI", sha], cwd=repo_path).strip()
+
+def last_commit_before(repo_path: Path, branch: str, before: datetime) -> Optional[str]:
+    """First-parent commit on branch committed at or before `before`, or None."""
+    out = run(["git", "rev-list", "-1", "--first-parent", f"--before={before.isoformat()}", branch], cwd=repo_path).strip()
+    return out or None
+
+def is_ancestor(repo_path: Path, ancestor: str, descendant: str) -> bool:
+    METRICS.incr("subprocesses")
+    try:
+        check_output(["git", "merge-base", "--is-ancestor", ancestor, descendant], cwd=repo_path, stderr=STDOUT)
+        return True
+    except CalledProcessError:
+        return False
+
+# 统计口径（config.yaml 的 stats 段）；默认与原实现一致：不识别重命名，空白变化照常计数
+DEFAULT_STATS = {
+    "renames": False,            # 识别重命名：改名只统计内容差异，而不是整文件删除 + 新增
+    "copies": False,             # 在 renames 基础上识别复制（来源限于本次改动过的文件，同 git -C）
+    "rename_threshold": 50,      # 相似度阈值（%）
+    "rename_limit": 1000,        # 参与重命名检测的文件数上限（git -l / diff.renameLimit）
+    "rename_timeout": 10,        # 单个 commit 重命名检测超过这么多秒则回退为不识别重命名
+    "ignore_whitespace": False,  # 忽略空白变化（git -w）
+}
+
+def stats_options(stats_cfg: Optional[Dict[str,Any]]) -> Dict[str,Any]:
+    return {**DEFAULT_STATS, **(stats_cfg or {})}
+
+def stats_variant(diff_base: str, stats: Optional[Dict[str,Any]]=None, exclude_fingerprint: str="") -> str:
+    """Cache variant for a stats mode (and exclusion rules); the default mode keeps the bare diff_base so existing cache entries stay valid."""
+    stats = stats_options(stats)
+    parts = [diff_base]
+    if stats["renames"]:
+        parts.append(f'M{stats["rename_threshold"]}')
+        if stats["copies"]:
+            parts.append(f'C{stats["rename_threshold"]}')
+        parts.append(f'l{stats["rename_limit"]}')
+    if stats["ignore_whitespace"]:
+        parts.append("w")
+    if exclude_fingerprint:
+        parts.append(f"x{exclude_fingerprint}")
+    return "|".join(parts)
+
+def diff_stat_args(stats: Dict[str,Any], renames: bool=True) -> List[str]:
+    args = []
+    if renames and stats["renames"]:
+        threshold = stats["rename_threshold"]
+        args.append(f"-M{threshold}%")
+        if stats["copies"]:
+            args.append(f"-C{threshold}%")
+        args.append(f'-l{stats["rename_limit"]}')
+    else:
+        # --no-renames: 不受本机 diff.renames 配置影响，与进程内后端口径一致
+        args.append("--no-renames")
+    if stats["ignore_whitespace"]:
+        args.append("-w")
+    return args
+
+def numstat_for_commit(repo_path: Path, commit: Dict[str,Any], diff_base: str="first-parent", stats: Optional[Dict[str,Any]]=None, pathspecs: Optional[List[str]]=None) -> List[Tuple[int,int,str]]:
+    """Return list of (added, deleted, path) for files in this commit, ignoring binary.
+
+    With stats.renames a renamed/copied file is reported once under its new path with only its content changes.
+    `pathspecs` (e.g. exclusion rules) limit which files are diffed at all.
+    """
+    stats = stats_options(stats)
     sha = commit["sha"]
-    # find parent
-    parents_line = run(["git", "rev-list", "--parents", "-n", "1", sha], cwd=repo_path).strip()
-    parts = parents_line.split()
-    if len(parts) == 1:
+    # find parent (already known when the commit came from iter_log)
+    parents = commit.get("parents")
+    if parents is None:
+        parents_line = run(["git", "rev-list", "--parents", "-n", "1", sha], cwd=repo_path).strip()
+        parents = parents_line.split()[1:]
+    if not parents:
         parent = None
     else:
-        parent = parts[1] if diff_base == "first-parent" else None  # let range handle all-parents
+        parent = parents[0] if diff_base == "first-parent" else None  # let range handle all-parents
 
-    args = ["git", "diff", "--numstat"]
     if parent:
-        args.append(f"{parent}..{sha}")
+        revs = [f"{parent}..{sha}"]
+    elif not parents:
+        # root commit: compare to empty tree
+        revs = [EMPTY_TREE_SHA, sha]
+    else:
+        # all-parents
+        revs = ["--root", sha]
+    if pathspecs:
+        revs = [*revs, "--", *pathspecs]
+
+    if stats["renames"]:
+        try:
+            out = run(["git", "diff", "--numstat", "-z", *diff_stat_args(stats), *revs], cwd=repo_path, timeout=stats["rename_timeout"])
+        except TimeoutExpired:
+            # 超大提交的重命名检测是平方级的，超时后按不识别重命名统计
+            print(f"Rename detection for {short_sha(sha)} exceeded {stats['rename_timeout']}s, counting without renames")
+            METRICS.incr("rename_timeouts")
+            out = run(["git", "diff", "--numstat", "-z", *diff_stat_args(stats, renames=False), *revs], cwd=repo_path)
     else:
-        # root commit or all-parents: compare to empty tree
-        args.extend(["--root", sha])
+        out = run(["git", "diff", "--numstat", "-z", *diff_stat_args(stats), *revs], cwd=repo_path)
+    return parse_numstat_z(out)
 
-    out = run(args, cwd=repo_path)
+def parse_numstat_z(out: str) -> List[Tuple[int,int,str]]:
     results = []
-    for line in out.strip().splitlines():
-        if not line:
+    # -z: 路径不做转义/加引号（中文文件名等保持原样）；
+    # 重命名/复制记录为 "added\tdeleted\t\0旧路径\0新路径\0"
+    fields = out.split("\0")
+    i = 0
+    while i < len(fields):
+        line = fields[i]
+        i += 1
+        if not line.strip():
             continue
-        a, d, path = line.split("\t", 2)
+        a, d, path = line.strip("\n").split("\t", 2)
+        if not path:
+            path = fields[i + 1]
+            i += 2
         if a == "-" or d == "-":
             # binary file; skip
             continue
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+录入接口的幂等键与重复请求抑制。
+
+移动端网络不稳定时客户端会重试 POST，每次重试都会重新调用 DeepSeek 并在 Notion 建一个重复页面：
+- 请求带 `Idempotency-Key` 头时按 (路径, 键) 去重，记录保留 IDEMPOTENCY_TTL_SECONDS；
+- 不带时按 (路径, 请求体) 的哈希自动去重（source、utterance、now 等字段都相同才算重复），
+  只在 IDEMPOTENCY_WINDOW_SECONDS 内有效：隔一会儿再说同一句话是一条新记录；设为 0 关闭自动去重；
+- 只缓存 2xx 响应；原请求还在处理时，重复请求等它完成后返回同一响应（最多等到本请求的时间预算用完，之后返回 503）；
+  原请求失败则删掉记录，重试照常执行；
+- 同一个 Idempotency-Key 配不同的请求体返回 422；重放的响应带 `Idempotent-Replayed: true` 头。
+
+存储是进程内的有界 LRU（IDEMPOTENCY_MAX_ENTRIES 条），多实例部署时各实例独立。
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from .metrics import METRICS
+from .resilience import remaining
+
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WINDOW_SECONDS = float(os.environ.get("IDEMPOTENCY_WINDOW_SECONDS", "120"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "2048"))
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+class Entry:
+    __slots__ = ("fingerprint", "expires", "done", "status", "body", "headers")
+
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = asyncio.Event()
+        self.status: Optional[int] = None
+        self.body = b""
+        self.headers: List[Tuple[str, str]] = []
+
+class IdempotencyStore:
+    """Bounded LRU of request key -> pending / completed response, with per-entry expiry."""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_MAX_ENTRIES, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str, ttl: float) -> Tuple[Entry, bool]:
+        """Return (entry, owner): the owner runs the request and must call complete() or abort()."""
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires > now:
+                self.entries.move_to_end(key)
+                return entry, False
+            entry = self.entries[key] = Entry(fingerprint, now + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return entry, True
+
+    def complete(self, entry: Entry, status: int, body: bytes, headers: List[Tuple[str, str]]):
+        entry.status, entry.body, entry.headers = status, body, headers
+        entry.done.set()
+
+    def abort(self, key: str, entry: Entry):
+        """Forget a failed request so the next retry runs it again (waiters re-check)."""
+        with self.lock:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+        entry.done.set()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+STORE = IdempotencyStore()
+
+def request_key(path: str, header: Optional[str], body: bytes) -> Tuple[Optional[str], str, float]:
+    """(key, fingerprint, ttl) for a request; key is None when it should not be deduplicated."""
+    try:
+        canonical = json.dumps(json.loads(body or b"{}"), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        canonical = body.decode("utf-8", "replace")
+    fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    if header:
+        return f"{path}\0key\0{header}", fingerprint, IDEMPOTENCY_TTL_SECONDS
+    if IDEMPOTENCY_WINDOW_SECONDS <= 0:
+        return None, fingerprint, 0
+    return f"{path}\0body\0{fingerprint}", fingerprint, IDEMPOTENCY_WINDOW_SECONDS
+
+def _replay(entry: Entry) -> Response:
+    return Response(entry.body, status_code=entry.status, headers={**dict(entry.headers), REPLAYED_HEADER: "true"})
+
+async def deduplicate(request: Request, call_next, store: Optional[IdempotencyStore] = None) -> Response:
+    """Middleware body: replay a finished duplicate, wait for an in-flight one, otherwise run and remember 2xx."""
+    store = STORE if store is None else store
+    path = request.url.path
+    key, fingerprint, ttl = request_key(path, request.headers.get("idempotency-key"), await request.body())
+    if key is None:
+        return await call_next(request)
+    while True:
+        entry, owner = store.begin(key, fingerprint, ttl)
+        if owner:
+            break
+        if entry.fingerprint != fingerprint:
+            return JSONResponse(status_code=422, content={"detail": "Idempotency-Key 已用于内容不同的请求"})
+        try:
+            # 等待原请求同样受本请求的时间预算约束
+            await asyncio.wait_for(entry.done.wait(), remaining())
+        except asyncio.TimeoutError:
+            return JSONResponse(status_code=503, content={"detail": "相同请求仍在处理中，请求时间预算已用完"})
+        if entry.status is not None:
+            METRICS.incr("idempotent_replays_total", path=path)
+            return _replay(entry)
+        # 原请求失败，已从存储中删除：重新抢占执行
+    try:
+        response = await call_next(request)
+    except BaseException:
+        store.abort(key, entry)
+        raise
+    if not 200 <= response.status_code < 300:
+        store.abort(key, entry)
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = [(k, v) for k, v in response.headers.items() if k.lower() != "content-length"]
+    store.complete(entry, response.status_code, body, headers)
+    return Response(body, status_code=response.status_code, headers=dict(headers))
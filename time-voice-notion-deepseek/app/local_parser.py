@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+本地规则解析：常见句式不必走一次 DeepSeek 往返。
+
+parse_time_locally 覆盖时间记录里最常见的几类说法：
+- 时间段："9点到10点 写合同"、"下午3点半-5点 开会"、"昨晚23:10-0:40看电影"、"14:00~15:30 评审"；
+- 起点到现在："10点半到现在 写代码"、"从9点开始写周报"；
+- 时长："刚才开会30分钟"、"跑步1个半小时"、"读书半小时"（结束时间按当前时间）；
+并抽取 #标签、@提及，按关键词 / 标签推断分类。
+
+parse_expense_locally 抽取金额（阿拉伯 / 中文数字，元 / 块 / k / ¥）、花销内容和 #标签，
+按 expense_categories 上的关键词索引推断分类："打车花了15.5元 #交通"、"午饭三十五块"、"房租2.5k"。
+
+两者都返回与对应 DeepSeek 解析函数相同结构的 dict（含 confidence / assumptions），识别不出时间 / 金额时返回 None。
+置信度低于阈值（上午/下午不明且落在未来、没有活动内容、分类无法确定等）时由调用方交给 DeepSeek。
+"""
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytz
+
+LOCAL_PARSE_ENABLED = os.environ.get("LOCAL_PARSE_ENABLED", "1").lower() not in ("0", "false", "no")
+LOCAL_PARSE_MIN_CONFIDENCE = float(os.environ.get("LOCAL_PARSE_MIN_CONFIDENCE", "0.8"))
+
+CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+CN_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+_NUM = r"\d+(?:\.\d+)?|[零〇一二两三四五六七八九十百]+"
+_PERIOD = r"凌晨|清晨|早上|早晨|上午|中午|下午|傍晚|晚上|夜里|半夜"
+_DAY = r"(?P<day>今天|今日|今早|今晚|昨天|昨日|昨晚|昨夜|前天)?\s*"
+_SEP = r"\s*(?:到|至|-|~|～|—|－|–)\s*"
+
+def _clock_re(p: str) -> str:
+    """时刻：'9点' / '下午3点半' / '十点一刻' / '8点20分' / '23:10'，组名带前缀 p"""
+    return (
+        rf"(?P<{p}period>{_PERIOD})?\s*"
+        rf"(?:(?P<{p}hh>\d{{1,2}})[:：](?P<{p}mm>\d{{2}})"
+        rf"|(?P<{p}h>\d{{1,2}}|[零一二两三四五六七八九十]{{1,3}})[点时]"
+        rf"(?:(?P<{p}half>半)|(?P<{p}quarter>一刻|三刻)|(?P<{p}m>\d{{1,2}}|[零一二三四五六七八九十]{{1,3}})分?)?)"
+    )
+
+RANGE_RE = re.compile(_DAY + _clock_re("s_") + _SEP + rf"(?:(?P<now>现在|此刻|目前)|{_clock_re('e_')})")
+SINCE_RE = re.compile(r"(?:从|自)?" + _DAY + _clock_re("s_") + r"\s*(?:开始|起)")
+DURATION_RE = re.compile(
+    rf"(?:(?P<hours>{_NUM})\s*个?\s*(?P<hhalf>半)?\s*(?:小时|钟头)(?:\s*(?P<hmin>{_NUM})\s*分钟?)?"
+    rf"|(?P<halfhour>半)\s*个?\s*(?:小时|钟头)"
+    rf"|(?P<minutes>{_NUM})\s*分钟)"
+)
+TAG_RE = re.compile(r"#([^\s#@，。,.;；！!？?]+)")
+MENTION_RE = re.compile(r"@([^\s#@，。,.;；！!？?]+)")
+# 去掉时间表达后，活动文案里常见的虚词 / 连接词
+FILLER_RE = re.compile(r"^(?:刚才|刚刚|刚|之前|方才|一直|在|了|从|自|开始|用了|花了|的)+|(?:了|的|用了|花了|一下|开始)+$")
+# 本地规则不处理的日期说法：出现时整句交给 DeepSeek
+UNSUPPORTED_RE = re.compile(r"明天|后天|大前天|前几天|上周|下周|上个?星期|周[一二三四五六日天末]|星期|礼拜|\d+\s*月\s*\d+|\d+\s*[号日](?!记)")
+# 数字之间的 "." 是小数点（"3.5 版本"），不当标点切开
+PUNCT_RE = re.compile(r"(?:[\s，。,;；:：!！?？、]|(?<!\d)\.|\.(?!\d))+")
+
+PM_PERIODS = {"下午", "傍晚", "晚上", "夜里"}
+DEFAULT_CATEGORY_KEYWORDS = {
+    "工作": ["工作", "开会", "会议", "写代码", "编程", "合同", "报告", "周报", "评审", "加班", "办公", "邮件", "需求", "调研", "写作"],
+    "学习": ["学习", "读书", "看书", "上课", "听课", "复习", "课程", "背单词", "刷题"],
+    "运动": ["运动", "跑步", "健身", "瑜伽", "游泳", "骑行", "打球", "徒步", "锻炼"],
+    "睡觉": ["睡觉", "午睡", "午休", "睡眠", "小睡"],
+    "放松": ["放松", "看电影", "看剧", "打游戏", "听音乐", "聊天", "逛街", "休息"],
+    "杂项": ["吃饭", "做饭", "通勤", "开车", "购物", "洗澡", "家务", "打扫"],
+}
+
+def cn_number(text: str) -> float:
+    """'30' / '1.5' / '三十' / '两' / '十二' / '一百二十' / '两千五' / '十五点五' -> number."""
+    if re.fullmatch(r"\d+(?:\.\d+)?", text):
+        return float(text)
+    if "点" in text:
+        whole, frac = text.split("点", 1)
+        return cn_number(whole or "零") + float("0." + "".join(str(CN_DIGITS[ch]) for ch in frac))
+    total, section, digit, last_unit = 0, 0, 0, 1
+    for ch in text:
+        if ch in CN_DIGITS:
+            digit = CN_DIGITS[ch]
+        elif ch in CN_UNITS:
+            last_unit = CN_UNITS[ch]
+            section += (digit or (0 if section else 1)) * last_unit
+            digit = 0
+        elif ch == "万":
+            total += (section + digit) * 10000
+            section, digit, last_unit = 0, 0, 10000
+        else:
+            raise ValueError(text)
+    # "两千五" 里末尾的 "五" 是 500
+    if digit and last_unit >= 100 and len(text) > 1 and text[-2] in "百千万":
+        digit *= last_unit // 10
+    return float(total + section + digit)
+
+def _clock(m: re.Match, p: str):
+    """Return (hour, minute, period, explicit_24h) for the clock group with prefix p, or None."""
+    if m.group(p + "hh"):
+        hour, minute = int(m.group(p + "hh")), int(m.group(p + "mm"))
+        explicit = hour > 12 or m.group(p + "hh").startswith("0")
+    elif m.group(p + "h"):
+        hour = int(cn_number(m.group(p + "h")))
+        if m.group(p + "half"):
+            minute = 30
+        elif m.group(p + "quarter"):
+            minute = 15 if m.group(p + "quarter") == "一刻" else 45
+        elif m.group(p + "m"):
+            minute = int(cn_number(m.group(p + "m")))
+        else:
+            minute = 0
+        explicit = hour > 12
+    else:
+        return None
+    if hour > 24 or minute > 59:
+        return None
+    return hour, minute, m.group(p + "period"), explicit
+
+def _apply_period(hour: int, period: Optional[str]) -> int:
+    if period in PM_PERIODS and hour < 12:
+        return hour + 12
+    if period == "中午" and hour <= 5:
+        return hour + 12
+    if period in ("凌晨", "半夜") and hour == 12:
+        return 0
+    return hour % 24
+
+def _day_offset(day: Optional[str]) -> int:
+    if not day:
+        return 0
+    if day.startswith("前"):
+        return -2
+    return -1 if day.startswith("昨") else 0
+
+def _day_period(day: Optional[str]) -> Optional[str]:
+    if day in ("昨晚", "昨夜", "今晚"):
+        return "晚上"
+    if day == "今早":
+        return "早上"
+    return None
+
+def _duration_minutes(m: re.Match) -> float:
+    if m.group("halfhour"):
+        return 30
+    if m.group("minutes"):
+        return cn_number(m.group("minutes"))
+    minutes = cn_number(m.group("hours")) * 60
+    if m.group("hhalf"):
+        minutes += 30
+    if m.group("hmin"):
+        minutes += cn_number(m.group("hmin"))
+    return minutes
+
+def category_keyword_index(mapping: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """mapping.yml 结构 -> {关键词: 分类名}；没有映射时用内置关键词表"""
+    index: Dict[str, str] = {}
+    if mapping:
+        for key, value in mapping.items():
+            name = value.get("category_name", key)
+            keywords = value.get("keywords", [])
+            for kw in (keywords if isinstance(keywords, list) else [keywords]):
+                for part in re.split(r"[，,]", str(kw)):
+                    if part.strip():
+                        index[part.strip()] = name
+            index.setdefault(name, name)
+    else:
+        for name, keywords in DEFAULT_CATEGORY_KEYWORDS.items():
+            for kw in keywords:
+                index[kw] = name
+    return index
+
+def _localize(tz: str, naive: datetime) -> datetime:
+    return pytz.timezone(tz).localize(naive)
+
+def _strip_activity(text: str) -> str:
+    text = PUNCT_RE.sub(" ", text).strip()
+    parts = [FILLER_RE.sub("", p) for p in text.split()]
+    return " ".join(p for p in parts if p)
+
+def parse_time_locally(
+    utterance: str,
+    now: datetime,
+    tz: str,
+    categories: Optional[List[str]] = None,
+    tags: Optional[List[str]] = None,
+    category_keywords: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Resolve a time-log utterance without the LLM; None when no time expression is recognised."""
+    if now.tzinfo is None:
+        now = _localize(tz, now)
+    local_now = now.astimezone(pytz.timezone(tz)).replace(tzinfo=None)
+    text = utterance.strip()
+    if UNSUPPORTED_RE.search(text):
+        return None
+    explicit_tags = TAG_RE.findall(text)
+    mentions = MENTION_RE.findall(text)
+    body = MENTION_RE.sub(" ", TAG_RE.sub(" ", text))
+    confidence = 0.95
+    assumptions = ["本地规则解析"]
+
+    m = RANGE_RE.search(body)
+    since = None if m else SINCE_RE.search(body)
+    if m or since:
+        match = m or since
+        start_clock = _clock(match, "s_")
+        if start_clock is None:
+            return None
+        day = match.group("day")
+        offset = _day_offset(day)
+        s_hour, s_min, s_period, s_explicit = start_clock
+        s_period = s_period or _day_period(day)
+        to_now = since is not None or bool(match.group("now"))
+        end_clock = None if to_now else _clock(match, "e_")
+        if not to_now and end_clock is None:
+            return None
+        ambiguous = s_period is None and not s_explicit and 1 <= s_hour <= 6
+        if ambiguous:
+            # 没说上午/下午的 1~6 点，按下午理解
+            s_period = "下午"
+            assumptions.append("未说明上午/下午，按下午理解")
+            confidence -= 0.1
+        base = (local_now + timedelta(days=offset)).replace(hour=0, minute=0, second=0, microsecond=0)
+        start = base + timedelta(hours=_apply_period(s_hour, s_period), minutes=s_min)
+        if to_now:
+            end = local_now
+            if since is not None:
+                assumptions.append("只给出开始时间，结束按当前时间补齐")
+        else:
+            e_hour, e_min, e_period, e_explicit = end_clock
+            end_hour = _apply_period(e_hour, e_period or (None if e_explicit else s_period))
+            end = base + timedelta(hours=end_hour, minutes=e_min)
+            if end < start and e_period is None and not e_explicit and e_hour < 12 and start - end < timedelta(hours=12):
+                end += timedelta(hours=12)
+            if end < start:
+                end += timedelta(days=1)
+                assumptions.append("结束时间早于开始时间，按跨天处理")
+        if offset == 0 and end > local_now + timedelta(minutes=10):
+            # 整段落在未来：多半是上午/下午或日期理解有误，交给模型
+            assumptions.append("解析结果晚于当前时间")
+            confidence = min(confidence, 0.5)
+        if to_now and start > local_now:
+            return None
+        body = body[:match.start()] + " " + body[match.end():]
+    else:
+        d = DURATION_RE.search(body)
+        if not d:
+            return None
+        minutes = _duration_minutes(d)
+        if minutes <= 0 or minutes > 24 * 60:
+            return None
+        end = local_now
+        start = local_now - timedelta(minutes=minutes)
+        assumptions.append(f"只给出时长{minutes:g}分钟，结束按当前时间补齐")
+        body = body[:d.start()] + " " + body[d.end():]
+
+    activity = _strip_activity(body)
+    if not activity:
+        activity = "未命名活动"
+        assumptions.append("没有活动内容")
+        confidence -= 0.3
+
+    index = category_keywords if category_keywords is not None else category_keyword_index(None)
+    cats = categories or ["工作", "放松", "睡觉", "运动", "学习", "杂项"]
+    category = next((t for t in explicit_tags if t in cats), None)
+    matched = [kw for kw in index if kw in activity]
+    if category is None:
+        # 最长的关键词优先（"看电影" 比 "看" 更具体）
+        for kw in sorted(matched, key=len, reverse=True):
+            if index[kw] in cats:
+                category = index[kw]
+                break
+    if category is None:
+        category = "杂项" if "杂项" in cats else cats[-1]
+        assumptions.append(f"未匹配到分类关键词，归为{category}")
+        confidence -= 0.2
+
+    out_tags = list(dict.fromkeys(explicit_tags))
+    if not out_tags:
+        candidates = set(tags or [])
+        out_tags = [kw for kw in sorted(matched, key=len, reverse=True) if kw in candidates][:3] or [category]
+
+    return {
+        "start_iso": _localize(tz, start).isoformat(),
+        "end_iso": _localize(tz, end).isoformat(),
+        "activity": activity,
+        "tags": out_tags,
+        "mentions": mentions,
+        "category": category,
+        "confidence": round(confidence, 2),
+        "assumptions": assumptions,
+    }
+
+# ---- 花销 ----
+
+AMOUNT_RE = re.compile(
+    r"[¥￥]\s*(?P<yen>\d+(?:\.\d+)?)"
+    r"|(?P<num>\d+(?:\.\d+)?|[零〇一二两三四五六七八九十百千万点]+)\s*"
+    r"(?:(?P<mult>[kK千万wW])?\s*(?P<unit>块钱|块|元|圆|rmb|RMB)(?P<jiao>[一二三四五六七八九]|\d(?!\d))?(?:毛|角)?|(?P<k>[kK])(?![a-zA-Z]))"
+)
+MULTIPLIERS = {"k": 1000, "K": 1000, "千": 1000, "万": 10000, "w": 10000, "W": 10000}
+EXPENSE_FILLER_RE = re.compile(
+    r"^(?:一共|总共|共|花了|花费了?|付了|支付了?|用了|大概|大约|约|了|的)+|(?:一共|总共|共|花了|花费了?|付了|支付了?|用了|大概|大约|约|了|的)+$"
+)
+DEFAULT_EXPENSE_CATEGORIES = ["餐饮", "交通", "购物", "娱乐", "医疗", "学习", "住房", "其他", "工作"]
+EXPENSE_CATEGORY_KEYWORDS = {
+    "餐饮": ["早餐", "早饭", "午餐", "午饭", "晚餐", "晚饭", "夜宵", "吃饭", "外卖", "咖啡", "奶茶", "饮料", "水果", "零食", "买菜", "火锅", "烧烤", "聚餐", "食堂", "面包"],
+    "交通": ["打车", "滴滴", "出租", "地铁", "公交", "加油", "停车", "高铁", "火车", "机票", "飞机", "单车", "过路费", "车费", "油费"],
+    "购物": ["衣服", "裤子", "鞋", "包包", "超市", "日用", "淘宝", "京东", "拼多多", "网购", "化妆品", "数码", "家电"],
+    "娱乐": ["电影", "游戏", "KTV", "演唱会", "门票", "旅游", "会员", "充值", "酒吧", "剧本杀"],
+    "医疗": ["药", "医院", "挂号", "体检", "看病", "牙", "诊所", "医保"],
+    "学习": ["书", "课程", "培训", "学费", "考试", "文具", "网课"],
+    "住房": ["房租", "水费", "电费", "燃气", "物业", "宽带", "水电", "房贷", "话费", "网费"],
+    "工作": ["办公", "出差", "打印", "快递"],
+}
+# 泛化的关键词：句中还有别的关键词时以别的为准（"充值话费" 是住房），只靠它们定分类时降低置信度
+GENERIC_EXPENSE_KEYWORDS = {"充值"}
+# 花销句里的时刻 / 日期 / 时段（"3点打车花了20块"、"昨天下午打车"）不属于花销内容；时刻在前，"下午一点" 整体去掉
+EXPENSE_TIME_RE = re.compile(r"今天|今日|今早|今晚|昨天|昨日|昨晚|昨夜|前天|" + _clock_re("c_") + "|" + _PERIOD)
+# 金额之外没带单位的数字（"每本40"）多半是另一个金额；后面跟量词的（"2本书"）是数量
+BARE_NUMBER_RE = re.compile(r"(?<![a-zA-Z\d.])\d+(?:\.\d+)?(?![\d.a-zA-Z]|\s*[个本件杯份张次瓶盒斤只双包条支台位碗袋箱])")
+
+def expense_keyword_index(categories: Optional[List[str]] = None) -> Dict[str, str]:
+    """{关键词: 分类名}，只保留候选分类里存在的分类；分类名本身也作为关键词"""
+    cats = categories or DEFAULT_EXPENSE_CATEGORIES
+    index = {kw: name for name, keywords in EXPENSE_CATEGORY_KEYWORDS.items() if name in cats for kw in keywords}
+    index.update({name: name for name in cats})
+    return index
+
+_EXPENSE_INDEX = expense_keyword_index()
+
+def _amount(m: re.Match) -> float:
+    if m.group("yen"):
+        return float(m.group("yen"))
+    value = cn_number(m.group("num"))
+    mult = m.group("mult") or m.group("k")
+    if mult:
+        value *= MULTIPLIERS[mult]
+    jiao = m.group("jiao")
+    if jiao:
+        # "15块5" / "十五块五" = 15.5
+        value += cn_number(jiao) / 10
+    return round(value, 2)
+
+def _drop_time_token(m: re.Match) -> str:
+    h = m.group("c_h")
+    if h and not h.isdigit() and not m.group("c_period"):
+        # "买了一点水果" 里的 "一点" 不是时刻
+        return m.group(0)
+    return " "
+
+def parse_expense_locally(
+    utterance: str,
+    categories: Optional[List[str]] = None,
+    tags: Optional[List[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Extract content/amount/category without the LLM; None when no amount is found."""
+    text = utterance.strip()
+    explicit_tags = TAG_RE.findall(text)
+    body = MENTION_RE.sub(" ", TAG_RE.sub(" ", text))
+    amounts = []
+    for m in AMOUNT_RE.finditer(body):
+        try:
+            amounts.append((m, _amount(m)))
+        except (ValueError, KeyError):
+            continue
+    if not amounts:
+        return None
+    confidence = 0.95
+    assumptions = ["本地规则解析"]
+    if len({value for _, value in amounts}) > 1:
+        # "两本书一共80元，每本40元" 之类：总额需要理解语义（不带单位的 "每本40" 见下方 BARE_NUMBER_RE）
+        assumptions.append("出现多个金额")
+        confidence = min(confidence, 0.5)
+    m, amount = amounts[0]
+    if amount <= 0:
+        return None
+
+    rest = body[:m.start()] + " " + body[m.end():]
+    rest = EXPENSE_TIME_RE.sub(_drop_time_token, RANGE_RE.sub(" ", rest))
+    if BARE_NUMBER_RE.search(rest):
+        if confidence > 0.5:
+            assumptions.append("出现多个金额")
+        confidence = min(confidence, 0.5)
+        rest = BARE_NUMBER_RE.sub(" ", rest)
+    parts = [EXPENSE_FILLER_RE.sub("", p) for p in PUNCT_RE.sub(" ", rest).split()]
+    content = "".join(p for p in parts if p)
+    if not content:
+        content = "未命名花销"
+        assumptions.append("没有花销内容")
+        confidence -= 0.3
+
+    cats = categories or DEFAULT_EXPENSE_CATEGORIES
+    index = _EXPENSE_INDEX if categories is None else expense_keyword_index(categories)
+    category = next((t for t in explicit_tags if t in cats), None)
+    if category is None:
+        matched = sorted((kw for kw in index if kw in content), key=len, reverse=True)
+        specific = [kw for kw in matched if kw not in GENERIC_EXPENSE_KEYWORDS]
+        if matched and not specific:
+            assumptions.append(f"只匹配到泛化关键词{matched[0]}")
+            confidence -= 0.2
+        matched = specific or matched
+        found = {index[kw] for kw in matched if len(kw) == len(matched[0])} if matched else set()
+        if len(found) == 1:
+            category = found.pop()
+        else:
+            assumptions.append("分类关键词有冲突" if found else "未匹配到分类关键词")
+            confidence -= 0.2
+            category = "其他" if "其他" in cats else cats[-1]
+
+    out_tags = list(dict.fromkeys(explicit_tags))
+    if not out_tags and tags:
+        out_tags = [tags[0]]
+        assumptions.append(f"未给出标签，默认{tags[0]}")
+
+    return {
+        "content": content,
+        "amount": amount,
+        "category": category,
+        "tags": out_tags,
+        "confidence": round(confidence, 2),
+        "assumptions": assumptions,
+    }
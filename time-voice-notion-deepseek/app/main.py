@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import contextvars
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, Optional
 from datetime import datetime
 import pytz
 import yaml
@@ -13,10 +17,16 @@ from dotenv import load_dotenv
 # 加载.env文件
 load_dotenv()
 
-from .llm_parser import parse_with_deepseek, parse_expense_with_deepseek, parse_food_with_deepseek, parse_exercise_with_deepseek, LLMParseError
+from .llm_parser import LLMParseError, DeepSeekUnavailable
+from .parsers import parse_record, parse_items
 from .notion_client import create_time_entry, create_expense_entry, create_food_entry, create_exercise_entry, NotionError
 from .scheduler import start_scheduler, stop_scheduler, run_manual_stats
-from .unified_ingest import classify_intent_with_deepseek, route_to_correct_endpoint, UnifiedIngestError
+from .unified_ingest import classify_intent_with_deepseek, route_to_correct_endpoint, UnifiedIngestError, ROUTES
+from .metrics import METRICS
+from .tracing import span
+from .resilience import deadline_scope, REQUEST_DEADLINE_SECONDS
+from .local_parser import category_keyword_index
+from .idempotency import deduplicate
 
 app = FastAPI(title="Voice → Notion Time Logger (DeepSeek)", version="2.0.0")
 
@@ -31,6 +41,26 @@ if os.path.exists(MAPPING_PATH):
             CATEGORY_MAPPING = yaml.safe_load(f) or {}
     except Exception:
         CATEGORY_MAPPING = None
+# 本地时间解析用的 关键词→分类 索引，启动时建一次
+CATEGORY_KEYWORDS = category_keyword_index(CATEGORY_MAPPING)
+
+# 时间记录的分类和标签候选集，启动时建一次
+TIME_CATEGORIES = []
+TIME_TAGS = []
+if CATEGORY_MAPPING:
+    TIME_CATEGORIES = [v.get('category_name', k) for k, v in CATEGORY_MAPPING.items()]
+    # 提取所有关键词作为标签候选集
+    for v in CATEGORY_MAPPING.values():
+        keywords = v.get('keywords', [])
+        if isinstance(keywords, list):
+            TIME_TAGS.extend(keywords)
+        else:
+            TIME_TAGS.append(str(keywords))
+# 去重（保持顺序，请求内容在进程间保持一致）
+TIME_TAGS = list(dict.fromkeys(TIME_TAGS))
+# 如果没有标签，使用默认标签
+if not TIME_TAGS:
+    TIME_TAGS = ["工作", "学习", "放松", "运动", "杂项", "家庭", "社交", "健康"]
 
 class IngestBody(BaseModel):
     utterance: str = Field(..., description="e.g., '9点到10点 写合同 #工作 @项目A'")
@@ -38,10 +68,64 @@ class IngestBody(BaseModel):
     source: Optional[str] = None
     now: Optional[str] = Field(default=None, description="Override current time (ISO 8601)")
 
+INGEST_PATHS = {"/ingest", "/expense", "/food", "/exercise", "/unified-ingest", "/multi-ingest"}
+
+# 中间件后注册的在外层：去重放在最内层，重放的响应同样经过指标、追踪和请求预算
+@app.middleware("http")
+async def suppress_duplicate_ingest(request: Request, call_next):
+    """客户端重试的录入请求（相同 Idempotency-Key，或窗口期内相同请求体）直接返回第一次的响应，不再解析和写 Notion"""
+    if request.method != "POST" or request.url.path not in INGEST_PATHS:
+        return await call_next(request)
+    return await deduplicate(request, call_next)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """按路径和状态码记录端到端耗时（/unified-ingest 内部路由的调用计入 /unified-ingest）"""
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # 未匹配路由的请求（扫描等）归为一类，避免标签基数失控；去重重放的录入请求不经过路由，按原路径计
+        path = request.url.path if "endpoint" in request.scope or request.url.path in INGEST_PATHS else "unmatched"
+        if path != "/metrics":
+            METRICS.observe("http_request_seconds", time.perf_counter() - t0, path=path, status=status)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """每个请求一个根 span，沿用入站 traceparent 中的 trace id"""
+    with span(f"{request.method} {request.url.path}", traceparent=request.headers.get("traceparent"), http_method=request.method, http_path=request.url.path) as sp:
+        response = await call_next(request)
+        sp.set(http_status=response.status_code)
+        if sp.trace_id:
+            response.headers["X-Trace-Id"] = sp.trace_id
+        return response
+
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    """请求级时间预算：客户端可用 X-Request-Timeout（秒）缩短，下游 DeepSeek / Notion 调用的超时不会超过剩余预算"""
+    # 默认预算只作用于录入接口；手动报表等接口只在客户端显式给出时受限
+    seconds = REQUEST_DEADLINE_SECONDS if request.url.path in INGEST_PATHS else 0
+    header = request.headers.get("x-request-timeout")
+    if header:
+        try:
+            seconds = min(float(header), seconds) if seconds > 0 else float(header)
+        except ValueError:
+            pass
+    with deadline_scope(seconds):
+        return await call_next(request)
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 文本格式的进程内指标"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/stats/start")
 def start_stats_scheduler():
     """启动定时统计任务"""
@@ -96,41 +180,26 @@ def run_manual_unified_report_endpoint():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"执行手动统一报告失败: {str(e)}")
 
-@app.post("/ingest")
-def ingest(body: IngestBody):
-    try:
-        # 正确处理时区：确保在北京时间早上8点前录入的数据算作当天的数据
-        if body.now:
-            now = datetime.fromisoformat(body.now)
-        else:
-            # 获取当前时间并添加北京时间时区
-            tz = pytz.timezone(body.tz or DEFAULT_TZ)
-            now = datetime.now(tz)
-        
-        cats = []
-        tags = []
-        if CATEGORY_MAPPING:
-            cats = [v.get('category_name', k) for k, v in CATEGORY_MAPPING.items()]
-            # 提取所有关键词作为标签候选集
-            for v in CATEGORY_MAPPING.values():
-                keywords = v.get('keywords', [])
-                if isinstance(keywords, list):
-                    tags.extend(keywords)
-                else:
-                    tags.append(str(keywords))
-        # 去重并添加默认标签
-        tags = list(set(tags))
-        # 如果没有标签，使用默认标签
-        if not tags:
-            tags = ["工作", "学习", "放松", "运动", "杂项", "家庭", "社交", "健康"]
-        parsed = parse_with_deepseek(body.utterance, now=now, tz=body.tz or DEFAULT_TZ, categories=cats or None, tags=tags or None)
-        activity = parsed.get('activity') or '未命名活动'
-        start = datetime.fromisoformat(parsed['start_iso'])
-        end = datetime.fromisoformat(parsed['end_iso'])
-        category = parsed.get('category') or None
-        tags = parsed.get('tags') or []
-        mentions = parsed.get('mentions') or []
-        notes = f"source={body.source or ''}; mentions={','.join(mentions)}; raw={body.utterance}; assumptions={'; '.join(parsed.get('assumptions') or [])}; confidence={parsed.get('confidence')}"
+def _resolve_now(now_iso: Optional[str], tz: Optional[str]) -> datetime:
+    # 正确处理时区：确保在北京时间早上8点前录入的数据算作当天的数据
+    if now_iso:
+        return datetime.fromisoformat(now_iso)
+    # 获取当前时间并添加北京时间时区
+    return datetime.now(pytz.timezone(tz or DEFAULT_TZ))
+
+def _notes(source: Optional[str], utterance: str, parsed: Dict[str, Any]) -> str:
+    return f"source={source or ''}; raw={utterance}; assumptions={'; '.join(parsed.get('assumptions') or [])}; confidence={parsed.get('confidence')}"
+
+def record_time(parsed: Dict[str, Any], now: datetime, source: Optional[str], utterance: str) -> Dict[str, Any]:
+    """把时间记录的解析结果写入 Notion，返回接口响应"""
+    activity = parsed.get('activity') or '未命名活动'
+    start = datetime.fromisoformat(parsed['start_iso'])
+    end = datetime.fromisoformat(parsed['end_iso'])
+    category = parsed.get('category') or None
+    tags = parsed.get('tags') or []
+    mentions = parsed.get('mentions') or []
+    notes = f"source={source or ''}; mentions={','.join(mentions)}; raw={utterance}; assumptions={'; '.join(parsed.get('assumptions') or [])}; confidence={parsed.get('confidence')}"
+    with METRICS.stage("notion", "time"), span("notion.create", intent="time") as sp:
         created = create_time_entry(
             activity=activity,
             start=start,
@@ -139,19 +208,32 @@ def ingest(body: IngestBody):
             tags=tags,
             notes=notes,
         )
-        return {
-            "ok": True,
-            "parsed": {
-                "activity": activity,
-                "start": start.isoformat(),
-                "end": end.isoformat(),
-                "category": category,
-                "tags": tags,
-                "mentions": mentions,
-            },
-            "notion_page_id": created.get("id"),
-            "notion_url": created.get("url"),
-        }
+        sp.set(notion_page_id=created.get("id"))
+    return {
+        "ok": True,
+        "parsed": {
+            "activity": activity,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "category": category,
+            "tags": tags,
+            "mentions": mentions,
+        },
+        "notion_page_id": created.get("id"),
+        "notion_url": created.get("url"),
+    }
+
+@app.post("/ingest")
+def ingest(body: IngestBody):
+    try:
+        now = _resolve_now(body.now, body.tz)
+        with METRICS.stage("parse", "time"), span("parse", intent="time", utterance_length=len(body.utterance)) as sp:
+            # 常见句式先用本地规则解析，置信度够高就不再调用 DeepSeek
+            parsed = parse_record("time", body.utterance, now=now, tz=body.tz or DEFAULT_TZ, categories=TIME_CATEGORIES or None, tags=TIME_TAGS or None, category_keywords=CATEGORY_KEYWORDS)
+            sp.set(confidence=parsed.get("confidence"))
+        return record_time(parsed, now, body.source, body.utterance)
+    except DeepSeekUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except LLMParseError as e:
         raise HTTPException(status_code=502, detail=str(e))
     except NotionError as e:
@@ -165,40 +247,21 @@ class FoodBody(BaseModel):
     source: Optional[str] = None
     now: Optional[str] = Field(default=None, description="Override current time (ISO 8601)")
 
-@app.post("/food")
-def food(body: FoodBody):
-    """记录饮食"""
-    try:
-        # 处理时区
-        if body.now:
-            now = datetime.fromisoformat(body.now)
-        else:
-            # 获取当前时间并添加北京时间时区
-            tz = pytz.timezone(body.tz or DEFAULT_TZ)
-            now = datetime.now(tz)
-        
-        # 饮食分类和标签
-        food_categories = ["早餐", "午餐", "晚餐", "零食", "加餐", "饮料"]
-        food_tags = ["健康", "高蛋白", "低碳水", "低脂肪", "快餐", "自制"]
-        
-        parsed = parse_food_with_deepseek(
-            body.utterance, 
-            now=now, 
-            tz=body.tz or DEFAULT_TZ, 
-            categories=food_categories,
-            tags=food_tags
-        )
-        
-        food_name = parsed.get('food') or '未命名食物'
-        calories = parsed.get('calories') or 0.0
-        protein = parsed.get('protein') or 0.0
-        carbs = parsed.get('carbs') or 0.0
-        fat = parsed.get('fat') or 0.0
-        category = parsed.get('category') or '其他'
-        tags = parsed.get('tags') or []
-        
-        notes = f"source={body.source or ''}; raw={body.utterance}; assumptions={'; '.join(parsed.get('assumptions') or [])}; confidence={parsed.get('confidence')}"
-        
+# 饮食分类和标签
+FOOD_CATEGORIES = ["早餐", "午餐", "晚餐", "零食", "加餐", "饮料"]
+FOOD_TAGS = ["健康", "高蛋白", "低碳水", "低脂肪", "快餐", "自制"]
+
+def record_food(parsed: Dict[str, Any], now: datetime, source: Optional[str], utterance: str) -> Dict[str, Any]:
+    """把饮食记录的解析结果写入 Notion，返回接口响应"""
+    food_name = parsed.get('food') or '未命名食物'
+    calories = parsed.get('calories') or 0.0
+    protein = parsed.get('protein') or 0.0
+    carbs = parsed.get('carbs') or 0.0
+    fat = parsed.get('fat') or 0.0
+    category = parsed.get('category') or '其他'
+    tags = parsed.get('tags') or []
+
+    with METRICS.stage("notion", "food"), span("notion.create", intent="food") as sp:
         created = create_food_entry(
             food=food_name,
             calories=calories,
@@ -208,23 +271,43 @@ def food(body: FoodBody):
             category=category,
             tags=tags,
             food_date=now,
-            notes=notes,
+            notes=_notes(source, utterance, parsed),
         )
-        
-        return {
-            "ok": True,
-            "parsed": {
-                "food": food_name,
-                "calories": calories,
-                "protein": protein,
-                "carbs": carbs,
-                "fat": fat,
-                "category": category,
-                "tags": tags,
-            },
-            "notion_page_id": created.get("id"),
-            "notion_url": created.get("url"),
-        }
+        sp.set(notion_page_id=created.get("id"))
+
+    return {
+        "ok": True,
+        "parsed": {
+            "food": food_name,
+            "calories": calories,
+            "protein": protein,
+            "carbs": carbs,
+            "fat": fat,
+            "category": category,
+            "tags": tags,
+        },
+        "notion_page_id": created.get("id"),
+        "notion_url": created.get("url"),
+    }
+
+@app.post("/food")
+def food(body: FoodBody):
+    """记录饮食"""
+    try:
+        now = _resolve_now(body.now, body.tz)
+        with METRICS.stage("parse", "food"), span("parse", intent="food", utterance_length=len(body.utterance)) as sp:
+            parsed = parse_record(
+                "food",
+                body.utterance,
+                now=now,
+                tz=body.tz or DEFAULT_TZ,
+                categories=FOOD_CATEGORIES,
+                tags=FOOD_TAGS
+            )
+            sp.set(confidence=parsed.get("confidence"))
+        return record_food(parsed, now, body.source, body.utterance)
+    except DeepSeekUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except LLMParseError as e:
         raise HTTPException(status_code=502, detail=str(e))
     except NotionError as e:
@@ -238,39 +321,20 @@ class ExerciseBody(BaseModel):
     source: Optional[str] = None
     now: Optional[str] = Field(default=None, description="Override current time (ISO 8601)")
 
-@app.post("/exercise")
-def exercise(body: ExerciseBody):
-    """记录运动"""
-    try:
-        # 处理时区
-        if body.now:
-            now = datetime.fromisoformat(body.now)
-        else:
-            # 获取当前时间并添加北京时间时区
-            tz = pytz.timezone(body.tz or DEFAULT_TZ)
-            now = datetime.now(tz)
-        
-        # 运动分类和标签
-        exercise_categories = ["有氧运动", "力量训练", "柔韧性训练", "高强度间歇训练", "户外运动", "其他"]
-        exercise_tags = ["室内", "户外", "健身房", "家庭", "高强度", "低强度"]
-        
-        parsed = parse_exercise_with_deepseek(
-            body.utterance, 
-            now=now, 
-            tz=body.tz or DEFAULT_TZ, 
-            categories=exercise_categories,
-            tags=exercise_tags
-        )
-        
-        exercise_type = parsed.get('exercise_type') or '未命名运动'
-        duration_minutes = parsed.get('duration_minutes') or 0.0
-        calories_burned = parsed.get('calories_burned') or 0.0
-        intensity = parsed.get('intensity') or '中'
-        category = parsed.get('category') or '其他'
-        tags = parsed.get('tags') or []
-        
-        notes = f"source={body.source or ''}; raw={body.utterance}; assumptions={'; '.join(parsed.get('assumptions') or [])}; confidence={parsed.get('confidence')}"
-        
+# 运动分类和标签
+EXERCISE_CATEGORIES = ["有氧运动", "力量训练", "柔韧性训练", "高强度间歇训练", "户外运动", "其他"]
+EXERCISE_TAGS = ["室内", "户外", "健身房", "家庭", "高强度", "低强度"]
+
+def record_exercise(parsed: Dict[str, Any], now: datetime, source: Optional[str], utterance: str) -> Dict[str, Any]:
+    """把运动记录的解析结果写入 Notion，返回接口响应"""
+    exercise_type = parsed.get('exercise_type') or '未命名运动'
+    duration_minutes = parsed.get('duration_minutes') or 0.0
+    calories_burned = parsed.get('calories_burned') or 0.0
+    intensity = parsed.get('intensity') or '中'
+    category = parsed.get('category') or '其他'
+    tags = parsed.get('tags') or []
+
+    with METRICS.stage("notion", "exercise"), span("notion.create", intent="exercise") as sp:
         created = create_exercise_entry(
             exercise_type=exercise_type,
             duration_minutes=duration_minutes,
@@ -279,22 +343,42 @@ def exercise(body: ExerciseBody):
             category=category,
             tags=tags,
             exercise_date=now,
-            notes=notes,
+            notes=_notes(source, utterance, parsed),
         )
-        
-        return {
-            "ok": True,
-            "parsed": {
-                "exercise_type": exercise_type,
-                "duration_minutes": duration_minutes,
-                "calories_burned": calories_burned,
-                "intensity": intensity,
-                "category": category,
-                "tags": tags,
-            },
-            "notion_page_id": created.get("id"),
-            "notion_url": created.get("url"),
-        }
+        sp.set(notion_page_id=created.get("id"))
+
+    return {
+        "ok": True,
+        "parsed": {
+            "exercise_type": exercise_type,
+            "duration_minutes": duration_minutes,
+            "calories_burned": calories_burned,
+            "intensity": intensity,
+            "category": category,
+            "tags": tags,
+        },
+        "notion_page_id": created.get("id"),
+        "notion_url": created.get("url"),
+    }
+
+@app.post("/exercise")
+def exercise(body: ExerciseBody):
+    """记录运动"""
+    try:
+        now = _resolve_now(body.now, body.tz)
+        with METRICS.stage("parse", "exercise"), span("parse", intent="exercise", utterance_length=len(body.utterance)) as sp:
+            parsed = parse_record(
+                "exercise",
+                body.utterance,
+                now=now,
+                tz=body.tz or DEFAULT_TZ,
+                categories=EXERCISE_CATEGORIES,
+                tags=EXERCISE_TAGS
+            )
+            sp.set(confidence=parsed.get("confidence"))
+        return record_exercise(parsed, now, body.source, body.utterance)
+    except DeepSeekUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except LLMParseError as e:
         raise HTTPException(status_code=502, detail=str(e))
     except NotionError as e:
@@ -308,57 +392,58 @@ class ExpenseBody(BaseModel):
     source: Optional[str] = None
     now: Optional[str] = Field(default=None, description="Override current time (ISO 8601)")
 
-@app.post("/expense")
-def expense(body: ExpenseBody):
-    """记录花销"""
-    try:
-        # 同样修复花销记录中的时区问题
-        if body.now:
-            now = datetime.fromisoformat(body.now)
-        else:
-            # 获取当前时间并添加北京时间时区
-            tz = pytz.timezone(body.tz or DEFAULT_TZ)
-            now = datetime.now(tz)
-        
-        # 花销分类映射，可以扩展
-        expense_categories = ["餐饮", "交通", "购物", "娱乐", "医疗", "学习", "住房", "其他", "工作"]
-        expense_tags = ["日常", "必要", "非必要"]
-        
-        parsed = parse_expense_with_deepseek(
-            body.utterance, 
-            now=now, 
-            tz=body.tz or DEFAULT_TZ, 
-            categories=expense_categories,
-            tags=expense_tags
-        )
-        
-        content = parsed.get('content') or '未命名花销'
-        amount = parsed.get('amount') or 0.0
-        category = parsed.get('category') or '其他'
-        tags = parsed.get('tags') or []
-        
-        notes = f"source={body.source or ''}; raw={body.utterance}; assumptions={'; '.join(parsed.get('assumptions') or [])}; confidence={parsed.get('confidence')}"
-        
+# 花销分类映射，可以扩展
+EXPENSE_CATEGORIES = ["餐饮", "交通", "购物", "娱乐", "医疗", "学习", "住房", "其他", "工作"]
+EXPENSE_TAGS = ["日常", "必要", "非必要"]
+
+def record_expense(parsed: Dict[str, Any], now: datetime, source: Optional[str], utterance: str) -> Dict[str, Any]:
+    """把花销记录的解析结果写入 Notion，返回接口响应"""
+    content = parsed.get('content') or '未命名花销'
+    amount = parsed.get('amount') or 0.0
+    category = parsed.get('category') or '其他'
+    tags = parsed.get('tags') or []
+
+    with METRICS.stage("notion", "expense"), span("notion.create", intent="expense") as sp:
         created = create_expense_entry(
             content=content,
             amount=amount,
             category=category,
             tags=tags,
             expense_date=now,
-            notes=notes,
+            notes=_notes(source, utterance, parsed),
         )
-        
-        return {
-            "ok": True,
-            "parsed": {
-                "content": content,
-                "amount": amount,
-                "category": category,
-                "tags": tags,
-            },
-            "notion_page_id": created.get("id"),
-            "notion_url": created.get("url"),
-        }
+        sp.set(notion_page_id=created.get("id"))
+
+    return {
+        "ok": True,
+        "parsed": {
+            "content": content,
+            "amount": amount,
+            "category": category,
+            "tags": tags,
+        },
+        "notion_page_id": created.get("id"),
+        "notion_url": created.get("url"),
+    }
+
+@app.post("/expense")
+def expense(body: ExpenseBody):
+    """记录花销"""
+    try:
+        now = _resolve_now(body.now, body.tz)
+        with METRICS.stage("parse", "expense"), span("parse", intent="expense", utterance_length=len(body.utterance)) as sp:
+            parsed = parse_record(
+                "expense",
+                body.utterance,
+                now=now,
+                tz=body.tz or DEFAULT_TZ,
+                categories=EXPENSE_CATEGORIES,
+                tags=EXPENSE_TAGS
+            )
+            sp.set(confidence=parsed.get("confidence"))
+        return record_expense(parsed, now, body.source, body.utterance)
+    except DeepSeekUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except LLMParseError as e:
         raise HTTPException(status_code=502, detail=str(e))
     except NotionError as e:
@@ -366,6 +451,76 @@ def expense(body: ExpenseBody):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 各记录类型的 (分类, 标签) 候选集和 Notion 写入函数，/multi-ingest 按 intent 查表
+RECORD_CANDIDATES = {
+    "time": (TIME_CATEGORIES, TIME_TAGS),
+    "expense": (EXPENSE_CATEGORIES, EXPENSE_TAGS),
+    "food": (FOOD_CATEGORIES, FOOD_TAGS),
+    "exercise": (EXERCISE_CATEGORIES, EXERCISE_TAGS),
+}
+RECORD_WRITERS = {
+    "time": record_time,
+    "expense": record_expense,
+    "food": record_food,
+    "exercise": record_exercise,
+}
+
+# /unified-ingest 的静态路由表，请求体模型复用各端点自己的
+ROUTES.update({
+    "time": (ingest, IngestBody),
+    "expense": (expense, ExpenseBody),
+    "food": (food, FoodBody),
+    "exercise": (exercise, ExerciseBody),
+})
+
+# 多条记录并发写 Notion 的线程池（requests 是同步调用）
+MULTI_INGEST_CONCURRENCY = int(os.environ.get("MULTI_INGEST_CONCURRENCY", "4"))
+_NOTION_POOL = ThreadPoolExecutor(max_workers=MULTI_INGEST_CONCURRENCY, thread_name_prefix="notion")
+
+class MultiIngestBody(BaseModel):
+    utterance: str = Field(..., description="e.g., '早上跑步30分钟，然后早餐吃了两个鸡蛋花了12元'")
+    tz: Optional[str] = Field(default=DEFAULT_TZ, description="IANA timezone, e.g., Asia/Shanghai")
+    source: Optional[str] = None
+    now: Optional[str] = Field(default=None, description="Override current time (ISO 8601)")
+
+@app.post("/multi-ingest")
+def multi_ingest(body: MultiIngestBody):
+    """
+    一句口述拆成多条记录：一次 DeepSeek 调用返回 time / expense / food / exercise 若干条，
+    再并发写入各自的 Notion 数据库。每条记录单独返回结果，某条写入失败不影响其他条。
+    """
+    try:
+        now = _resolve_now(body.now, body.tz)
+        with METRICS.stage("parse", "multi"), span("parse", intent="multi", utterance_length=len(body.utterance)) as sp:
+            records = parse_items(
+                body.utterance,
+                now=now,
+                tz=body.tz or DEFAULT_TZ,
+                categories={intent: cats for intent, (cats, _) in RECORD_CANDIDATES.items() if cats},
+                tags={intent: tags for intent, (_, tags) in RECORD_CANDIDATES.items() if tags},
+            )
+            sp.set(items=len(records))
+    except DeepSeekUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except LLMParseError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not records:
+        raise HTTPException(status_code=422, detail="未识别到可记录的内容")
+
+    futures = [
+        _NOTION_POOL.submit(contextvars.copy_context().run, RECORD_WRITERS[intent], parsed, now, body.source, body.utterance)
+        for intent, parsed in records
+    ]
+    items = []
+    for (intent, _), future in zip(records, futures):
+        try:
+            items.append({"intent_type": intent, **future.result()})
+        except Exception as e:
+            items.append({"intent_type": intent, "ok": False, "error": str(e)})
+    return {"ok": all(item["ok"] for item in items), "items": items}
+
 class UnifiedIngestBody(BaseModel):
     utterance: str = Field(..., description="用户指令，如'9点到10点写代码'、'午餐花了50元'、'跑步30分钟'等")
     tz: Optional[str] = Field(default=DEFAULT_TZ, description="IANA timezone, e.g., Asia/Shanghai")
@@ -398,8 +553,16 @@ def unified_ingest(body: UnifiedIngestBody):
             }
         else:
             # 使用AI进行分类
-            classification_result = classify_intent_with_deepseek(body.utterance)
-            intent_type = classification_result["intent_type"]
+            t0 = time.perf_counter()
+            with span("classify", utterance_length=len(body.utterance)) as sp:
+                try:
+                    classification_result = classify_intent_with_deepseek(body.utterance)
+                except UnifiedIngestError:
+                    METRICS.observe("ingest_stage_seconds", time.perf_counter() - t0, stage="classify", intent="error")
+                    raise
+                intent_type = classification_result["intent_type"]
+                sp.set(intent=intent_type, confidence=classification_result.get("confidence"))
+            METRICS.observe("ingest_stage_seconds", time.perf_counter() - t0, stage="classify", intent=intent_type)
         
         # 记录分类结果
         classification_info = {
@@ -410,13 +573,14 @@ def unified_ingest(body: UnifiedIngestBody):
         }
         
         # 路由到正确的端点
-        result = route_to_correct_endpoint(
-            intent_type=intent_type,
-            utterance=body.utterance,
-            tz=body.tz or DEFAULT_TZ,
-            source=body.source,
-            now=body.now
-        )
+        with span("route", intent=intent_type):
+            result = route_to_correct_endpoint(
+                intent_type=intent_type,
+                utterance=body.utterance,
+                tz=body.tz or DEFAULT_TZ,
+                source=body.source,
+                now=body.now
+            )
         
         # 在结果中添加分类信息
         result["classification"] = classification_info
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标：计数器 + 延迟直方图，GET /metrics 以 Prometheus 文本格式导出。
+
+主要指标：
+- voice_ingest_stage_seconds{stage,intent}：classify / parse / fix_json / notion 各阶段耗时；
+- voice_http_request_seconds{path,status}：各接口端到端耗时；
+- voice_deepseek_tokens_total{kind}：DeepSeek 返回的 usage（prompt / completion / cache_hit / cache_miss）；
+- voice_deepseek_request_seconds{tool} / voice_deepseek_requests_total{tool,status}：DeepSeek 调用耗时与状态码；
+- voice_notion_request_seconds{op} / voice_notion_requests_total{op,status}：Notion 请求耗时与状态码；
+- voice_local_parse_total{intent,outcome}：本地规则解析命中（local）/ 交给 DeepSeek（deepseek）/ 熔断兜底（local_fallback）/ 未识别（miss）；
+- voice_multi_items_total{intent}：/multi-ingest 从一句口述拆出的各类记录条数；
+- voice_idempotent_replays_total{path}：带相同幂等键（或窗口期内请求体相同）的重试直接返回第一次响应的次数；
+- voice_json_repairs_total{intent}：工具调用参数需要 fix_json_string 修复的次数；
+- voice_scheduler_job_seconds{job}：定时报表任务耗时。
+
+不依赖 prometheus_client：一把锁 + 字典累加，单次记录只有几次字典查找。
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+PREFIX = "voice"
+
+# 秒；从本地解析（毫秒级）到 DeepSeek 超时（40s）
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0]
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一格是 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters: Dict[str, Dict[Labels, float]] = {}
+            self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def incr(self, name: str, n: float = 1, **labels):
+        key = _labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def stage(self, stage: str, intent: str):
+        return self.timer("ingest_stage_seconds", stage=stage, intent=intent)
+
+    def timed(self, name: str, **labels):
+        """Decorator form of timer()."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def job(self, name: str):
+        return self.timed("scheduler_job_seconds", job=name)
+
+    def record_usage(self, usage: Dict[str, int]):
+        """Count tokens from a DeepSeek `usage` block (cache fields are DeepSeek context caching)."""
+        for field, kind in (("prompt_tokens", "prompt"), ("completion_tokens", "completion"),
+                            ("prompt_cache_hit_tokens", "cache_hit"), ("prompt_cache_miss_tokens", "cache_miss")):
+            if usage.get(field):
+                self.incr("deepseek_tokens_total", usage[field], kind=kind)
+
+    def render(self, prefix: str = PREFIX) -> str:
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{prefix}_{name}{_fmt(labels)} {int(value) if float(value).is_integer() else value}")
+            for name, series in sorted(self.histograms.items()):
+                metric = f"{prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, h in sorted(series.items()):
+                    seen = 0
+                    for le, n in zip(h.buckets + ["+Inf"], h.counts):
+                        seen += n
+                        le_label = f'le="{le}"'
+                        lines.append(f"{metric}_bucket{_fmt(labels, le_label)} {seen}")
+                    lines.append(f"{metric}_sum{_fmt(labels)} {h.sum:.6f}")
+                    lines.append(f"{metric}_count{_fmt(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
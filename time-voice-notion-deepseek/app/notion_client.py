@@ -6,12 +6,17 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime, date, timedelta
 import pytz
 
+from .metrics import METRICS
+from .tracing import span
+from .resilience import budget
+
 NOTION_TOKEN = os.environ.get("NOTION_TOKEN", "")
 NOTION_DATABASE_ID = os.environ.get("NOTION_DATABASE_ID", "")
 NOTION_DATABASE_ID2 = os.environ.get("NOTION_DATABASE_ID2", "")
 NOTION_DATABASE_ID3 = os.environ.get("NOTION_DATABASE_ID3", "")  # 饮食记录数据库
 NOTION_DATABASE_ID4 = os.environ.get("NOTION_DATABASE_ID4", "")  # 运动记录数据库
 NOTION_VERSION = "2022-06-28"
+NOTION_BASE_URL = os.environ.get("NOTION_BASE_URL", "https://api.notion.com/v1")
 
 class NotionError(Exception):
     pass
@@ -25,6 +30,24 @@ def _headers():
         "Content-Type": "application/json; charset=utf-8",
     }
 
+def _post(url: str, **kwargs) -> requests.Response:
+    """requests.post，超时受请求剩余预算约束，顺带记录耗时、状态码和追踪 span。"""
+    op = "query" if url.endswith("/query") else "pages"
+    timeout = budget(kwargs.pop("timeout", 20))
+    if timeout <= 0.1:
+        METRICS.incr("notion_deadline_exceeded_total", op=op)
+        raise NotionError("请求时间预算已用完，跳过 Notion 调用")
+    kwargs["timeout"] = timeout
+    with span(f"notion.{op}") as sp, METRICS.timer("notion_request_seconds", op=op):
+        try:
+            r = requests.post(url, **kwargs)
+        except requests.RequestException as e:
+            METRICS.incr("notion_requests_total", op=op, status=type(e).__name__)
+            raise
+        sp.set(http_status=r.status_code)
+    METRICS.incr("notion_requests_total", op=op, status=r.status_code)
+    return r
+
 def iso(dt: datetime) -> str:
     return dt.isoformat()
 
@@ -52,7 +75,7 @@ def create_time_entry(
         "parent": {"database_id": NOTION_DATABASE_ID},
         "properties": props,
     }
-    r = requests.post("https://api.notion.com/v1/pages", headers=_headers(), json=payload, timeout=20)
+    r = _post(f"{NOTION_BASE_URL.rstrip('/')}/pages", headers=_headers(), json=payload, timeout=20)
     if r.status_code >= 300:
         try:
             detail = r.json()
@@ -121,8 +144,8 @@ def query_time_entries(start_date: date, end_date: date) -> List[Dict[str, Any]]
         if start_cursor:
             payload["start_cursor"] = start_cursor
         
-        r = requests.post(
-            f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query",
+        r = _post(
+            f"{NOTION_BASE_URL.rstrip('/')}/databases/{NOTION_DATABASE_ID}/query",
             headers=_headers(),
             json=payload,
             timeout=20
@@ -192,7 +215,7 @@ def create_expense_entry(
         "properties": props,
     }
     
-    r = requests.post("https://api.notion.com/v1/pages", headers=_headers(), json=payload, timeout=20)
+    r = _post(f"{NOTION_BASE_URL.rstrip('/')}/pages", headers=_headers(), json=payload, timeout=20)
     if r.status_code >= 300:
         try:
             detail = r.json()
@@ -243,8 +266,8 @@ def query_expense_entries(start_date: date, end_date: date) -> List[Dict[str, An
         if start_cursor:
             payload["start_cursor"] = start_cursor
         
-        r = requests.post(
-            f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID2}/query",
+        r = _post(
+            f"{NOTION_BASE_URL.rstrip('/')}/databases/{NOTION_DATABASE_ID2}/query",
             headers=_headers(),
             json=payload,
             timeout=20
@@ -346,7 +369,7 @@ def create_food_entry(
         "properties": props,
     }
     
-    r = requests.post("https://api.notion.com/v1/pages", headers=_headers(), json=payload, timeout=20)
+    r = _post(f"{NOTION_BASE_URL.rstrip('/')}/pages", headers=_headers(), json=payload, timeout=20)
     if r.status_code >= 300:
         try:
             detail = r.json()
@@ -397,8 +420,8 @@ def query_food_entries(start_date: date, end_date: date) -> List[Dict[str, Any]]
         if start_cursor:
             payload["start_cursor"] = start_cursor
         
-        r = requests.post(
-            f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID3}/query",
+        r = _post(
+            f"{NOTION_BASE_URL.rstrip('/')}/databases/{NOTION_DATABASE_ID3}/query",
             headers=_headers(),
             json=payload,
             timeout=20
@@ -473,7 +496,7 @@ def create_exercise_entry(
         "properties": props,
     }
     
-    r = requests.post("https://api.notion.com/v1/pages", headers=_headers(), json=payload, timeout=20)
+    r = _post(f"{NOTION_BASE_URL.rstrip('/')}/pages", headers=_headers(), json=payload, timeout=20)
     if r.status_code >= 300:
         try:
             detail = r.json()
@@ -524,8 +547,8 @@ def query_exercise_entries(start_date: date, end_date: date) -> List[Dict[str, A
         if start_cursor:
             payload["start_cursor"] = start_cursor
         
-        r = requests.post(
-            f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID4}/query",
+        r = _post(
+            f"{NOTION_BASE_URL.rstrip('/')}/databases/{NOTION_DATABASE_ID4}/query",
             headers=_headers(),
             json=payload,
             timeout=20
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+记录类型注册表 + 统一解析引擎。
+
+每种记录（time / expense / food / exercise）声明：
+- 提示词与 schema（app/prompts.py 的 PromptSpec，必填字段由 schema 推出）；
+- 校验 / 补全函数（validators），按顺序作用在模型返回的参数上，可修改 dict 或抛 LLMParseError；
+- 本地规则解析（可选，app/local_parser.py），置信度够高时不调用 DeepSeek。
+
+引擎负责：构建请求 → _chat_completions → 取 tool call 参数 → JSON 解析（失败时用预编译的字段名正则修复一次）
+→ 必填字段校验 → validators；本地优先、指标和追踪也只在这里做一次。
+parse_items 用一次调用拆出一句口述里的多条记录，每条仍按所属记录类型校验。
+新增记录类型：在 prompts.SPECS 加一个 PromptSpec，再 register(RecordType(...))。
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .llm_parser import DEEPSEEK_MODEL, LLMParseError, DeepSeekUnavailable, _chat_completions
+from .local_parser import parse_time_locally, parse_expense_locally, LOCAL_PARSE_ENABLED, LOCAL_PARSE_MIN_CONFIDENCE
+from .metrics import METRICS
+from .prompts import SPECS, PromptSpec, build_request, build_multi_request, keep_candidate_tags
+from .tracing import annotate
+
+# 一句口述最多拆出的记录数（超出的丢弃，避免一次写太多 Notion 页面）
+MULTI_INGEST_MAX_ITEMS = int(os.environ.get("MULTI_INGEST_MAX_ITEMS", "8"))
+
+Validator = Callable[[Dict[str, Any], "ParseContext"], None]
+LocalParser = Callable[..., Optional[Dict[str, Any]]]
+
+class ParseContext:
+    __slots__ = ("utterance", "now", "tz", "categories", "tags")
+
+    def __init__(self, utterance: str, now: datetime, tz: str, categories: Optional[Sequence[str]], tags: Optional[Sequence[str]]):
+        self.utterance = utterance
+        self.now = now
+        self.tz = tz
+        self.categories = categories
+        self.tags = tags
+
+def repair_pattern(fields: Sequence[str]) -> "re.Pattern[str]":
+    # 模型偶尔漏掉字段名后的引号："tags: [..] / "confidence: 0.9 → "tags": [..] / "confidence": 0.9
+    return re.compile(r'"(' + "|".join(map(re.escape, fields)) + r'):\s*')
+
+def decode_arguments(args: str, repair_re: "re.Pattern[str]", intent: str) -> Any:
+    try:
+        return json.loads(args)
+    except json.JSONDecodeError as e:
+        METRICS.incr("json_repairs_total", intent=intent)
+        with METRICS.stage("fix_json", intent):
+            try:
+                return json.loads(repair_re.sub(r'"\1": ', args))
+            except json.JSONDecodeError:
+                raise LLMParseError(f"Invalid JSON from function call: {e}; raw={args[:500]}")
+
+def tool_arguments(data: Dict[str, Any]) -> str:
+    msg = data.get("choices", [{}])[0].get("message", {})
+    tool_calls = msg.get("tool_calls") or []
+    if not tool_calls:
+        raise LLMParseError("Model did not return a tool call.")
+    return tool_calls[0]["function"].get("arguments", "{}")
+
+class RecordType:
+    def __init__(self, name: str, spec: PromptSpec, validators: Sequence[Validator] = (), local: Optional[LocalParser] = None):
+        self.name = name
+        self.spec = spec
+        self.validators = list(validators)
+        self.local = local
+        self.required = list(spec.fields) + ["category"]
+        self.repair_re = repair_pattern(self.required)
+
+    def decode(self, args: str) -> Dict[str, Any]:
+        return decode_arguments(args, self.repair_re, self.name)
+
+    def finish(self, parsed: Any, ctx: ParseContext) -> Dict[str, Any]:
+        """必填字段校验 + validators"""
+        if not isinstance(parsed, dict):
+            raise LLMParseError(f"Function args are not an object: {str(parsed)[:200]}")
+        for k in self.required:
+            if k not in parsed:
+                raise LLMParseError(f"Missing key in function args: {k}")
+        for validate in self.validators:
+            validate(parsed, ctx)
+        return parsed
+
+    def parse_remote(self, ctx: ParseContext) -> Dict[str, Any]:
+        payload = {"model": DEEPSEEK_MODEL, **build_request(self.name, ctx.utterance, ctx.now, ctx.tz, ctx.categories, ctx.tags)}
+        return self.finish(self.decode(tool_arguments(_chat_completions(payload))), ctx)
+
+    def parse(self, ctx: ParseContext, **local_options) -> Dict[str, Any]:
+        """本地结果置信度达到阈值就直接用，否则调用 DeepSeek；DeepSeek 不可用（熔断 / 超时）时退回本地结果"""
+        if self.local is None:
+            return self.parse_remote(ctx)
+        local = self.local(ctx, **local_options) if LOCAL_PARSE_ENABLED else None
+        if local and local["confidence"] >= LOCAL_PARSE_MIN_CONFIDENCE:
+            outcome = "local"
+        else:
+            try:
+                remote = self.parse_remote(ctx)
+            except DeepSeekUnavailable:
+                if not local:
+                    raise
+                outcome = "local_fallback"
+            else:
+                outcome = "deepseek" if local else "miss"
+                local = remote
+        METRICS.incr("local_parse_total", intent=self.name, outcome=outcome)
+        annotate(parser=outcome)
+        return local
+
+REGISTRY: Dict[str, RecordType] = {}
+
+def register(record_type: RecordType) -> RecordType:
+    REGISTRY[record_type.name] = record_type
+    return record_type
+
+def parse_record(intent: str, utterance: str, now: datetime, tz: str,
+                 categories: Optional[Sequence[str]] = None, tags: Optional[Sequence[str]] = None, **local_options) -> Dict[str, Any]:
+    """Parse one utterance as record type `intent` (local rules first when the type has them)."""
+    return REGISTRY[intent].parse(ParseContext(utterance, now, tz, categories, tags), **local_options)
+
+def parse_with_llm(intent: str, utterance: str, now: datetime, tz: str,
+                   categories: Optional[Sequence[str]] = None, tags: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Always ask DeepSeek (no local rules)."""
+    return REGISTRY[intent].parse_remote(ParseContext(utterance, now, tz, categories, tags))
+
+_MULTI_REPAIR_RE = repair_pattern(list(dict.fromkeys(
+    ["items", "intent", "category"] + [field for spec in SPECS.values() for field in spec.fields])))
+
+def parse_items(utterance: str, now: datetime, tz: str,
+                categories: Optional[Dict[str, Sequence[str]]] = None,
+                tags: Optional[Dict[str, Sequence[str]]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """One DeepSeek call for every record in the utterance -> [(intent, parsed), ...] in spoken order.
+
+    Each item goes through its record type's required-key check and validators, same as parse_record.
+    """
+    categories = categories or {}
+    tags = tags or {}
+    payload = {"model": DEEPSEEK_MODEL, **build_multi_request(utterance, now, tz, categories, tags)}
+    parsed = decode_arguments(tool_arguments(_chat_completions(payload)), _MULTI_REPAIR_RE, "multi")
+    items = parsed.get("items") if isinstance(parsed, dict) else None
+    if not isinstance(items, list):
+        raise LLMParseError("Missing key in function args: items")
+    records = []
+    for item in items[:MULTI_INGEST_MAX_ITEMS]:
+        intent = item.pop("intent", None) if isinstance(item, dict) else None
+        if intent not in REGISTRY:
+            raise LLMParseError(f"Unknown record in items: {str(item)[:200]}")
+        ctx = ParseContext(utterance, now, tz, categories.get(intent), tags.get(intent))
+        records.append((intent, REGISTRY[intent].finish(item, ctx)))
+        METRICS.incr("multi_items_total", intent=intent)
+    return records
+
+# ---- validators ----
+
+def candidate_tags(parsed: Dict[str, Any], ctx: ParseContext):
+    """schema 不带候选标签枚举：去掉模型自造的标签（#标签 保留）"""
+    parsed["tags"] = keep_candidate_tags(parsed.get("tags") or [], ctx.tags or [], ctx.utterance)
+
+def first_candidate_tag(parsed: Dict[str, Any], ctx: ParseContext):
+    if not parsed.get("tags"):
+        parsed["tags"] = list(ctx.tags or [])[:1]
+
+DEFAULT_TIME_TAGS = [
+    (("开车", "驾驶", "通勤"), "交通"),
+    (("吃饭", "用餐", "午餐", "晚餐"), "吃饭"),
+    (("工作", "办公"), "工作"),
+    (("学习", "读书"), "学习"),
+    (("运动", "健身"), "运动"),
+    (("休息", "睡觉"), "休息"),
+]
+
+def default_time_tags(parsed: Dict[str, Any], ctx: ParseContext):
+    """确保 tags 不为空：先按 activity 关键词，再用 category"""
+    if parsed.get("tags"):
+        return
+    activity = parsed.get("activity", "").lower()
+    for words, tag in DEFAULT_TIME_TAGS:
+        if any(w in activity for w in words):
+            parsed["tags"] = [tag]
+            return
+    parsed["tags"] = [parsed.get("category") or "杂项"]
+
+# 常见食物热量估算（每份）
+CALORIE_ESTIMATES = {
+    "米饭": 200, "面条": 300, "面包": 150, "鸡蛋": 70, "牛奶": 150,
+    "鸡胸肉": 200, "牛肉": 250, "猪肉": 300, "鱼": 150, "虾": 100,
+    "苹果": 95, "香蕉": 105, "橙子": 62, "草莓": 50, "西瓜": 85,
+    "蔬菜": 50, "沙拉": 100, "汤": 150, "咖啡": 5, "茶": 2,
+    "蛋糕": 350, "饼干": 150, "巧克力": 200, "冰淇淋": 250, "薯片": 160
+}
+
+def estimate_food_calories(parsed: Dict[str, Any], ctx: ParseContext):
+    """补营养成分默认值；热量 <= 10 视为无效，按食物名称估算"""
+    for k in ("protein", "carbs", "fat"):
+        parsed.setdefault(k, 0)
+    if parsed.get("calories", 0) > 10:
+        return
+    food_name = parsed.get("food", "").lower()
+    estimated = next((c for key, c in CALORIE_ESTIMATES.items() if key in food_name), 200)
+    parsed["calories"] = estimated
+    parsed.setdefault("assumptions", []).append(f"根据食物名称'{food_name}'估算热量为{estimated}卡路里")
+
+# 卡路里/分钟，按强度
+BASE_CALORIES_PER_MINUTE = {"低": 5, "中": 8, "高": 12}
+# 运动类型调整系数
+EXERCISE_MULTIPLIER = {
+    "跑步": 1.2, "游泳": 1.3, "骑行": 1.1, "步行": 0.8,
+    "力量训练": 1.0, "举重": 1.1, "瑜伽": 0.7, "普拉提": 0.8,
+    "篮球": 1.4, "足球": 1.5, "网球": 1.3, "羽毛球": 1.2,
+    "跳绳": 1.6, "爬山": 1.4, "舞蹈": 1.0, "健身操": 1.1
+}
+
+def estimate_exercise_calories(parsed: Dict[str, Any], ctx: ParseContext):
+    """消耗热量 <= 10 视为无效，按运动类型、持续时间和强度估算"""
+    if parsed.get("calories_burned", 0) > 10:
+        return
+    exercise_type = parsed.get("exercise_type", "").lower()
+    duration_minutes = parsed.get("duration_minutes", 30)
+    intensity = parsed.get("intensity", "中")
+    multiplier = next((m for key, m in EXERCISE_MULTIPLIER.items() if key in exercise_type), 1.0)
+    estimated = round(BASE_CALORIES_PER_MINUTE.get(intensity, 8) * duration_minutes * multiplier)
+    parsed["calories_burned"] = estimated
+    parsed.setdefault("assumptions", []).append(
+        f"根据运动类型'{exercise_type}'、持续时间{duration_minutes}分钟、强度{intensity}估算消耗热量为{estimated}卡路里")
+
+# ---- registry ----
+
+register(RecordType(
+    "time", SPECS["time"], [candidate_tags, default_time_tags],
+    local=lambda ctx, category_keywords=None: parse_time_locally(
+        ctx.utterance, now=ctx.now, tz=ctx.tz, categories=ctx.categories, tags=ctx.tags, category_keywords=category_keywords),
+))
+register(RecordType(
+    "expense", SPECS["expense"], [candidate_tags, first_candidate_tag],
+    local=lambda ctx: parse_expense_locally(ctx.utterance, categories=ctx.categories, tags=ctx.tags),
+))
+register(RecordType("food", SPECS["food"], [candidate_tags, first_candidate_tag, estimate_food_calories]))
+register(RecordType("exercise", SPECS["exercise"], [candidate_tags, first_candidate_tag, estimate_exercise_calories]))
+
+# 旧的按类型命名的入口（测试脚本和外部调用仍在用），都只调用 DeepSeek
+def parse_with_deepseek(utterance: str, now: datetime, tz: str, categories: Optional[List[str]] = None, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+    return parse_with_llm("time", utterance, now, tz, categories, tags)
+
+def parse_expense_with_deepseek(utterance: str, now: datetime, tz: str, categories: Optional[List[str]] = None, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+    return parse_with_llm("expense", utterance, now, tz, categories, tags)
+
+def parse_food_with_deepseek(utterance: str, now: datetime, tz: str, categories: Optional[List[str]] = None, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+    return parse_with_llm("food", utterance, now, tz, categories, tags)
+
+def parse_exercise_with_deepseek(utterance: str, now: datetime, tz: str, categories: Optional[List[str]] = None, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+    return parse_with_llm("exercise", utterance, now, tz, categories, tags)
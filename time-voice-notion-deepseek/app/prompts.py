@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+DeepSeek 解析请求的提示词与工具 schema，进程启动时构建一次。
+
+- schema 只保留约束本身（类型、必填、枚举），字段含义靠字段名 + 一两句规则说明；
+- 请求按"静态前缀 + 动态尾部"排列，便于命中 DeepSeek 的上下文硬盘缓存（按请求前缀匹配，64 token 为单位）：
+  tools 和 system 对同一类解析在进程内逐字节不变，当前时间、时区、候选标签和口述内容都放在最后一条 user 消息里；
+- 候选标签不再整体塞进 schema 的 enum（/ingest 会带上 mapping.yml 的全部关键词），
+  而是按口述内容做本地关键词匹配，只把最相关的 PROMPT_TAG_TOP_K 个列在 user 消息里；
+- 多条记录模式（extract_records）：items 数组的每一项是四种记录 schema 之一（anyOf，用 intent 区分），一次调用拆出整句口述里的所有记录。
+"""
+from __future__ import annotations
+
+import functools
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+PROMPT_TAG_TOP_K = int(os.environ.get("PROMPT_TAG_TOP_K", "8"))
+
+_TAG_RE = re.compile(r"#([^\s#@，。,.;；！!？?]+)")
+
+_COMMON = {
+    "tags": {"type": "array", "items": {"type": "string"}},
+    "confidence": {"type": "number"},
+    "assumptions": {"type": "array", "items": {"type": "string"}},
+}
+
+class PromptSpec:
+    """One extraction tool: static system prompt + schema (category enum filled in per category list)."""
+
+    def __init__(self, tool: str, system: str, fields: Dict[str, Dict[str, Any]], default_categories: List[str]):
+        self.tool = tool
+        self.system = system.strip()
+        self.fields = {**fields, **_COMMON}
+        self.default_categories = default_categories
+
+    def tools(self, categories: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        return _tools(self, tuple(categories or self.default_categories))
+
+def _properties(spec: PromptSpec, categories: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    properties = {name: dict(schema) for name, schema in spec.fields.items()}
+    properties["category"] = {"type": "string", "enum": list(categories)}
+    return properties
+
+@functools.lru_cache(maxsize=64)
+def _tools(spec: PromptSpec, categories: tuple) -> List[Dict[str, Any]]:
+    properties = _properties(spec, categories)
+    return [{
+        "type": "function",
+        "function": {
+            "name": spec.tool,
+            "strict": True,
+            "parameters": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False,
+            },
+        },
+    }]
+
+_TAIL_RULE = "#标签原样放入 tags，没有则从候选标签选一个；category 必须从枚举中选；推断和默认值写入 assumptions。"
+
+SPECS: Dict[str, PromptSpec] = {
+    "time": PromptSpec(
+        "extract_time_log",
+        f"""
+把中文口述的时间记录解析为字段，只通过工具 extract_time_log 返回。
+1) 按当前时间和时区把"9点到10点、10点半到现在、昨晚23:10-0:40、刚才30分钟"等换算为含时区的 ISO-8601；
+2) 只给一个时间点时另一端取当前时间；跨日或顺序颠倒时保证 start_iso <= end_iso；
+3) activity 保留动词短语，没有则"未命名活动"；@提及放入 mentions；
+4) {_TAIL_RULE}
+""",
+        {
+            "start_iso": {"type": "string"},
+            "end_iso": {"type": "string"},
+            "activity": {"type": "string"},
+            "mentions": {"type": "array", "items": {"type": "string"}},
+        },
+        ["工作", "放松", "睡觉", "运动", "学习", "杂项"],
+    ),
+    "expense": PromptSpec(
+        "extract_expense_log",
+        f"""
+把中文口述的花销解析为字段，只通过工具 extract_expense_log 返回。
+1) amount 为数字金额（"15.5元"、"三十块"）；content 为花销内容（"午餐"、"打车"、"买书"）；
+2) {_TAIL_RULE}
+""",
+        {
+            "content": {"type": "string"},
+            "amount": {"type": "number"},
+        },
+        ["餐饮", "交通", "购物", "娱乐", "医疗", "学习", "住房", "其他", "工作"],
+    ),
+    "food": PromptSpec(
+        "extract_food_log",
+        f"""
+把中文口述的饮食解析为字段，只通过工具 extract_food_log 返回。
+1) food 为食物名称；calories 为热量（大卡），没说时按常见分量估算；category 为餐次；
+2) {_TAIL_RULE}
+""",
+        {
+            "food": {"type": "string"},
+            "calories": {"type": "number"},
+        },
+        ["早餐", "午餐", "晚餐", "零食", "加餐", "饮料"],
+    ),
+    "exercise": PromptSpec(
+        "extract_exercise_log",
+        f"""
+把中文口述的运动解析为字段，只通过工具 extract_exercise_log 返回。
+1) exercise_type 为运动类型；duration_minutes 为分钟数，calories_burned 为消耗热量，没说时按运动类型估算；
+2) intensity 为低 / 中 / 高；
+3) {_TAIL_RULE}
+""",
+        {
+            "exercise_type": {"type": "string"},
+            "duration_minutes": {"type": "number"},
+            "calories_burned": {"type": "number"},
+            "intensity": {"type": "string", "enum": ["低", "中", "高"]},
+        },
+        ["有氧运动", "力量训练", "柔韧性训练", "高强度间歇训练", "户外运动", "其他"],
+    ),
+}
+
+def top_k_tags(utterance: str, candidates: Sequence[str], k: int = PROMPT_TAG_TOP_K) -> List[str]:
+    """Most relevant candidate tags: contained in the utterance > shares characters with it > original order."""
+    if len(candidates) <= k:
+        return list(candidates)
+    chars = set(utterance)
+
+    def score(item):
+        i, tag = item
+        if tag and tag in utterance:
+            return (0, -len(tag), i)
+        overlap = len(chars.intersection(tag)) / len(tag) if tag else 0
+        return (1 if overlap else 2, -overlap, i)
+
+    return [tag for _, tag in sorted(enumerate(dict.fromkeys(candidates)), key=score)[:k]]
+
+def keep_candidate_tags(tags: List[str], candidates: Sequence[str], utterance: str) -> List[str]:
+    """Drop tags the model made up (the schema no longer carries the candidate enum); #tags from the text are kept."""
+    allowed = set(candidates) | set(_TAG_RE.findall(utterance))
+    if not allowed:
+        return tags
+    return [t for t in tags if t in allowed]
+
+def _user_message(utterance: str, now: datetime, tz: str, tag_lines: Sequence[tuple]) -> str:
+    lines = [f"当前时间: {now.isoformat(timespec='seconds')}", f"当前时区: {tz}"]
+    lines.extend(f"{label}: {'、'.join(candidates)}" for label, candidates in tag_lines if candidates)
+    lines.append(f"原始口述：{utterance}")
+    return "\n".join(lines)
+
+def build_request(intent: str, utterance: str, now: datetime, tz: str,
+                  categories: Optional[Sequence[str]] = None, tags: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Chat-completions body (without `model`) with the static parts first."""
+    spec = SPECS[intent]
+    candidates = top_k_tags(utterance, tags or [])
+    return {
+        "messages": [
+            {"role": "system", "content": spec.system},
+            {"role": "user", "content": _user_message(utterance, now, tz, [("候选标签", candidates)])},
+        ],
+        "tools": spec.tools(categories),
+        "tool_choice": {"type": "function", "function": {"name": spec.tool}},
+        "temperature": 0.2,
+        "max_tokens": 400,
+    }
+
+# ---- 多条记录：一次调用拆出 time / expense / food / exercise 若干条 ----
+
+MULTI_TOOL = "extract_records"
+
+MULTI_SYSTEM = f"""
+把一段中文口述拆成若干条记录，只通过工具 extract_records 返回，items 按口述顺序排列，intent 为：
+- time：做了什么、从几点到几点或持续多久；按当前时间和时区换算为含时区的 ISO-8601，start_iso <= end_iso；activity 保留动词短语，@提及放入 mentions；
+- expense：amount 为数字金额，content 为花销内容；
+- food：food 为食物名称，calories 为热量（大卡），没说时按常见分量估算，category 为餐次；
+- exercise：duration_minutes 为分钟数，calories_burned 没说时按运动类型估算，intensity 为低 / 中 / 高。
+一句话可以产生多条记录（"早餐吃了两个鸡蛋花了12元"是一条 food 和一条 expense）；运动只记 exercise，不再另记 time。
+{_TAIL_RULE}候选标签按 intent 分行给出。
+""".strip()
+
+def multi_tools(categories: Optional[Dict[str, Sequence[str]]] = None) -> List[Dict[str, Any]]:
+    categories = categories or {}
+    return _multi_tools(tuple((intent, tuple(categories.get(intent) or spec.default_categories)) for intent, spec in SPECS.items()))
+
+@functools.lru_cache(maxsize=16)
+def _multi_tools(categories: tuple) -> List[Dict[str, Any]]:
+    variants = []
+    for intent, cats in categories:
+        properties = {"intent": {"type": "string", "enum": [intent]}, **_properties(SPECS[intent], cats)}
+        variants.append({"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False})
+    return [{
+        "type": "function",
+        "function": {
+            "name": MULTI_TOOL,
+            "strict": True,
+            "parameters": {
+                "type": "object",
+                "properties": {"items": {"type": "array", "items": {"anyOf": variants}}},
+                "required": ["items"],
+                "additionalProperties": False,
+            },
+        },
+    }]
+
+def build_multi_request(utterance: str, now: datetime, tz: str,
+                        categories: Optional[Dict[str, Sequence[str]]] = None,
+                        tags: Optional[Dict[str, Sequence[str]]] = None) -> Dict[str, Any]:
+    """Chat-completions body (without `model`) asking for every record in the utterance; candidates are per intent."""
+    tags = tags or {}
+    tag_lines = [(f"候选标签（{intent}）", top_k_tags(utterance, tags.get(intent) or [])) for intent in SPECS]
+    return {
+        "messages": [
+            {"role": "system", "content": MULTI_SYSTEM},
+            {"role": "user", "content": _user_message(utterance, now, tz, tag_lines)},
+        ],
+        "tools": multi_tools(categories),
+        "tool_choice": {"type": "function", "function": {"name": MULTI_TOOL}},
+        "temperature": 0.2,
+        "max_tokens": 1200,
+    }
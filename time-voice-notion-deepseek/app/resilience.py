@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+外部调用的时间预算与熔断：
+
+- 请求截止时间（deadline）：HTTP 中间件按 `X-Request-Timeout` 头或 REQUEST_DEADLINE_SECONDS 设置，
+  通过 contextvars 传到线程池里的 DeepSeek / Notion 调用，单次调用的超时不会超过剩余预算；
+- 自适应超时：按最近的成功调用延迟（滚动窗口）取 p99 × 倍数，限制在 [最小值, 固定上限] 之间；
+- 熔断器：连续失败达到阈值后打开，冷却期内直接失败（调用方走本地兜底），冷却后放一个探测请求。
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "30"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Run the block with a deadline `seconds` from now (None/<=0: no deadline); nested scopes only tighten it."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(min(at, current) if current else at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+def budget(timeout: float) -> float:
+    """Cap a per-call timeout by the remaining request budget (may be <= 0 when already expired)."""
+    left = remaining()
+    return timeout if left is None else min(timeout, left)
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def ready(self) -> bool:
+        return len(self.samples) >= self.min_samples
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self, ceiling: float, floor: float, multiplier: float) -> float:
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return ceiling
+        return max(floor, min(ceiling, p99 * multiplier))
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+    """closed → open after `threshold` consecutive failures → half-open after `cooldown` (one probe)."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self.probing:
+                raise CircuitOpen(f"circuit open after {self.failures} consecutive failures")
+            self.probing = True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= self.threshold:
+                # 半开探测失败时重新计时
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Call finished without a verdict (e.g. a 4xx): let the next probe through."""
+        with self.lock:
+            self.probing = False
@@ -8,6 +8,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from .notion_client import get_today_entries, get_yesterday_entries, get_current_month_expense_entries, get_current_month_time_entries, get_today_food_entries, get_yesterday_food_entries, get_today_exercise_entries, get_yesterday_exercise_entries, get_today_expense_entries, get_yesterday_expense_entries, NotionError
+from .metrics import METRICS
 from .stats import calculate_daily_stats, generate_daily_report, calculate_monthly_expense_stats, generate_monthly_expense_report, calculate_date_range_stats, generate_date_range_report, calculate_daily_calorie_stats, generate_daily_calorie_report, calculate_daily_expense_stats, generate_unified_daily_report
 
 # 配置日志
@@ -73,6 +74,7 @@ class DailyStatsScheduler:
         except Exception as e:
             logger.error(f"发送到飞书时发生错误: {e}")
     
+    @METRICS.job("daily_stats")
     def generate_daily_stats(self):
         """生成每日统计数据"""
         try:
@@ -138,6 +140,7 @@ class DailyStatsScheduler:
             # 如果开始和结束时间为空，自动统计本月的时间
             self.generate_current_month_stats()
     
+    @METRICS.job("date_range_stats")
     def generate_date_range_stats(self, start_date: str, end_date: str):
         """生成指定日期范围的统计数据"""
         try:
@@ -185,6 +188,7 @@ class DailyStatsScheduler:
             self.send_to_feishu(error_message)
             logger.error(f"生成日期范围统计数据时发生错误: {e}")
     
+    @METRICS.job("monthly_expense_stats")
     def generate_monthly_expense_stats(self):
         """生成当月花销统计数据"""
         try:
@@ -225,6 +229,7 @@ class DailyStatsScheduler:
             self.send_to_feishu(error_message)
             logger.error(f"生成花销统计数据时发生错误: {e}")
     
+    @METRICS.job("current_month_stats")
     def generate_current_month_stats(self):
         """生成当月时间统计数据"""
         try:
@@ -274,6 +279,7 @@ class DailyStatsScheduler:
             self.send_to_feishu(error_message)
             logger.error(f"生成当月时间统计数据时发生错误: {e}")
     
+    @METRICS.job("daily_calorie_stats")
     def generate_daily_calorie_stats(self):
         """生成每日热量统计数据"""
         try:
@@ -316,6 +322,7 @@ class DailyStatsScheduler:
             self.send_to_feishu(error_message)
             logger.error(f"生成热量统计数据时发生错误: {e}")
     
+    @METRICS.job("unified_daily_report")
     def generate_unified_daily_report(self):
         """生成统一的每日报告，包含时间、热量和花销统计（统计当天的数据）"""
         try:
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+轻量请求追踪：给 /unified-ingest → 分类 → 路由 → 解析（DeepSeek）→ 写 Notion 这条链路打上同一个 trace id。
+
+- span 之间的父子关系用 contextvars 传递，FastAPI 的线程池和中间件都会复制上下文；
+- 入站请求如果带 W3C `traceparent` 头，沿用其中的 trace id；响应头返回 `X-Trace-Id`；
+- 结束的 span 放进有界队列，由后台线程批量导出：
+  TRACE_FILE=<path> 追加写 JSONL，TRACE_COLLECTOR_URL=<url> 以 JSON 数组 POST 给收集端；
+  两者都未配置时不创建 span，每个埋点只多一次开关判断。
+"""
+from __future__ import annotations
+
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import requests
+
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+TRACE_COLLECTOR_URL = os.environ.get("TRACE_COLLECTOR_URL", "")
+TRACE_QUEUE_SIZE = int(os.environ.get("TRACE_QUEUE_SIZE", "10000"))
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": round(self.start, 6),
+            "duration_ms": round(((self.end or time.time()) - self.start) * 1000, 3),
+            "status": self.status,
+            "attributes": {k: v for k, v in self.attributes.items() if v is not None},
+        }
+
+class _NoopSpan:
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Exporter:
+    """Drain finished spans on a daemon thread; drop (and count) when the queue is full."""
+
+    def __init__(self, path: str = "", collector_url: str = "", maxsize: int = TRACE_QUEUE_SIZE):
+        self.path = path
+        self.collector_url = collector_url
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.collector_url)
+
+    def submit(self, span: Span):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, first: Dict[str, Any]) -> List[Dict[str, Any]]:
+        batch = [first]
+        while len(batch) < 512:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._drain(self.queue.get())
+            self.write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def write(self, batch: List[Dict[str, Any]]):
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in batch))
+            except OSError as e:
+                print(f"trace export to {self.path} failed: {e}")
+        if self.collector_url:
+            try:
+                requests.post(self.collector_url, data=json.dumps(batch, ensure_ascii=False, default=str).encode("utf-8"),
+                              headers={"Content-Type": "application/json"}, timeout=5)
+            except requests.RequestException as e:
+                print(f"trace export to {self.collector_url} failed: {e}")
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued spans are written (used by tests / benchmarks)."""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+EXPORTER = Exporter(TRACE_FILE, TRACE_COLLECTOR_URL)
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+def annotate(**attributes):
+    """Set attributes on the current span (no-op when tracing is off)."""
+    current_span().set(**attributes)
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Open a child of the current span (or a new trace root)."""
+    if not EXPORTER.enabled:
+        yield NOOP_SPAN
+        return
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        found = _TRACEPARENT.match(traceparent or "")
+        trace_id, parent_id = (found.group(1), found.group(2)) if found else (secrets.token_hex(16), None)
+    sp = Span(name, trace_id, parent_id, attributes)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.status = "error"
+        sp.attributes["error"] = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        sp.end = time.time()
+        _current.reset(token)
+        EXPORTER.submit(sp)
@@ -3,12 +3,13 @@ from __future__ import annotations
 
 import os
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional, Tuple, Type
 from datetime import datetime
 import requests
 from fastapi import HTTPException
+from pydantic import BaseModel
 
-from .llm_parser import LLMParseError, _headers, _chat_completions
+from .llm_parser import LLMParseError, DeepSeekUnavailable, _headers, _chat_completions
 
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/beta")
@@ -17,6 +18,34 @@ DEEPSEEK_MODEL = os.environ.get("DEEPSEEK_MODEL", "deepseek-chat")
 class UnifiedIngestError(Exception):
     pass
 
+# DeepSeek 不可用时的本地关键词分类，按顺序匹配，都不命中则归为时间记录
+LOCAL_INTENT_KEYWORDS = [
+    ("expense", ["元", "块钱", "花了", "花费", "买了", "付了", "打车"]),
+    ("exercise", ["跑步", "游泳", "健身", "训练", "瑜伽", "骑行", "跳绳", "爬山", "锻炼", "运动"]),
+    ("food", ["吃了", "喝了", "早餐", "午餐", "晚餐", "夜宵", "零食", "大卡", "卡路里"]),
+]
+
+def classify_intent_locally(utterance: str, reason: str = "") -> Dict[str, Any]:
+    """关键词分类兜底，置信度固定偏低，便于在结果里区分"""
+    for intent, keywords in LOCAL_INTENT_KEYWORDS:
+        hits = [k for k in keywords if k in utterance]
+        if hits:
+            break
+    else:
+        intent, hits = "time", []
+    return {
+        "intent_type": intent,
+        "confidence": 0.5 if hits else 0.3,
+        "reasoning": f"DeepSeek 不可用，按关键词本地分类（{reason}）" if reason else "按关键词本地分类",
+        "extracted_info": {
+            "has_time_range": intent == "time",
+            "has_amount": intent == "expense",
+            "has_food": intent == "food",
+            "has_exercise": intent == "exercise",
+            "keywords": hits,
+        },
+    }
+
 def classify_intent_with_deepseek(utterance: str) -> Dict[str, Any]:
     """
     使用DeepSeek AI对用户指令进行分类
@@ -146,82 +175,39 @@ def classify_intent_with_deepseek(utterance: str) -> Dict[str, Any]:
         
         return parsed
         
+    except DeepSeekUnavailable as e:
+        return classify_intent_locally(utterance, reason=str(e))
     except Exception as e:
         if isinstance(e, UnifiedIngestError):
             raise e
         raise UnifiedIngestError(f"AI分类失败: {str(e)}")
 
 
+# intent -> (端点函数, 请求体模型)：main.py 在定义完各端点后填入（unified_ingest 被 main 导入，不能反向导入 main），
+# 路由时只做一次字典查找和一次模型实例化
+ROUTES: Dict[str, Tuple[Callable[[Any], Dict[str, Any]], Type[BaseModel]]] = {}
+
 def route_to_correct_endpoint(intent_type: str, utterance: str, tz: str, source: Optional[str] = None, now: Optional[str] = None) -> Dict[str, Any]:
     """
     根据分类结果路由到正确的API端点
-    
+
     参数:
     - intent_type: 意图类型 ("time", "expense", "food", "exercise")
     - utterance: 用户原始指令
     - tz: 时区
     - source: 来源（可选）
     - now: 覆盖当前时间（可选）
-    
+
     返回:
     - 对应API端点的响应
     """
-    
+    route = ROUTES.get(intent_type)
+    if route is None:
+        raise HTTPException(status_code=400, detail=f"不支持的意图类型: {intent_type}")
+    handler, body_model = route
     try:
-        # 直接导入对应的处理函数
-        from .main import ingest, expense, food, exercise
-        from pydantic import BaseModel
-        
-        # 创建对应的请求体模型
-        class IngestBody(BaseModel):
-            utterance: str
-            tz: str
-            source: Optional[str] = None
-            now: Optional[str] = None
-        
-        class FoodBody(BaseModel):
-            utterance: str
-            tz: str
-            source: Optional[str] = None
-            now: Optional[str] = None
-        
-        class ExerciseBody(BaseModel):
-            utterance: str
-            tz: str
-            source: Optional[str] = None
-            now: Optional[str] = None
-        
-        class ExpenseBody(BaseModel):
-            utterance: str
-            tz: str
-            source: Optional[str] = None
-            now: Optional[str] = None
-        
-        # 构建请求体
-        base_body = {
-            "utterance": utterance,
-            "tz": tz,
-            "source": source,
-            "now": now
-        }
-        
-        # 根据意图类型调用对应的函数
-        if intent_type == "time":
-            body = IngestBody(**base_body)
-            return ingest(body)
-        elif intent_type == "expense":
-            body = ExpenseBody(**base_body)
-            return expense(body)
-        elif intent_type == "food":
-            body = FoodBody(**base_body)
-            return food(body)
-        elif intent_type == "exercise":
-            body = ExerciseBody(**base_body)
-            return exercise(body)
-        else:
-            raise HTTPException(status_code=400, detail=f"不支持的意图类型: {intent_type}")
-            
+        return handler(body_model(utterance=utterance, tz=tz, source=source, now=now))
+    except HTTPException:
+        raise
     except Exception as e:
-        if isinstance(e, HTTPException):
-            raise e
         raise HTTPException(status_code=500, detail=f"路由失败: {str(e)}")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地规则解析（时间 / 花销）的延迟与命中率，对比同一批句子走 DeepSeek（本地桩服务）的延迟。
+
+用法：
+    python benchmarks/bench_local_parsers.py                      # 默认每句 2000 次本地解析 + 每句 5 次 DeepSeek
+    python benchmarks/bench_local_parsers.py --runs 10000 --deepseek-runs 0   # 只看本地解析
+    python benchmarks/bench_local_parsers.py --deepseek-latency-ms 800
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_servers import StubConfig, DeepSeekHandler, StubServer
+from run_bench import configure_env, percentile
+
+TZ = "Asia/Shanghai"
+
+TIME_UTTERANCES = [
+    "9点到10点 写合同 #工作 @项目A",
+    "刚才开会30分钟",
+    "昨晚23:10-0:40看电影",
+    "下午3点半到5点 开会",
+    "14:00~15:30 代码评审",
+    "10点半到现在 写代码",
+    "跑步1个半小时",
+    "读书半小时",
+    "3点到4点 午睡",
+    "周五下午3点到5点 开会",      # 本地不处理
+    "早上起来整理了一下房间",      # 没有时间表达
+]
+
+EXPENSE_UTTERANCES = [
+    "打车花了15.5元 #交通",
+    "午餐花了50元 #餐饮",
+    "午饭三十五块",
+    "房租2.5k",
+    "买了30块钱的书",
+    "超市买日用品花了一百二十八元",
+    "两本书一共80元，每本40元",    # 多个金额
+    "买了个东西30元",               # 分类无法确定
+]
+EXPENSE_CATEGORIES = ["餐饮", "交通", "购物", "娱乐", "医疗", "学习", "住房", "其他", "工作"]
+EXPENSE_TAGS = ["日常", "必要", "非必要"]
+
+def stats(samples: List[float]) -> Dict[str, Any]:
+    s = sorted(samples)
+    return {
+        "n": len(s),
+        "p50_us": round(percentile(s, 0.50) * 1e6, 1),
+        "p99_us": round(percentile(s, 0.99) * 1e6, 1),
+        "max_us": round(s[-1] * 1e6, 1),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="本地规则解析 vs DeepSeek 延迟")
+    ap.add_argument("--runs", type=int, default=2000, help="每句本地解析次数")
+    ap.add_argument("--deepseek-runs", type=int, default=5, help="每句 DeepSeek 调用次数（0 跳过）")
+    ap.add_argument("--deepseek-latency-ms", type=float, default=300)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    args = ap.parse_args()
+
+    deepseek = StubServer(DeepSeekHandler, StubConfig(args.deepseek_latency_ms, args.jitter_ms, seed=1)).start()
+    configure_env(deepseek.url, "http://127.0.0.1:9")
+    import pytz
+    from app.local_parser import parse_time_locally, parse_expense_locally, LOCAL_PARSE_MIN_CONFIDENCE
+    from app.parsers import parse_with_deepseek, parse_expense_with_deepseek
+
+    now = datetime.now(pytz.timezone(TZ))
+    cases = {
+        "time": (TIME_UTTERANCES,
+                 lambda text: parse_time_locally(text, now=now, tz=TZ),
+                 lambda text: parse_with_deepseek(text, now=now, tz=TZ)),
+        "expense": (EXPENSE_UTTERANCES,
+                    lambda text: parse_expense_locally(text, categories=EXPENSE_CATEGORIES, tags=EXPENSE_TAGS),
+                    lambda text: parse_expense_with_deepseek(text, now=now, tz=TZ, categories=EXPENSE_CATEGORIES, tags=EXPENSE_TAGS)),
+    }
+    results = {}
+    try:
+        for intent, (utterances, local_fn, remote_fn) in cases.items():
+            local: List[float] = []
+            remote: List[float] = []
+            accepted = 0
+            print(f"[{intent}]")
+            for text in utterances:
+                parsed = local_fn(text)
+                hit = parsed is not None and parsed["confidence"] >= LOCAL_PARSE_MIN_CONFIDENCE
+                accepted += hit
+                print(f"  {'local   ' if hit else 'deepseek'}  {text}")
+                for _ in range(args.runs):
+                    t0 = time.perf_counter()
+                    local_fn(text)
+                    local.append(time.perf_counter() - t0)
+                for _ in range(args.deepseek_runs):
+                    t0 = time.perf_counter()
+                    remote_fn(text)
+                    remote.append(time.perf_counter() - t0)
+            results[intent] = (accepted, len(utterances), local, remote)
+    finally:
+        deepseek.stop()
+
+    print(f"\n阈值 {LOCAL_PARSE_MIN_CONFIDENCE}；DeepSeek 桩延迟 {args.deepseek_latency_ms}ms ± {args.jitter_ms}ms")
+    for intent, (accepted, total, local, remote) in results.items():
+        print(f"{intent:<8} 本地命中 {accepted}/{total}")
+        print(f"  local     {stats(local)}")
+        if remote:
+            print(f"  deepseek  {stats(remote)}")
+
+if __name__ == "__main__":
+    main()
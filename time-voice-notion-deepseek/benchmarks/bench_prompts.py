@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek 解析请求的 prompt 体积、上下文缓存命中和延迟。
+
+对四个解析函数按各端点实际传入的分类 / 标签（/ingest 使用 app/mapping.yml）依次调用，
+桩服务按 DeepSeek 文档的字符换算估算 token，用最长公共前缀模拟上下文硬盘缓存，
+并按未命中缓存的 token 数增加预填充延迟（--prefill-ms-per-1k），用于比较提示词改动前后的差异。
+
+用法：
+    python benchmarks/bench_prompts.py
+    python benchmarks/bench_prompts.py --rounds 20 --prefill-ms-per-1k 300 --latency-ms 150
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_servers import StubConfig, DeepSeekHandler, StubServer
+from run_bench import configure_env, percentile
+
+TZ = "Asia/Shanghai"
+
+UTTERANCES = {
+    "time": ["9点到10点 写合同 #工作 @项目A", "刚才开会30分钟", "昨晚23:10-0:40看电影", "下午两点到四点调研竞品"],
+    "expense": ["午餐花了50元 #餐饮", "打车花了15.5元", "买了30块钱的书", "两本书一共80元"],
+    "food": ["午餐吃了鸡胸肉和蔬菜约400卡", "喝了杯咖啡", "一个苹果大约95卡", "晚饭吃了一碗面"],
+    "exercise": ["跑步30分钟消耗了300卡", "做了45分钟的力量训练", "游泳1小时", "瑜伽40分钟"],
+}
+
+def main():
+    ap = argparse.ArgumentParser(description="DeepSeek 解析请求的 prompt 体积 / 缓存命中 / 延迟")
+    ap.add_argument("--rounds", type=int, default=10, help="每句调用次数（每次的当前时间不同）")
+    ap.add_argument("--latency-ms", type=float, default=100, help="桩服务固定延迟")
+    ap.add_argument("--prefill-ms-per-1k", type=float, default=400, help="每 1k 未命中缓存的 prompt token 增加的延迟")
+    args = ap.parse_args()
+
+    cfg = StubConfig(args.latency_ms, 0, prefill_ms_per_1k=args.prefill_ms_per_1k)
+    deepseek = StubServer(DeepSeekHandler, cfg).start()
+    configure_env(deepseek.url, "http://127.0.0.1:9")
+    os.environ.setdefault("CATEGORY_MAPPING", os.path.join(os.path.dirname(__file__), "..", "app", "mapping.yml"))
+    import pytz
+    from app import main as api
+    from app.parsers import parse_with_deepseek, parse_expense_with_deepseek, parse_food_with_deepseek, parse_exercise_with_deepseek
+    from app.metrics import METRICS
+
+    # 与各端点传入的候选集一致
+    calls = {
+        "time": lambda u, now: parse_with_deepseek(u, now=now, tz=TZ, categories=api.TIME_CATEGORIES or None, tags=api.TIME_TAGS or None),
+        "expense": lambda u, now: parse_expense_with_deepseek(u, now=now, tz=TZ, categories=["餐饮", "交通", "购物", "娱乐", "医疗", "学习", "住房", "其他", "工作"], tags=["日常", "必要", "非必要"]),
+        "food": lambda u, now: parse_food_with_deepseek(u, now=now, tz=TZ, categories=["早餐", "午餐", "晚餐", "零食", "加餐", "饮料"], tags=["健康", "高蛋白", "低碳水", "低脂肪", "快餐", "自制"]),
+        "exercise": lambda u, now: parse_exercise_with_deepseek(u, now=now, tz=TZ, categories=["有氧运动", "力量训练", "柔韧性训练", "高强度间歇训练", "户外运动", "其他"], tags=["室内", "户外", "健身房", "家庭", "高强度", "低强度"]),
+    }
+
+    start = datetime.now(pytz.timezone(TZ))
+    rows = []
+    try:
+        for intent, call in calls.items():
+            METRICS.reset()
+            latencies: List[float] = []
+            for r in range(args.rounds):
+                for j, text in enumerate(UTTERANCES[intent]):
+                    now = start + timedelta(seconds=97 * (r * len(UTTERANCES[intent]) + j))
+                    t0 = time.perf_counter()
+                    call(text, now)
+                    latencies.append(time.perf_counter() - t0)
+            tokens: Dict[str, float] = {labels[0][1]: v for labels, v in METRICS.counters.get("deepseek_tokens_total", {}).items()}
+            n = len(latencies)
+            s = sorted(latencies)
+            rows.append((intent, tokens.get("prompt", 0) / n, tokens.get("cache_hit", 0) / max(tokens.get("prompt", 1), 1),
+                         percentile(s, 0.5) * 1000, percentile(s, 0.95) * 1000))
+    finally:
+        deepseek.stop()
+
+    print(f"\n桩服务：固定 {args.latency_ms}ms + 每 1k 未命中 token {args.prefill_ms_per_1k}ms；每句 {args.rounds} 次")
+    header = f"{'intent':<10}{'prompt_tok':>12}{'cache_hit':>11}{'p50ms':>9}{'p95ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for intent, prompt, hit, p50, p95 in rows:
+        print(f"{intent:<10}{prompt:>12.0f}{hit:>10.0%}{p50:>9.1f}{p95:>9.1f}")
+
+if __name__ == "__main__":
+    main()
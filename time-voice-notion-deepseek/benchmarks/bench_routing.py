@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/unified-ingest 路由层的单次开销：route_to_correct_endpoint 构造请求体并调用对应端点。
+
+各端点替换为空函数，只测路由本身（导入、请求体模型、分发），不含解析和写 Notion。
+替换同时作用于 app.main 的端点属性和 unified_ingest.ROUTES（存在时），改动前后的提交都能直接运行。
+
+用法：
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --runs 20000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from run_bench import configure_env, percentile
+
+INTENTS = ["time", "expense", "food", "exercise"]
+
+def main():
+    ap = argparse.ArgumentParser(description="unified-ingest 路由层单次开销")
+    ap.add_argument("--runs", type=int, default=5000, help="每种意图的调用次数")
+    args = ap.parse_args()
+
+    configure_env("http://127.0.0.1:9", "http://127.0.0.1:9")
+    from app import main as api
+    from app import unified_ingest
+
+    def noop(body):
+        return {"ok": True}
+
+    for name in ("ingest", "expense", "food", "exercise"):
+        setattr(api, name, noop)
+    routes = getattr(unified_ingest, "ROUTES", None)
+    if routes is not None:
+        for intent, (_, model) in list(routes.items()):
+            routes[intent] = (noop, model)
+
+    samples: List[float] = []
+    for intent in INTENTS:
+        for i in range(args.runs):
+            t0 = time.perf_counter()
+            unified_ingest.route_to_correct_endpoint(intent, "9点到10点 写合同", "Asia/Shanghai", source="bench", now=None)
+            samples.append(time.perf_counter() - t0)
+
+    s = sorted(samples)
+    print(f"route_to_correct_endpoint：{len(s)} 次（每种意图 {args.runs} 次）")
+    print(f"  mean {sum(s) / len(s) * 1e6:8.1f} µs")
+    print(f"  p50  {percentile(s, 0.50) * 1e6:8.1f} µs")
+    print(f"  p99  {percentile(s, 0.99) * 1e6:8.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端压测：本地桩服务代替 DeepSeek / Notion，测量服务自身 + 网络往返的延迟分布和吞吐。
+
+场景：
+- unified：顺序调用 POST /unified-ingest（分类 + 解析两次 LLM 调用 + 一次 Notion 建页）；
+- batch：多个并发客户端混合调用 /unified-ingest 和四个单类型端点，模拟语音客户端批量补传；
+- reports：直接调用调度器的各个报表任务（Notion 分页查询 + 统计 + 生成文本）。
+
+用法：
+    python benchmarks/run_bench.py                       # 全部场景，默认延迟
+    python benchmarks/run_bench.py --scenario batch --concurrency 16 --requests 400
+    python benchmarks/run_bench.py --deepseek-latency-ms 0 --notion-latency-ms 0   # 只看服务自身开销
+    python benchmarks/run_bench.py --json bench.json     # 结果另存为 JSON，便于前后对比
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_servers import StubConfig, DeepSeekHandler, NotionHandler, StubServer
+
+UTTERANCES = [
+    ("time", "9点到10点 写合同 #工作 @项目A"),
+    ("time", "刚才开会30分钟"),
+    ("expense", "午餐花了50元 #餐饮"),
+    ("expense", "打车花了15.5元"),
+    ("food", "午餐吃了鸡胸肉和蔬菜约400卡"),
+    ("food", "喝了杯咖啡"),
+    ("exercise", "跑步30分钟消耗了300卡"),
+    ("exercise", "做了45分钟的力量训练"),
+]
+
+ENDPOINTS = {"time": "/ingest", "expense": "/expense", "food": "/food", "exercise": "/exercise"}
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile over already sorted samples."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, int(round(q * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(name: str, latencies: List[float], errors: int, wall: float) -> Dict[str, Any]:
+    s = sorted(latencies)
+    return {
+        "scenario": name,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "mean_ms": round(sum(s) / len(s) * 1000, 2) if s else None,
+        "p50_ms": round(percentile(s, 0.50) * 1000, 2) if s else None,
+        "p95_ms": round(percentile(s, 0.95) * 1000, 2) if s else None,
+        "p99_ms": round(percentile(s, 0.99) * 1000, 2) if s else None,
+        "max_ms": round(s[-1] * 1000, 2) if s else None,
+    }
+
+def drive(name: str, call: Callable[[int], None], total: int, concurrency: int = 1) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(i: int):
+        t0 = time.perf_counter()
+        try:
+            call(i)
+        except Exception as e:
+            with lock:
+                errors[0] += 1
+                if errors[0] <= 3:
+                    print(f"  [{name}] request {i} failed: {e}", file=sys.stderr)
+            return
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+
+    t0 = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(total):
+            one(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+    return summarize(name, latencies, errors[0], time.perf_counter() - t0)
+
+def configure_env(deepseek_url: str, notion_url: str):
+    # 必须在导入 app 之前设置：各模块在导入时读取环境变量
+    os.environ.update({
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_BASE_URL": deepseek_url,
+        "NOTION_TOKEN": "bench",
+        "NOTION_BASE_URL": notion_url,
+        "NOTION_DATABASE_ID": "bench-time",
+        "NOTION_DATABASE_ID2": "bench-expense",
+        "NOTION_DATABASE_ID3": "bench-food",
+        "NOTION_DATABASE_ID4": "bench-exercise",
+        "FEISHU_WEBHOOK_URL": "",
+        # 压测循环发送同一批句子，关闭按请求体的自动去重，否则测到的是重放
+        "IDEMPOTENCY_WINDOW_SECONDS": "0",
+    })
+
+def start_api(port: int):
+    import uvicorn
+    from app import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.05)
+    return server
+
+def main():
+    ap = argparse.ArgumentParser(description="time-voice-notion-deepseek 压测（本地桩服务）")
+    ap.add_argument("--scenario", choices=["all", "unified", "batch", "reports"], default="all")
+    ap.add_argument("--requests", type=int, default=100, help="unified / batch 场景的请求数")
+    ap.add_argument("--concurrency", type=int, default=8, help="batch 场景的并发客户端数")
+    ap.add_argument("--report-runs", type=int, default=10, help="每个报表任务的执行次数")
+    ap.add_argument("--deepseek-latency-ms", type=float, default=300)
+    ap.add_argument("--notion-latency-ms", type=float, default=150)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="桩服务返回 429/500 的比例")
+    ap.add_argument("--rows-per-db", type=int, default=250, help="每个 Notion 数据库查询返回的记录数（每页 100 条）")
+    ap.add_argument("--port", type=int, default=18080, help="被测 API 的本地端口")
+    ap.add_argument("--json", help="把结果写入 JSON 文件")
+    args = ap.parse_args()
+
+    ds_cfg = StubConfig(args.deepseek_latency_ms, args.jitter_ms, args.error_rate, seed=1)
+    no_cfg = StubConfig(args.notion_latency_ms, args.jitter_ms, args.error_rate, rows_per_db=args.rows_per_db, seed=2)
+    deepseek = StubServer(DeepSeekHandler, ds_cfg).start()
+    notion = StubServer(NotionHandler, no_cfg).start()
+    configure_env(deepseek.url, notion.url)
+    # 报表正文和“未配置飞书”提示会刷屏，只保留错误
+    logging.getLogger("app.scheduler").setLevel(logging.ERROR)
+
+    import requests
+    server = start_api(args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(args.concurrency, 10))
+    session.mount("http://", adapter)
+
+    def post(path: str, body: Dict[str, Any]):
+        r = session.post(base + path, json=body, timeout=60)
+        if r.status_code != 200:
+            raise RuntimeError(f"{path} -> {r.status_code}: {r.text[:200]}")
+
+    results = []
+    try:
+        # 预热：建立连接、触发各模块的首次导入
+        post("/unified-ingest", {"utterance": UTTERANCES[0][1]})
+
+        if args.scenario in ("all", "unified"):
+            results.append(drive("unified-ingest", lambda i: post("/unified-ingest", {"utterance": UTTERANCES[i % len(UTTERANCES)][1]}), args.requests))
+
+        if args.scenario in ("all", "batch"):
+            def mixed(i: int):
+                intent, text = UTTERANCES[i % len(UTTERANCES)]
+                # 一半走统一入口，一半直接打到对应端点
+                post("/unified-ingest" if i % 2 == 0 else ENDPOINTS[intent], {"utterance": text})
+            results.append(drive(f"batch(c={args.concurrency})", mixed, args.requests, args.concurrency))
+
+        if args.scenario in ("all", "reports"):
+            from app.scheduler import scheduler_instance
+            today = time.strftime("%Y-%m-%d")
+            jobs = {
+                "report:unified_daily": scheduler_instance.generate_unified_daily_report,
+                "report:daily_calorie": scheduler_instance.generate_daily_calorie_stats,
+                "report:monthly_expense": scheduler_instance.generate_monthly_expense_stats,
+                "report:current_month": scheduler_instance.generate_current_month_stats,
+                "report:date_range": lambda: scheduler_instance.generate_date_range_stats(today, today),
+            }
+            for name, job in jobs.items():
+                results.append(drive(name, lambda i, job=job: job(), args.report_runs))
+    finally:
+        server.should_exit = True
+        deepseek.stop()
+        notion.stop()
+
+    header = f"{'scenario':<26}{'n':>6}{'err':>5}{'rps':>9}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'maxms':>10}"
+    print(f"\nstub latency: deepseek={args.deepseek_latency_ms}ms notion={args.notion_latency_ms}ms jitter<={args.jitter_ms}ms rows/db={args.rows_per_db}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<26}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps'] or 0:>9.2f}"
+              f"{r['p50_ms'] or 0:>10.1f}{r['p95_ms'] or 0:>10.1f}{r['p99_ms'] or 0:>10.1f}{r['max_ms'] or 0:>10.1f}")
+    print(f"\nstub requests: {dict(**ds_cfg.requests, **no_cfg.requests)}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results, "stub_requests": {"deepseek": ds_cfg.requests, "notion": no_cfg.requests}},
+                      f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+压测用的本地桩服务：模拟 DeepSeek 的 tool call 响应和 Notion 的建页 / 分页查询响应。
+
+- DeepSeek：POST /chat/completions，按 tool_choice 里的函数名返回合法的 arguments（枚举字段取候选集第一个；
+  extract_records 按逗号 / "然后"切分口述，每段按关键词归类成一条记录），
+  并带 usage 字段：token 按 DeepSeek 文档的字符换算估算，prompt_cache_hit_tokens 模拟上下文硬盘缓存
+  （与之前请求的最长公共前缀，按 64 token 取整），可选按未命中缓存的 token 数增加预填充延迟；
+- Notion：POST /pages 返回新页面 id/url；POST /databases/<id>/query 按 page_size 分页返回
+  rows_per_db 条记录，日期落在查询过滤器给出的范围内，字段与 app/stats.py 的解析函数对应。
+
+延迟由 latency_ms + 随机 jitter_ms 控制，可选按比例返回 429 / 500 模拟限流和故障。
+"""
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 与 benchmarks/run_bench.py 中设置的 NOTION_DATABASE_ID* 对应
+DB_KINDS = {
+    "bench-time": "time",
+    "bench-expense": "expense",
+    "bench-food": "food",
+    "bench-exercise": "exercise",
+}
+
+INTENT_KEYWORDS = [
+    ("expense", ("元", "块", "花了", "买")),
+    ("exercise", ("跑步", "游泳", "健身", "训练", "运动", "瑜伽")),
+    ("food", ("吃", "喝", "餐", "卡")),
+]
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, rows_per_db: int = 250, seed: Optional[int] = None,
+                 prefill_ms_per_1k: float = 0.0):
+        self.latency_ms = latency_ms
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self.prompts: deque = deque(maxlen=256)
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rows_per_db = rows_per_db
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+            fail = self.error_rate and self.random.random() < self.error_rate
+        if self.latency_ms or jitter:
+            time.sleep((self.latency_ms + jitter) / 1000.0)
+        return fail
+
+    def cached_prefix(self, text: str) -> int:
+        """Length of the longest prefix shared with an earlier prompt (then remember this one)."""
+        with self.lock:
+            best = 0
+            for seen in self.prompts:
+                n = min(len(seen), len(text))
+                i = 0
+                while i < n and seen[i] == text[i]:
+                    i += 1
+                best = max(best, i)
+            self.prompts.append(text)
+        return best
+
+    def count(self, name: str):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    cfg: StubConfig = None
+
+    def _body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _reply(self, code: int, body: Dict[str, Any]):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        pass
+
+def _first(enum: Optional[List[str]], default: str) -> str:
+    return enum[0] if enum else default
+
+def _stub_now(messages: List[Dict[str, Any]]) -> datetime:
+    for m in messages:
+        found = re.search(r"当前时间: (\S+)", m.get("content", ""))
+        if found:
+            return datetime.fromisoformat(found.group(1))
+    return datetime.now().astimezone()
+
+def estimate_tokens(text: str) -> int:
+    # DeepSeek 文档：1 个中文字符约 0.6 token，1 个英文字符约 0.3 token
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3 + 0.5)
+
+def prompt_text(payload: Dict[str, Any]) -> str:
+    """tools 在前、消息按顺序在后，近似服务端拼出的 prompt"""
+    tools = json.dumps(payload.get("tools") or [], ensure_ascii=False, separators=(",", ":"))
+    return tools + "".join(f"<{m.get('role')}>{m.get('content')}" for m in payload.get("messages", []))
+
+def _classify(text: str) -> str:
+    for intent, words in INTENT_KEYWORDS:
+        if any(w in text for w in words):
+            return intent
+    return "time"
+
+def tool_arguments(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Build schema-valid arguments for the function named in tool_choice."""
+    name = payload["tool_choice"]["function"]["name"]
+    props = payload["tools"][0]["function"]["parameters"]["properties"]
+    messages = payload.get("messages", [])
+    user = messages[-1]["content"] if messages else ""
+    tags = props.get("tags", {}).get("enum") or []
+    category = _first(props.get("category", {}).get("enum"), "其他")
+    common = {"tags": tags[:1], "confidence": 0.9, "assumptions": []}
+    if name == "classify_user_intent":
+        intent = _classify(user)
+        return {
+            "intent_type": intent,
+            "confidence": 0.9,
+            "reasoning": "stub",
+            "extracted_info": {"has_time_range": intent == "time", "has_amount": intent == "expense",
+                               "has_food": intent == "food", "has_exercise": intent == "exercise", "keywords": []},
+        }
+    if name == "extract_records":
+        variants = {v["properties"]["intent"]["enum"][0]: v["properties"]
+                    for v in props["items"]["items"]["anyOf"]}
+        text = user.rsplit("原始口述：", 1)[-1]
+        clauses = [c for c in re.split(r"[，,。；;]|然后", text) if c.strip()] or [text]
+        items = []
+        for clause in clauses:
+            intent = _classify(clause)
+            category = _first(variants[intent].get("category", {}).get("enum"), "其他")
+            items.append({"intent": intent, **_record(f"extract_{intent}_log", category, messages, common)})
+        return {"items": items}
+    return _record(name, category, messages, common)
+
+def _record(name: str, category: str, messages: List[Dict[str, Any]], common: Dict[str, Any]) -> Dict[str, Any]:
+    if name == "extract_time_log":
+        now = _stub_now(messages)
+        return {"start_iso": (now - timedelta(hours=1)).isoformat(), "end_iso": now.isoformat(),
+                "activity": "写代码", "mentions": [], "category": category, **common}
+    if name == "extract_expense_log":
+        return {"content": "午餐", "amount": 50, "category": category, **common}
+    if name == "extract_food_log":
+        return {"food": "鸡胸肉", "calories": 400, "category": category, **common}
+    if name == "extract_exercise_log":
+        return {"exercise_type": "跑步", "duration_minutes": 30, "calories_burned": 300,
+                "intensity": "中", "category": category, **common}
+    raise ValueError(f"unknown tool: {name}")
+
+class DeepSeekHandler(_JsonHandler):
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._reply(404, {"error": "not found"})
+        payload = self._body()
+        self.cfg.count("deepseek")
+        if self.cfg.delay():
+            return self._reply(500, {"error": {"message": "stub failure"}})
+        try:
+            args = tool_arguments(payload)
+        except (KeyError, IndexError, ValueError) as e:
+            return self._reply(400, {"error": {"message": str(e)}})
+        text = prompt_text(payload)
+        prompt_tokens = estimate_tokens(text)
+        hit = estimate_tokens(text[:self.cfg.cached_prefix(text)]) // 64 * 64
+        completion = json.dumps(args, ensure_ascii=False)
+        completion_tokens = estimate_tokens(completion)
+        if self.cfg.prefill_ms_per_1k:
+            time.sleep((prompt_tokens - hit) * self.cfg.prefill_ms_per_1k / 1e6)
+        self._reply(200, {
+            "id": uuid.uuid4().hex,
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [{
+                        "id": "call_" + uuid.uuid4().hex[:8],
+                        "type": "function",
+                        "function": {"name": payload["tool_choice"]["function"]["name"], "arguments": completion},
+                    }],
+                },
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_cache_hit_tokens": hit, "prompt_cache_miss_tokens": prompt_tokens - hit},
+        })
+
+def _title(text: str) -> Dict[str, Any]:
+    return {"title": [{"text": {"content": text}}]}
+
+def notion_row(kind: str, i: int, day: datetime) -> Dict[str, Any]:
+    at = day + timedelta(minutes=(i * 37) % (24 * 60 - 90))
+    tags = {"multi_select": [{"name": ["工作", "学习", "日常"][i % 3]}]}
+    if kind == "time":
+        props = {"Activity": _title(f"活动{i}"), "When": {"date": {"start": at.isoformat(), "end": (at + timedelta(minutes=45)).isoformat()}},
+                 "Category": {"select": {"name": ["工作", "学习", "运动", "放松"][i % 4]}}, "Tags": tags}
+    elif kind == "expense":
+        props = {"Content": _title(f"花销{i}"), "Amount": {"number": 10 + i % 90}, "Date": {"date": {"start": at.isoformat()}},
+                 "Category": {"select": {"name": ["餐饮", "交通", "购物"][i % 3]}}, "Tags": tags}
+    elif kind == "food":
+        props = {"Food": _title(f"食物{i}"), "Calories": {"number": 100 + i % 400}, "Protein": {"number": 10}, "Carbs": {"number": 30},
+                 "Fat": {"number": 5}, "Date": {"date": {"start": at.isoformat()}}, "Category": {"select": {"name": "午餐"}}, "Tags": tags}
+    else:
+        props = {"Exercise": _title(f"运动{i}"), "Duration": {"number": 30}, "Calories Burned": {"number": 200 + i % 200},
+                 "Intensity": {"select": {"name": "中"}}, "Date": {"date": {"start": at.isoformat()}},
+                 "Category": {"select": {"name": "有氧运动"}}, "Tags": tags}
+    return {"object": "page", "id": f"{kind}-{i}", "created_time": at.isoformat(), "last_edited_time": at.isoformat(), "properties": props}
+
+def _filter_start(payload: Dict[str, Any]) -> datetime:
+    for cond in payload.get("filter", {}).get("and", []):
+        start = cond.get("date", {}).get("on_or_after")
+        if start:
+            return datetime.fromisoformat(start.replace("Z", "+00:00"))
+    return datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+
+class NotionHandler(_JsonHandler):
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        payload = self._body()
+        found = re.search(r"/databases/([^/]+)/query$", path)
+        if path.endswith("/pages"):
+            self.cfg.count("notion_pages")
+            if self.cfg.delay():
+                return self._reply(429, {"object": "error", "code": "rate_limited"})
+            page_id = str(uuid.uuid4())
+            return self._reply(200, {"object": "page", "id": page_id, "url": f"https://www.notion.so/{page_id.replace('-', '')}"})
+        if found:
+            self.cfg.count("notion_query")
+            if self.cfg.delay():
+                return self._reply(429, {"object": "error", "code": "rate_limited"})
+            kind = DB_KINDS.get(found.group(1), "time")
+            page_size = min(int(payload.get("page_size") or 100), 100)
+            offset = int(payload.get("start_cursor") or 0)
+            total = self.cfg.rows_per_db
+            # 查询范围起点之后的两天内均匀分布，覆盖“当天”和“当月”两类报表
+            start = _filter_start(payload)
+            rows = [notion_row(kind, i, start + timedelta(hours=8 + (i % 2) * 24)) for i in range(offset, min(offset + page_size, total))]
+            more = offset + page_size < total
+            return self._reply(200, {"object": "list", "results": rows, "has_more": more,
+                                     "next_cursor": str(offset + page_size) if more else None})
+        self._reply(404, {"object": "error", "code": "object_not_found"})
+
+class StubServer:
+    """Run one stub handler on 127.0.0.1 in a daemon thread (port 0 picks a free port)."""
+
+    def __init__(self, handler: type, cfg: StubConfig, port: int = 0):
+        handler_cls = type(handler.__name__, (handler,), {"cfg": cfg})
+        self.cfg = cfg
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler_cls)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=handler.__name__, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def start_stubs(deepseek: StubConfig, notion: StubConfig):
+    return StubServer(DeepSeekHandler, deepseek).start(), StubServer(NotionHandler, notion).start()
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="单独启动 DeepSeek / Notion 桩服务（配合 uvicorn 手动压测）")
+    ap.add_argument("--deepseek-port", type=int, default=18001)
+    ap.add_argument("--notion-port", type=int, default=18002)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--notion-latency-ms", type=float, default=150)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--rows-per-db", type=int, default=250)
+    a = ap.parse_args()
+    ds = StubServer(DeepSeekHandler, StubConfig(a.latency_ms, a.jitter_ms), a.deepseek_port).start()
+    no = StubServer(NotionHandler, StubConfig(a.notion_latency_ms, a.jitter_ms, rows_per_db=a.rows_per_db), a.notion_port).start()
+    print(f"DEEPSEEK_BASE_URL={ds.url}")
+    print(f"NOTION_BASE_URL={no.url}")
+    print("NOTION_DATABASE_ID=bench-time NOTION_DATABASE_ID2=bench-expense NOTION_DATABASE_ID3=bench-food NOTION_DATABASE_ID4=bench-exercise")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        ds.stop()
+        no.stop()
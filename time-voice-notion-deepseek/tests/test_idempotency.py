@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试录入接口的幂等键：重放、窗口期自动去重、并发重复请求、失败不缓存
+"""
+
+import sys
+import os
+import asyncio
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app import idempotency
+from app.idempotency import IdempotencyStore, deduplicate
+from app.metrics import METRICS
+from app.resilience import deadline_scope
+
+def make_app(store, delay=0.0, deadline=None):
+    """与 /ingest 同样挂中间件的最小应用，calls 记录真正执行的次数；deadline 模拟外层的请求预算中间件"""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.middleware("http")
+    async def mw(request: Request, call_next):
+        with deadline_scope(deadline):
+            return await deduplicate(request, call_next, store)
+
+    @app.post("/ingest")
+    async def ingest(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        await asyncio.sleep(delay)
+        if body.get("utterance") == "失败":
+            return JSONResponse(status_code=502, content={"detail": "notion down"})
+        return {"ok": True, "n": app.state.calls}
+
+    return app
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def _post(app, body, key=None):
+    headers = {"Idempotency-Key": key} if key else {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/ingest", json=body, headers=headers)
+
+def test_store_ttl_and_bound():
+    """过期后重新执行；超过容量按 LRU 淘汰"""
+    print("测试存储过期与容量...")
+    now = [0.0]
+    store = IdempotencyStore(max_entries=2, clock=lambda: now[0])
+    entry, owner = store.begin("a", "f", ttl=10)
+    assert owner
+    store.complete(entry, 200, b"{}", [])
+    assert store.begin("a", "f", ttl=10) == (entry, False)
+    now[0] = 11
+    assert store.begin("a", "f", ttl=10)[1] is True
+    store.begin("b", "f", ttl=10)
+    store.begin("c", "f", ttl=10)
+    assert len(store) == 2 and "a" not in store.entries
+    print("✅ 存储过期与容量测试完成")
+
+def test_replay_with_key():
+    """同一个 Idempotency-Key 只执行一次；换请求体返回 422"""
+    print("测试幂等键重放...")
+    app = make_app(IdempotencyStore())
+    first = run(_post(app, {"utterance": "午餐50元"}, key="k1"))
+    again = run(_post(app, {"utterance": "午餐50元"}, key="k1"))
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json() == {"ok": True, "n": 1}
+    assert again.headers.get("idempotent-replayed") == "true"
+    assert app.state.calls == 1
+    assert run(_post(app, {"utterance": "午餐60元"}, key="k1")).status_code == 422
+    assert run(_post(app, {"utterance": "午餐50元"}, key="k2")).json()["n"] == 2
+    print("✅ 幂等键重放测试完成")
+
+def test_auto_window():
+    """不带键时按请求体在窗口期内去重，字段顺序不影响；窗口设为 0 关闭"""
+    print("测试自动去重...")
+    app = make_app(IdempotencyStore())
+    run(_post(app, {"utterance": "喝了杯咖啡", "source": "tasker"}))
+    replay = run(_post(app, {"source": "tasker", "utterance": "喝了杯咖啡"}))
+    assert replay.headers.get("idempotent-replayed") == "true" and app.state.calls == 1
+    run(_post(app, {"utterance": "喝了杯咖啡", "source": "cli"}))
+    assert app.state.calls == 2
+    original = idempotency.IDEMPOTENCY_WINDOW_SECONDS
+    try:
+        idempotency.IDEMPOTENCY_WINDOW_SECONDS = 0
+        run(_post(app, {"utterance": "喝了杯咖啡", "source": "tasker"}))
+        assert app.state.calls == 3
+    finally:
+        idempotency.IDEMPOTENCY_WINDOW_SECONDS = original
+    print("✅ 自动去重测试完成")
+
+def test_concurrent_duplicates():
+    """原请求还在处理时到达的重试等待并复用同一响应"""
+    print("测试并发重复请求...")
+    app = make_app(IdempotencyStore(), delay=0.2)
+
+    async def burst():
+        return await asyncio.gather(*[_post(app, {"utterance": "跑步30分钟"}, key="k") for _ in range(5)])
+
+    responses = run(burst())
+    assert app.state.calls == 1
+    assert {r.json()["n"] for r in responses} == {1}
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+    print("✅ 并发重复请求测试完成")
+
+def test_wait_bounded_by_deadline():
+    """等待原请求完成也受请求预算约束，超时返回 503"""
+    app = make_app(IdempotencyStore(), delay=0.5, deadline=0.1)
+
+    async def burst():
+        return await asyncio.gather(*[_post(app, {"utterance": "跑步30分钟"}, key="k") for _ in range(2)])
+
+    statuses = sorted(r.status_code for r in run(burst()))
+    assert statuses == [200, 503]
+    assert app.state.calls == 1
+
+def test_replay_passes_through_metrics():
+    """真实应用里去重在指标、追踪中间件之内：重放也计入请求指标"""
+    from fastapi.testclient import TestClient
+    from app import main as api
+
+    original = api.record_time
+    api.record_time = lambda parsed, now, source, utterance: {"ok": True, "activity": parsed["activity"]}
+    try:
+        client = TestClient(api.app)
+        body = {"utterance": "9点到10点 写合同", "now": "2025-03-12T21:00:00+08:00"}
+        headers = {"Idempotency-Key": "metrics-replay"}
+        METRICS.reset()
+        first = client.post("/ingest", json=body, headers=headers)
+        again = client.post("/ingest", json=body, headers=headers)
+    finally:
+        api.record_time = original
+    assert first.status_code == again.status_code == 200
+    assert again.headers.get("idempotent-replayed") == "true"
+    series = METRICS.histograms["http_request_seconds"]
+    assert series[(("path", "/ingest"), ("status", "200"))].count == 2
+
+def test_failure_not_cached():
+    """失败响应不缓存，重试会再次执行"""
+    app = make_app(IdempotencyStore())
+    assert run(_post(app, {"utterance": "失败"}, key="k")).status_code == 502
+    assert run(_post(app, {"utterance": "失败"}, key="k")).status_code == 502
+    assert app.state.calls == 2
+
+if __name__ == "__main__":
+    test_store_ttl_and_bound()
+    test_replay_with_key()
+    test_auto_window()
+    test_concurrent_duplicates()
+    test_wait_bounded_by_deadline()
+    test_replay_passes_through_metrics()
+    test_failure_not_cached()
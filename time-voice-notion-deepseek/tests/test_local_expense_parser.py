@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试本地花销解析：金额 / 内容 / 分类语料 + 需要交给 DeepSeek 的句子
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.local_parser import parse_expense_locally, cn_number, LOCAL_PARSE_MIN_CONFIDENCE
+
+TAGS = ["日常", "必要", "非必要"]
+
+# (语句, 期望内容, 期望金额, 期望分类)；期望为 None 表示应交给 DeepSeek
+CORPUS = [
+    ("打车花了15.5元 #交通", "打车", 15.5, "交通"),
+    ("午餐花了50元 #餐饮", "午餐", 50.0, "餐饮"),
+    ("午饭三十五块", "午饭", 35.0, "餐饮"),
+    ("房租2.5k", "房租", 2500.0, "住房"),
+    ("买了30块钱的书", "买书", 30.0, "学习"),
+    ("¥28 咖啡", "咖啡", 28.0, "餐饮"),
+    ("十五块五 地铁", "地铁", 15.5, "交通"),
+    ("超市买日用品花了一百二十八元", "超市买日用品", 128.0, "购物"),
+    ("加油300块", "加油", 300.0, "交通"),
+    ("演唱会门票1280元 #非必要", "演唱会门票", 1280.0, "娱乐"),
+    ("挂号费两千五百元", "挂号费", 2500.0, "医疗"),
+    ("买了个东西花了30元 #购物", "买了个东西", 30.0, "购物"),
+    ("3点打车花了20块", "打车", 20.0, "交通"),
+    ("昨天下午3点半到4点 停车15元", "停车", 15.0, "交通"),
+    ("买了一点水果花了20元", "买了一点水果", 20.0, "餐饮"),
+    ("充值话费100元", "充值话费", 100.0, "住房"),
+    ("游戏充值648元", "游戏充值", 648.0, "娱乐"),
+    ("昨天下午打车花了35元", "打车", 35.0, "交通"),
+    ("晚上买了2本书60元", "买了2本书", 60.0, "学习"),
+    # 以下应交给 DeepSeek
+    ("两本书一共80元，每本40元", None, None, None),   # 多个金额
+    ("两本书一共80元，每本40", None, None, None),     # 第二个金额没带单位
+    ("午饭35元 打车20元", None, None, None),
+    ("花了50元", None, None, None),                   # 没有内容
+    ("买了个东西30元", None, None, None),             # 分类无法确定
+    ("走了一万步", None, None, None),                 # 没有金额
+    ("充值100元", None, None, None),                  # 只有泛化关键词
+]
+
+def test_cn_number():
+    """中文数字"""
+    assert cn_number("三十五") == 35
+    assert cn_number("一百二十八") == 128
+    assert cn_number("两千五") == 2500
+    assert cn_number("三百零五") == 305
+    assert cn_number("十五点五") == 15.5
+    assert cn_number("一万二") == 12000
+
+def test_corpus_accuracy():
+    """接受的结果必须全部正确，应交给 DeepSeek 的句子不能被接受"""
+    print("测试本地花销解析语料...")
+    correct = 0
+    for utterance, content, amount, category in CORPUS:
+        parsed = parse_expense_locally(utterance, tags=TAGS)
+        ok = parsed is not None and parsed["confidence"] >= LOCAL_PARSE_MIN_CONFIDENCE
+        if content is None:
+            print(f"  {'❌' if ok else '✅'} {utterance} -> 交给 DeepSeek")
+            assert not ok, f"{utterance} 不应被本地接受: {parsed}"
+            continue
+        got = (parsed["content"], parsed["amount"], parsed["category"]) if parsed else None
+        hit = ok and got == (content, amount, category)
+        correct += hit
+        print(f"  {'✅' if hit else '❌'} {utterance} -> {got}")
+    total = sum(1 for c in CORPUS if c[1] is not None)
+    print(f"准确率 {correct}/{total}")
+    assert correct == total
+
+def test_tags():
+    """#标签 原样保留，没有标签时取候选集第一个"""
+    assert parse_expense_locally("打车花了15.5元 #交通 #必要", tags=TAGS)["tags"] == ["交通", "必要"]
+    parsed = parse_expense_locally("午饭35元", tags=TAGS)
+    assert parsed["tags"] == ["日常"]
+    assert parsed["confidence"] >= LOCAL_PARSE_MIN_CONFIDENCE
+    print("✅ 标签测试完成")
+
+def test_bare_second_amount():
+    """没带单位的第二个金额也算多个金额，并从内容里去掉"""
+    parsed = parse_expense_locally("两本书一共80元，每本40", tags=TAGS)
+    assert parsed["confidence"] < LOCAL_PARSE_MIN_CONFIDENCE
+    assert "出现多个金额" in parsed["assumptions"]
+    assert "40" not in parsed["content"]
+
+if __name__ == "__main__":
+    test_cn_number()
+    test_corpus_accuracy()
+    test_tags()
+    test_bare_second_amount()
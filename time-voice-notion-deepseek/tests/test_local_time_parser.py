@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试本地时间表达解析：准确率语料 + 需要交给 DeepSeek 的句子
+"""
+
+import sys
+import os
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytz
+
+from app.local_parser import parse_time_locally, LOCAL_PARSE_MIN_CONFIDENCE
+
+TZ = "Asia/Shanghai"
+NOW = pytz.timezone(TZ).localize(datetime(2025, 3, 12, 21, 0))
+
+# (语句, 期望开始, 期望结束, 期望活动, 期望分类)；期望为 None 表示应交给 DeepSeek
+CORPUS = [
+    ("9点到10点 写合同", "2025-03-12T09:00", "2025-03-12T10:00", "写合同", "工作"),
+    ("刚才开会30分钟", "2025-03-12T20:30", "2025-03-12T21:00", "开会", "工作"),
+    ("昨晚23:10-0:40看电影", "2025-03-11T23:10", "2025-03-12T00:40", "看电影", "放松"),
+    ("下午3点半到5点 开会 #工作 @张三", "2025-03-12T15:30", "2025-03-12T17:00", "开会", "工作"),
+    ("14:00~15:30 代码评审", "2025-03-12T14:00", "2025-03-12T15:30", "代码评审", "工作"),
+    ("10点半到现在 写代码", "2025-03-12T10:30", "2025-03-12T21:00", "写代码", "工作"),
+    ("从9点开始写周报", "2025-03-12T09:00", "2025-03-12T21:00", "写周报", "工作"),
+    ("跑步1个半小时", "2025-03-12T19:30", "2025-03-12T21:00", "跑步", "运动"),
+    ("读书半小时", "2025-03-12T20:30", "2025-03-12T21:00", "读书", "学习"),
+    ("刚刚游泳四十分钟", "2025-03-12T20:20", "2025-03-12T21:00", "游泳", "运动"),
+    ("3点到4点 午睡", "2025-03-12T15:00", "2025-03-12T16:00", "午睡", "睡觉"),
+    ("今天早上八点到九点二十 通勤", "2025-03-12T08:00", "2025-03-12T09:20", "通勤", "杂项"),
+    ("昨天下午两点到四点 学习英语", "2025-03-11T14:00", "2025-03-11T16:00", "学习英语", "学习"),
+    ("前天晚上8点到10点打游戏", "2025-03-10T20:00", "2025-03-10T22:00", "打游戏", "放松"),
+    ("中午12点到1点 吃饭", "2025-03-12T12:00", "2025-03-12T13:00", "吃饭", "杂项"),
+    ("10点到2点 写代码", "2025-03-12T10:00", "2025-03-12T14:00", "写代码", "工作"),
+    ("十点一刻到十一点 邮件", "2025-03-12T10:15", "2025-03-12T11:00", "邮件", "工作"),
+    ("健身1小时20分钟", "2025-03-12T19:40", "2025-03-12T21:00", "健身", "运动"),
+    ("09:00-11:30 需求评审 #工作", "2025-03-12T09:00", "2025-03-12T11:30", "需求评审", "工作"),
+    ("晚上7点到8点 瑜伽 @小李", "2025-03-12T19:00", "2025-03-12T20:00", "瑜伽", "运动"),
+    ("10点-11点 电话会议 讨论 3.5 版本", "2025-03-12T10:00", "2025-03-12T11:00", "电话会议 讨论 3.5 版本", "工作"),
+    # 以下应交给 DeepSeek
+    ("明天9点到10点开会", None, None, None, None),
+    ("周五下午3点到5点 开会", None, None, None, None),
+    ("晚上11点到1点 打游戏", None, None, None, None),   # 落在未来
+    ("九点到十点", None, None, None, None),              # 没有活动内容
+    ("9点到10点 弄了点东西", None, None, None, None),     # 分类无法确定
+    ("吃了个苹果", None, None, None, None),               # 没有时间表达
+]
+
+def test_corpus_accuracy():
+    """接受的结果必须全部正确，应交给 DeepSeek 的句子不能被接受"""
+    print("测试本地时间解析语料...")
+    correct = accepted = 0
+    for utterance, start, end, activity, category in CORPUS:
+        parsed = parse_time_locally(utterance, now=NOW, tz=TZ)
+        ok = parsed is not None and parsed["confidence"] >= LOCAL_PARSE_MIN_CONFIDENCE
+        if start is None:
+            print(f"  {'❌' if ok else '✅'} {utterance} -> 交给 DeepSeek")
+            assert not ok, f"{utterance} 不应被本地接受: {parsed}"
+            continue
+        accepted += ok
+        got = (parsed["start_iso"][:16], parsed["end_iso"][:16], parsed["activity"], parsed["category"]) if parsed else None
+        hit = ok and got == (start, end, activity, category)
+        correct += hit
+        print(f"  {'✅' if hit else '❌'} {utterance} -> {got}")
+    total = sum(1 for c in CORPUS if c[1] is not None)
+    print(f"准确率 {correct}/{total}")
+    assert accepted == total
+    assert correct == total
+
+def test_tags_and_mentions():
+    """#标签、@提及 的抽取，以及没有标签时按候选标签补齐"""
+    print("测试标签与提及...")
+    parsed = parse_time_locally("下午3点到4点 写代码 #工作 #项目A @张三 @李四", now=NOW, tz=TZ)
+    assert parsed["tags"] == ["工作", "项目A"]
+    assert parsed["mentions"] == ["张三", "李四"]
+    assert parsed["activity"] == "写代码"
+    parsed = parse_time_locally("9点到10点 写代码", now=NOW, tz=TZ, tags=["写代码", "调研"])
+    assert parsed["tags"] == ["写代码"]
+    assert parsed["start_iso"] == "2025-03-12T09:00:00+08:00"
+    print("✅ 标签与提及测试完成")
+
+if __name__ == "__main__":
+    test_corpus_accuracy()
+    test_tags_and_mentions()
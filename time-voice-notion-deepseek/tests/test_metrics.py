@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试进程内指标与 Prometheus 文本输出
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.metrics import Metrics
+
+def test_metrics_render():
+    """测试计数器、直方图和 token 统计的输出格式"""
+    print("测试指标输出...")
+    m = Metrics()
+    m.incr("notion_requests_total", op="pages", status=200)
+    m.incr("notion_requests_total", op="pages", status=200)
+    m.incr("notion_requests_total", op="pages", status=429)
+    m.observe("ingest_stage_seconds", 0.02, stage="parse", intent="time")
+    m.observe("ingest_stage_seconds", 3.0, stage="parse", intent="time")
+    m.record_usage({"prompt_tokens": 1200000, "completion_tokens": 80, "prompt_cache_hit_tokens": 1024})
+
+    @m.job("unified_daily_report")
+    def job():
+        return "done"
+
+    assert job() == "done"
+    text = m.render()
+    print(text)
+
+    assert 'voice_notion_requests_total{op="pages",status="200"} 2' in text
+    assert 'voice_notion_requests_total{op="pages",status="429"} 1' in text
+    # 大数值不能被格式化成科学计数法
+    assert 'voice_deepseek_tokens_total{kind="prompt"} 1200000' in text
+    assert 'voice_deepseek_tokens_total{kind="cache_hit"} 1024' in text
+    assert 'voice_ingest_stage_seconds_bucket{intent="time",stage="parse",le="0.025"} 1' in text
+    assert 'voice_ingest_stage_seconds_bucket{intent="time",stage="parse",le="5.0"} 2' in text
+    assert 'voice_ingest_stage_seconds_bucket{intent="time",stage="parse",le="+Inf"} 2' in text
+    assert 'voice_ingest_stage_seconds_count{intent="time",stage="parse"} 2' in text
+    assert 'voice_scheduler_job_seconds_count{job="unified_daily_report"} 1' in text
+    print("\n✅ 指标输出测试完成")
+
+if __name__ == "__main__":
+    test_metrics_render()
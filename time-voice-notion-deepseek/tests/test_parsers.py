@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试解析引擎：JSON 修复、必填字段、校验函数、记录类型注册和多条记录拆分
+"""
+
+import sys
+import os
+import json
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.llm_parser import LLMParseError
+from app import parsers
+from app.parsers import REGISTRY, ParseContext, RecordType, register, estimate_food_calories, estimate_exercise_calories
+from app.prompts import PromptSpec
+
+def test_registry():
+    """四种记录类型都已注册，time / expense 带本地解析"""
+    assert set(REGISTRY) >= {"time", "expense", "food", "exercise"}
+    assert REGISTRY["time"].local is not None and REGISTRY["expense"].local is not None
+    assert REGISTRY["food"].local is None
+    assert REGISTRY["exercise"].required == ["exercise_type", "duration_minutes", "calories_burned", "intensity",
+                                             "tags", "confidence", "assumptions", "category"]
+
+def test_json_repair():
+    """字段名缺右引号时修复一次，修复不了抛 LLMParseError"""
+    print("测试 JSON 修复...")
+    food = REGISTRY["food"]
+    broken = '{"food": "苹果", "calories: 95, "category": "零食", "tags: ["健康"], "confidence: 0.9, "assumptions: []}'
+    parsed = food.decode(broken)
+    assert parsed["calories"] == 95 and parsed["tags"] == ["健康"]
+    try:
+        food.decode('{"food": ')
+    except LLMParseError as e:
+        print(f"  预期的错误: {e}")
+    else:
+        raise AssertionError("应当抛出 LLMParseError")
+    print("✅ JSON 修复测试完成")
+
+def test_validators():
+    """热量估算"""
+    ctx = ParseContext("", None, "Asia/Shanghai", None, None)
+    parsed = {"food": "两个鸡蛋", "calories": 0, "assumptions": []}
+    estimate_food_calories(parsed, ctx)
+    assert parsed["calories"] == 70 and parsed["protein"] == 0 and parsed["assumptions"]
+    parsed = {"exercise_type": "跑步", "duration_minutes": 30, "intensity": "中", "calories_burned": 0, "assumptions": []}
+    estimate_exercise_calories(parsed, ctx)
+    assert parsed["calories_burned"] == 288
+
+def test_register_new_type():
+    """新记录类型只需一个 PromptSpec + 注册"""
+    spec = PromptSpec("extract_sleep_log", "把口述的睡眠解析为字段。", {"hours": {"type": "number"}}, ["睡眠"])
+    sleep = register(RecordType("sleep", spec))
+    try:
+        assert REGISTRY["sleep"] is sleep
+        assert sleep.required == ["hours", "tags", "confidence", "assumptions", "category"]
+        assert sleep.decode('{"hours: 7.5, "tags": [], "confidence": 1, "assumptions": [], "category": "睡眠"}')["hours"] == 7.5
+    finally:
+        REGISTRY.pop("sleep", None)
+
+def _reply(arguments: str):
+    return lambda payload: {"choices": [{"message": {"tool_calls": [{"function": {"name": "extract_records", "arguments": arguments}}]}}]}
+
+def test_parse_items():
+    """一次调用拆出多条记录，每条按所属类型补全；未知类型 / 缺字段抛 LLMParseError"""
+    print("测试多条记录拆分...")
+    items = [
+        {"intent": "exercise", "exercise_type": "跑步", "duration_minutes": 30, "calories_burned": 0, "intensity": "中",
+         "category": "有氧运动", "tags": [], "confidence": 0.9, "assumptions": []},
+        {"intent": "food", "food": "两个鸡蛋", "calories": 140, "category": "早餐", "tags": ["编造的"], "confidence": 0.9, "assumptions": []},
+        {"intent": "expense", "content": "早餐", "amount": 12, "category": "餐饮", "tags": [], "confidence": 0.9, "assumptions": []},
+    ]
+    original = parsers._chat_completions
+    try:
+        parsers._chat_completions = _reply(json.dumps({"items": items}, ensure_ascii=False))
+        records = parsers.parse_items("早上跑步30分钟，然后早餐吃了两个鸡蛋花了12元", datetime(2025, 3, 12, 8, 0), "Asia/Shanghai",
+                                      tags={"food": ["健康"], "expense": ["日常"], "exercise": ["户外"]})
+        assert [intent for intent, _ in records] == ["exercise", "food", "expense"]
+        exercise, food, expense = (parsed for _, parsed in records)
+        assert "intent" not in exercise and exercise["calories_burned"] == 288
+        assert food["tags"] == ["健康"] and food["protein"] == 0
+        assert expense["tags"] == ["日常"]
+
+        for bad in ('{"items": [{"intent": "sleep", "hours": 7}]}', '{"items": [{"intent": "expense", "amount": 12}]}', '{"records": []}'):
+            parsers._chat_completions = _reply(bad)
+            try:
+                parsers.parse_items("随便", datetime(2025, 3, 12, 8, 0), "Asia/Shanghai")
+            except LLMParseError as e:
+                print(f"  预期的错误: {e}")
+            else:
+                raise AssertionError(f"应当抛出 LLMParseError: {bad}")
+    finally:
+        parsers._chat_completions = original
+    print("✅ 多条记录拆分测试完成")
+
+if __name__ == "__main__":
+    test_registry()
+    test_json_repair()
+    test_validators()
+    test_register_new_type()
+    test_parse_items()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 DeepSeek 请求构建：静态前缀不变、候选标签裁剪、多条记录 schema
+"""
+
+import sys
+import os
+import json
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytz
+
+from app.prompts import build_request, build_multi_request, top_k_tags, keep_candidate_tags
+
+NOW = pytz.timezone("Asia/Shanghai").localize(datetime(2025, 3, 12, 21, 0))
+TAGS = ["写代码", "调研", "开会", "看电影", "跑步", "读书", "学习", "睡眠", "休息", "通勤", "开车", "吃饭"]
+
+def test_static_prefix():
+    """不同时间、不同口述的请求，tools 和 system 必须逐字节相同（上下文缓存按前缀匹配）"""
+    print("测试静态前缀...")
+    a = build_request("time", "9点到10点 写代码", NOW, "Asia/Shanghai", ["工作", "学习"], TAGS)
+    b = build_request("time", "刚才跑步30分钟", NOW + timedelta(minutes=7), "Asia/Shanghai", ["工作", "学习"], TAGS)
+    assert json.dumps(a["tools"], ensure_ascii=False) == json.dumps(b["tools"], ensure_ascii=False)
+    assert a["messages"][0] == b["messages"][0]
+    assert "2025-03-12" not in a["messages"][0]["content"]
+    assert a["messages"][-1]["content"].startswith("当前时间: 2025-03-12T21:00:00+08:00")
+    assert a["tools"][0]["function"]["parameters"]["properties"]["category"]["enum"] == ["工作", "学习"]
+    print("✅ 静态前缀测试完成")
+
+def test_top_k_tags():
+    """口述里出现的标签排最前，其余按字符重合度，最多 k 个"""
+    print("测试候选标签裁剪...")
+    picked = top_k_tags("下午写代码然后开会", TAGS, k=4)
+    print(picked)
+    assert picked[:2] == ["写代码", "开会"]
+    assert len(picked) == 4
+    assert top_k_tags("随便", ["a", "b"], k=4) == ["a", "b"]
+    user = build_request("time", "下午写代码然后开会", NOW, "Asia/Shanghai", None, TAGS)["messages"][-1]["content"]
+    assert "候选标签: 写代码、开会" in user
+    print("✅ 候选标签裁剪测试完成")
+
+def test_keep_candidate_tags():
+    """模型自造的标签去掉，#标签 保留"""
+    assert keep_candidate_tags(["写代码", "编造的"], TAGS, "写代码") == ["写代码"]
+    assert keep_candidate_tags(["项目A"], TAGS, "写代码 #项目A") == ["项目A"]
+    assert keep_candidate_tags(["任意"], [], "写代码") == ["任意"]
+
+def test_multi_request():
+    """多条记录：items 的每项是四种记录之一，分类枚举按类型分别给出，前缀同样不随口述变化"""
+    print("测试多条记录请求...")
+    cats = {"expense": ["餐饮", "交通"]}
+    a = build_multi_request("早上跑步30分钟，早餐吃了两个鸡蛋花了12元", NOW, "Asia/Shanghai", cats, {"time": TAGS})
+    b = build_multi_request("写代码", NOW + timedelta(minutes=3), "Asia/Shanghai", cats, {"time": TAGS})
+    assert json.dumps(a["tools"], ensure_ascii=False) == json.dumps(b["tools"], ensure_ascii=False)
+    assert a["messages"][0] == b["messages"][0]
+    variants = a["tools"][0]["function"]["parameters"]["properties"]["items"]["items"]["anyOf"]
+    by_intent = {v["properties"]["intent"]["enum"][0]: v for v in variants}
+    assert set(by_intent) == {"time", "expense", "food", "exercise"}
+    assert by_intent["expense"]["properties"]["category"]["enum"] == ["餐饮", "交通"]
+    assert by_intent["food"]["properties"]["category"]["enum"][0] == "早餐"
+    assert by_intent["time"]["required"] == list(by_intent["time"]["properties"])
+    user = a["messages"][-1]["content"]
+    assert "候选标签（time）: 跑步" in user and "候选标签（food）" not in user
+    print("✅ 多条记录请求测试完成")
+
+if __name__ == "__main__":
+    test_static_prefix()
+    test_top_k_tags()
+    test_keep_candidate_tags()
+    test_multi_request()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试请求预算、自适应超时和熔断器
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.resilience import deadline_scope, remaining, budget, LatencyTracker, CircuitBreaker, CircuitOpen
+
+def test_deadline_scope():
+    """测试截止时间只会收紧、退出后恢复"""
+    print("测试请求预算...")
+    assert remaining() is None
+    assert budget(40) == 40
+    with deadline_scope(10):
+        assert 9 < remaining() <= 10
+        with deadline_scope(60):
+            # 内层更宽松的预算不能放宽外层
+            assert remaining() <= 10
+        with deadline_scope(1):
+            assert budget(40) <= 1
+        assert budget(5) == 5
+    assert remaining() is None
+    with deadline_scope(0):
+        assert remaining() is None
+
+def test_adaptive_timeout():
+    """测试样本不足时用上限，足够后按 p99 × 倍数并夹在区间内"""
+    print("测试自适应超时...")
+    tracker = LatencyTracker(window=100, min_samples=10)
+    assert tracker.timeout(40, 5, 3) == 40
+    for _ in range(99):
+        tracker.observe(1.0)
+    tracker.observe(4.0)
+    assert tracker.percentile(0.5) == 1.0
+    assert tracker.timeout(40, 5, 3) == 12.0
+    fast = LatencyTracker(min_samples=1)
+    fast.observe(0.1)
+    assert fast.timeout(40, 5, 3) == 5
+
+def test_circuit_breaker():
+    """测试连续失败打开熔断、冷却后放一个探测请求"""
+    print("测试熔断器...")
+    breaker = CircuitBreaker(threshold=3, cooldown=0.2)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.failure()
+    assert breaker.state == "open"
+    try:
+        breaker.before_call()
+        assert False, "should fail fast while open"
+    except CircuitOpen:
+        pass
+    time.sleep(0.25)
+    assert breaker.state == "half_open"
+    breaker.before_call()  # 探测请求
+    try:
+        breaker.before_call()
+        assert False, "only one probe while half-open"
+    except CircuitOpen:
+        pass
+    breaker.success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    print("\n✅ 熔断器测试完成")
+
+def test_probe_released_on_unexpected_error():
+    """半开探测请求抛出非预期异常（如响应体不是 JSON）时也要放掉探测名额"""
+    from app import llm_parser
+    original_breaker, original_attempt = llm_parser.BREAKER, llm_parser._attempt
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.failure()
+
+    def broken(url, payload, tool, timeout):
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+    try:
+        llm_parser.BREAKER, llm_parser._attempt = breaker, broken
+        for _ in range(2):
+            try:
+                llm_parser._chat_completions({"model": "deepseek-chat"})
+                assert False, "should propagate the error"
+            except ValueError:
+                pass
+        assert not breaker.probing
+    finally:
+        llm_parser.BREAKER, llm_parser._attempt = original_breaker, original_attempt
+
+if __name__ == "__main__":
+    test_deadline_scope()
+    test_adaptive_timeout()
+    test_circuit_breaker()
+    test_probe_released_on_unexpected_error()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试请求追踪的父子关系、traceparent 沿用和错误标记
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import tracing
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return {d["name"]: d for d in (json.loads(l) for l in f)}
+
+def test_span_tree():
+    """测试嵌套 span 共享 trace id、沿用入站 traceparent"""
+    print("测试 span 父子关系...")
+    path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    saved = tracing.EXPORTER
+    tracing.EXPORTER = tracing.Exporter(path=path)
+    try:
+        traceparent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+        with tracing.span("POST /unified-ingest", traceparent=traceparent) as root:
+            with tracing.span("classify", utterance_length=7) as sp:
+                sp.set(intent="expense", confidence=0.9)
+            tracing.annotate(http_status=200)
+            try:
+                with tracing.span("notion.create"):
+                    raise ValueError("boom")
+            except ValueError:
+                pass
+        tracing.EXPORTER.flush()
+        spans = _read(path)
+    finally:
+        tracing.EXPORTER = saved
+
+    for name, d in spans.items():
+        print(f"  {name}: parent={d['parent_id']} status={d['status']} attrs={d['attributes']}")
+    assert root.trace_id == "a" * 32
+    assert spans["POST /unified-ingest"]["parent_id"] == "b" * 16
+    assert spans["classify"]["trace_id"] == "a" * 32
+    assert spans["classify"]["parent_id"] == spans["POST /unified-ingest"]["span_id"]
+    assert spans["classify"]["attributes"] == {"utterance_length": 7, "intent": "expense", "confidence": 0.9}
+    assert spans["POST /unified-ingest"]["attributes"]["http_status"] == 200
+    assert spans["notion.create"]["status"] == "error"
+    assert "boom" in spans["notion.create"]["attributes"]["error"]
+    print("\n✅ span 父子关系测试完成")
+
+def test_disabled_is_noop():
+    """测试未配置导出时不创建 span"""
+    saved = tracing.EXPORTER
+    tracing.EXPORTER = tracing.Exporter()
+    try:
+        with tracing.span("noop") as sp:
+            sp.set(a=1)
+            assert tracing.current_span() is tracing.NOOP_SPAN
+        assert sp is tracing.NOOP_SPAN
+    finally:
+        tracing.EXPORTER = saved
+
+if __name__ == "__main__":
+    test_span_tree()
+    test_disabled_is_noop()